@@ -0,0 +1,3 @@
+"""
+Module containing performance benchmarks for the `petboard` application.
+"""
@@ -0,0 +1,591 @@
+"""
+Load and latency benchmark of every route of the application over
+databases seeded with 10^3 to 10^6 messages.
+
+Each endpoint is driven first in-process through `falcon.testing`
+(which measures the application alone) and then over HTTP against
+a real gunicorn server started with `petboards.gunicorn_config` (which adds
+the WSGI server, the sockets and concurrent clients). For every dataset,
+target and endpoint, the number of requests and errors, the throughput
+and the p50/p95/p99 latencies are reported as JSON.
+
+Given a previous report as `--baseline`, the endpoints that got slower
+than `--tolerance` allows are listed and the exit status is 1, so the
+benchmark may be used as a check before deploy.
+
+Usage (from the directory containing the `petboards` package):
+
+    python -m benchmarks.bench_load [--sizes 1000,10000,100000,1000000]
+        [--targets testing,gunicorn] [--requests N] [--workers N]
+        [--concurrency N] [--output FILE] [--baseline FILE [--tolerance X]]
+"""
+
+import os
+
+# The secret is read once `petboards.security` is imported, and the
+# gunicorn workers have to sign and check the tokens with the same one.
+os.environ.setdefault('PETBOARDS_SECRET', 'benchmark')
+
+import argparse
+import http.client
+import itertools
+import json
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterator
+
+import falcon
+import sqlalchemy as sa
+from falcon import testing
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+
+from petboards.app import create_app
+from petboards.board import BoardStore, MessageStore, assign_sequence_numbers
+from petboards.config import Settings
+from petboards.models import Board, Message, User
+from petboards.persistency import SessionMiddleware
+from petboards.security import JWT
+from petboards.user import UserStore
+
+from .seed import seed, Dataset, PASSWORD
+
+# Directory containing the `petboards` package, for the gunicorn workers.
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@dataclass
+class Context:
+    """
+    What the endpoints need to build their requests: the seeded
+    dataset, a token of its first user (who is a moderator too)
+    and the engine of the database.
+    """
+
+    dataset: Dataset
+    token: str
+    engine: sa.Engine
+    target: str
+    own_messages: list[tuple[uuid.UUID, uuid.UUID]] = field(default_factory=list)
+    own_messages_left: Iterator[tuple[uuid.UUID, uuid.UUID]] = iter(())
+    moderated_authors_left: Iterator[uuid.UUID] = iter(())
+    moderated_boards_left: Iterator[uuid.UUID] = iter(())
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query_string: str = ''
+    body: dict | None = None
+
+@dataclass
+class Endpoint:
+    """
+    A route and method to benchmark. `build` makes one request to it;
+    `prepare`, if given, is called with the number of requests before
+    they are built, e.g. to create the rows they delete. Only `weight`
+    of the requested number of requests is made (for the slow ones).
+    """
+
+    name: str
+    build: Callable[[Context, random.Random], Request]
+    prepare: Callable[[Context, int], None] | None = None
+    weight: float = 1.0
+
+def _own_messages(ctx: Context, count: int):
+    # Messages of the benchmarking user, which it may edit and delete.
+    # They are put on a new board, so that no worker has the messages
+    # of the board already loaded (and doesn't see the new ones).
+    board_id = uuid.uuid4()
+    author_id = ctx.dataset.user_ids[0]
+    now = datetime.utcnow()
+    ctx.own_messages = []
+
+    with ctx.engine.begin() as conn:
+        conn.execute(sa.insert(Board), {
+            'board_id': board_id,
+            'topic': 'Own messages',
+            'created_at': now,
+            'creator_id': author_id
+        })
+
+        rows = []
+        for i in range(count):
+            message_id = uuid.uuid4()
+            ctx.own_messages.append((board_id, message_id))
+            rows.append({
+                'message_id': message_id,
+                'text': f'Own message #{i}',
+                'timestamp': now,
+                'last_edited': now,
+                'author_id': author_id,
+                'board_id': board_id
+            })
+        conn.execute(sa.insert(Message), rows)
+        assign_sequence_numbers(conn)
+
+    ctx.own_messages_left = iter(ctx.own_messages)
+
+# Messages of every author or board, that a moderation request removes.
+_MODERATED_MESSAGES = 20
+
+def _moderated_boards_of(conn: sa.Connection, board_ids: list[uuid.UUID], creator_id: uuid.UUID, now: datetime):
+    conn.execute(sa.insert(Board), [{
+        'board_id': board_id,
+        'topic': 'Moderated messages',
+        'created_at': now,
+        'creator_id': creator_id
+    } for board_id in board_ids])
+
+def _moderated_messages(conn: sa.Connection, pairs: list[tuple[uuid.UUID, uuid.UUID]], now: datetime):
+    # `_MODERATED_MESSAGES` messages by every author on the board paired with them.
+    conn.execute(sa.insert(Message), [{
+        'message_id': uuid.uuid4(),
+        'text': f'Moderated message #{i}',
+        'timestamp': now,
+        'last_edited': now,
+        'author_id': author_id,
+        'board_id': board_id
+    } for author_id, board_id in pairs for i in range(_MODERATED_MESSAGES)])
+    assign_sequence_numbers(conn)
+
+def _moderated_authors(ctx: Context, count: int):
+    # Moderation removes the messages for good, so every request
+    # gets an author of its own, unknown to the other endpoints.
+    board_id = uuid.uuid4()
+    author_ids = [uuid.uuid4() for _ in range(count)]
+    now = datetime.utcnow()
+
+    with ctx.engine.begin() as conn:
+        conn.execute(sa.insert(User), [{
+            'user_id': author_id,
+            'username': f'moderated_{author_id.hex}',
+            '_password': b'',
+            'first_name': 'Moderated',
+            'last_name': 'User',
+            'registered': now,
+            'last_login': now
+        } for author_id in author_ids])
+        _moderated_boards_of(conn, [board_id], ctx.dataset.user_ids[0], now)
+        _moderated_messages(conn, [(author_id, board_id) for author_id in author_ids], now)
+
+    ctx.moderated_authors_left = iter(author_ids)
+
+def _moderated_boards(ctx: Context, count: int):
+    # Likewise, a board of its own for every request.
+    author_id = ctx.dataset.user_ids[0]
+    board_ids = [uuid.uuid4() for _ in range(count)]
+    now = datetime.utcnow()
+
+    with ctx.engine.begin() as conn:
+        for board_id in board_ids:
+            _moderated_boards_of(conn, [board_id], ctx.dataset.user_ids[0], now)
+        _moderated_messages(conn, [(author_id, board_id) for board_id in board_ids], now)
+
+    ctx.moderated_boards_left = iter(board_ids)
+
+def _last_page(per_page: int, items: int) -> int:
+    return max(0, items // per_page - 1)
+
+def _board_id(ctx: Context, rnd: random.Random) -> uuid.UUID:
+    return rnd.choice(ctx.dataset.board_ids)
+
+_registrations = itertools.count()
+
+ENDPOINTS = [
+    Endpoint('POST /auth/login', lambda ctx, rnd: Request(
+        'POST', '/auth/login',
+        body={'username': rnd.choice(ctx.dataset.usernames), 'password': PASSWORD}
+    )),
+    # Registration hashes the password with the default bcrypt cost.
+    Endpoint('POST /auth/register', lambda ctx, rnd: Request(
+        'POST', '/auth/register',
+        body={
+            'username': f'{ctx.target}_{next(_registrations)}_{rnd.getrandbits(32)}',
+            'password': PASSWORD,
+            'first_name': 'Bench',
+            'last_name': 'User'
+        }
+    ), weight=0.1),
+    Endpoint('GET /users', lambda ctx, rnd: Request(
+        'GET', '/users',
+        f'page={rnd.randint(0, _last_page(50, len(ctx.dataset.user_ids)))}&elements=50',
+        {'token': ctx.token}
+    )),
+    Endpoint('GET /users?ids=', lambda ctx, rnd: Request(
+        'GET', '/users',
+        'ids=' + ','.join(str(i) for i in rnd.sample(ctx.dataset.user_ids, min(20, len(ctx.dataset.user_ids)))),
+        {'token': ctx.token}
+    )),
+    Endpoint('GET /users/{user_id}', lambda ctx, rnd: Request(
+        'GET', f'/users/{rnd.choice(ctx.dataset.user_ids)}', body={'token': ctx.token}
+    )),
+    Endpoint('GET /users/{user_id}/messages', lambda ctx, rnd: Request(
+        'GET', f'/users/{rnd.choice(ctx.dataset.user_ids)}/messages', 'elements=50', {'token': ctx.token}
+    )),
+    Endpoint('GET /boards', lambda ctx, rnd: Request(
+        'GET', '/boards',
+        f'page={rnd.randint(0, _last_page(30, len(ctx.dataset.board_ids)))}&elements=30',
+        {'token': ctx.token}
+    )),
+    Endpoint('GET /boards?cursor=', lambda ctx, rnd: Request(
+        'GET', '/boards', 'elements=30', {'token': ctx.token}
+    )),
+    Endpoint('GET /boards?ids=', lambda ctx, rnd: Request(
+        'GET', '/boards',
+        'ids=' + ','.join(str(i) for i in rnd.sample(ctx.dataset.board_ids, min(20, len(ctx.dataset.board_ids)))),
+        {'token': ctx.token}
+    )),
+    Endpoint('GET /boards/digest', lambda ctx, rnd: Request(
+        'GET', '/boards/digest',
+        'per_board=3&ids=' + ','.join(str(i) for i in rnd.sample(ctx.dataset.board_ids, min(30, len(ctx.dataset.board_ids)))),
+        {'token': ctx.token}
+    )),
+    Endpoint('POST /boards', lambda ctx, rnd: Request(
+        'POST', '/boards', body={'token': ctx.token, 'topic': f'Topic {rnd.getrandbits(32)}'}
+    )),
+    Endpoint('GET /boards/{board_id}', lambda ctx, rnd: Request(
+        'GET', f'/boards/{_board_id(ctx, rnd)}', body={'token': ctx.token}
+    )),
+    Endpoint('GET /boards/{board_id}/messages', lambda ctx, rnd: Request(
+        'GET', f'/boards/{_board_id(ctx, rnd)}/messages',
+        f'page={rnd.randint(0, _last_page(50, ctx.dataset.messages // len(ctx.dataset.board_ids)))}&elements=50',
+        {'token': ctx.token}
+    )),
+    Endpoint('GET /boards/{board_id}/changes', lambda ctx, rnd: Request(
+        'GET', f'/boards/{_board_id(ctx, rnd)}/changes', 'after=1&elements=100', {'token': ctx.token}
+    )),
+    Endpoint('POST /boards/{board_id}/messages', lambda ctx, rnd: Request(
+        'POST', f'/boards/{_board_id(ctx, rnd)}/messages',
+        body={'token': ctx.token, 'text': 'lorem ipsum ' * rnd.randint(1, 20)}
+    )),
+    Endpoint('GET /boards/{board_id}/messages/{message_id}', lambda ctx, rnd: Request(
+        'GET', '/boards/{}/messages/{}'.format(*rnd.choice(ctx.own_messages)), body={'token': ctx.token}
+    ), prepare=_own_messages),
+    Endpoint('PATCH /boards/{board_id}/messages/{message_id}', lambda ctx, rnd: Request(
+        'PATCH', '/boards/{}/messages/{}'.format(*rnd.choice(ctx.own_messages)),
+        body={'token': ctx.token, 'text': f'Edited {rnd.getrandbits(32)}'}
+    ), prepare=_own_messages),
+    Endpoint('DELETE /boards/{board_id}/messages/{message_id}', lambda ctx, rnd: Request(
+        'DELETE', '/boards/{}/messages/{}'.format(*next(ctx.own_messages_left)), body={'token': ctx.token}
+    ), prepare=_own_messages),
+    Endpoint('POST /moderation/users/{user_id}/messages', lambda ctx, rnd: Request(
+        'POST', f'/moderation/users/{next(ctx.moderated_authors_left)}/messages',
+        body={'token': ctx.token, 'action': rnd.choice(('delete', 'hide'))}
+    ), prepare=_moderated_authors),
+    Endpoint('POST /moderation/boards/{board_id}/messages', lambda ctx, rnd: Request(
+        'POST', f'/moderation/boards/{next(ctx.moderated_boards_left)}/messages',
+        body={'token': ctx.token, 'action': rnd.choice(('delete', 'hide'))}
+    ), prepare=_moderated_boards),
+    Endpoint('GET /metrics', lambda ctx, rnd: Request('GET', '/metrics'))
+]
+
+def dataset_shape(messages: int) -> tuple[int, int]:
+    """
+    Returns the number of users and boards seeded
+    along with the given number of `messages`.
+    """
+
+    users = max(50, min(10000, messages // 100))
+    boards = max(10, messages // 200)
+    return users, boards
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """
+    Returns the value below which the `fraction` of the
+    `sorted_values` lies (by the nearest-rank method).
+    """
+
+    if len(sorted_values) == 0:
+        return 0.0
+
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """
+    Summarizes the latencies (in seconds) of the requests made
+    during `elapsed` seconds, `errors` of which failed.
+    """
+
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) * 1e3 if latencies else 0.0,
+            'p50': percentile(latencies, 0.50) * 1e3,
+            'p95': percentile(latencies, 0.95) * 1e3,
+            'p99': percentile(latencies, 0.99) * 1e3,
+            'max': latencies[-1] * 1e3 if latencies else 0.0
+        }
+    }
+
+def run_testing(client: testing.TestClient, requests: list[Request]) -> dict:
+    """
+    Makes the `requests` one by one through `falcon.testing`.
+    """
+
+    latencies, errors = [], 0
+
+    start = time.perf_counter()
+    for request in requests:
+        began = time.perf_counter()
+        result = client.simulate_request(
+            request.method, request.path, query_string=request.query_string, json=request.body
+        )
+        latencies.append(time.perf_counter() - began)
+        if result.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - start
+
+    return summarize(latencies, errors, elapsed)
+
+def run_http(port: int, requests: list[Request], concurrency: int) -> dict:
+    """
+    Makes the `requests` to the server listening on `port`
+    from `concurrency` threads, each with its own connection.
+    """
+
+    chunks = [requests[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk: list[Request]) -> tuple[list[float], int]:
+        latencies, errors = [], 0
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            for request in chunk:
+                url = request.path + (f'?{request.query_string}' if request.query_string else '')
+                body = json.dumps(request.body).encode('utf-8') if request.body is not None else None
+
+                began = time.perf_counter()
+                try:
+                    conn.request(request.method, url, body=body, headers={'Content-Type': falcon.MEDIA_JSON})
+                    response = conn.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    failed = True
+                latencies.append(time.perf_counter() - began)
+                errors += failed
+        finally:
+            conn.close()
+
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+
+    return summarize([l for r in results for l in r[0]], sum(r[1] for r in results), elapsed)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_gunicorn(directory: str, workers: int, moderators: list[str]) -> tuple[subprocess.Popen, int]:
+    """
+    Starts gunicorn configured by `petboards.gunicorn_config`
+    (with `workers` workers and the given `moderators`) serving
+    `petboards.start:app` from `directory` (which has the database
+    in `data/sqlite3.db`) and waits until it accepts connections.
+    """
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [_ROOT, os.getenv('PYTHONPATH')])),
+        PETBOARDS_MODERATORS=json.dumps(moderators)
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', '-c', 'python:petboards.gunicorn_config',
+            '-b', f'127.0.0.1:{port}', '-w', str(workers), 'petboards.start:app'
+        ],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with the status {server.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+
+    server.terminate()
+    raise RuntimeError('gunicorn did not start in 30 seconds')
+
+def stop_gunicorn(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def build_requests(endpoint: Endpoint, ctx: Context, count: int, rnd: random.Random) -> list[Request]:
+    count = max(1, int(count * endpoint.weight))
+    if endpoint.prepare is not None:
+        endpoint.prepare(ctx, count)
+
+    return [endpoint.build(ctx, rnd) for _ in range(count)]
+
+def bench_dataset(messages: int, args) -> list[dict]:
+    """
+    Seeds a database with `messages` messages and
+    benchmarks every endpoint on every target.
+    """
+
+    results = []
+    users, boards = dataset_shape(messages)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.mkdir(os.path.join(directory, 'data'))
+        engine = sa.create_engine(f'sqlite:///{os.path.join(directory, "data", "sqlite3.db")}')
+
+        began = time.perf_counter()
+        dataset = seed(engine, users, boards, messages)
+        print(
+            f'seeded {users} users, {boards} boards, {messages} messages '
+            f'in {time.perf_counter() - began:.1f} s',
+            file=sys.stderr
+        )
+
+        rnd = random.Random(0)
+        token = JWT.create(dataset.usernames[0])
+        moderators = dataset.usernames[:1]
+
+        for target in args.targets:
+            ctx = Context(dataset, token, engine, target)
+
+            if target == 'testing':
+                # Sessions and middleware as in `petboards.start`,
+                # without the caches and jobs set up there.
+                session = scoped_session(sessionmaker(engine, expire_on_commit=False, class_=Session))
+                app = create_app(
+                    UserStore(session), MessageStore(session), BoardStore(session),
+                    Settings(moderators=moderators)
+                )
+                app.add_middleware(SessionMiddleware(session))
+                client = testing.TestClient(app)
+                run = lambda requests: run_testing(client, requests)
+            else:
+                server, port = start_gunicorn(directory, args.workers, moderators)
+                run = lambda requests: run_http(port, requests, args.concurrency)
+
+            try:
+                for endpoint in ENDPOINTS:
+                    requests = build_requests(endpoint, ctx, args.warmup, rnd)
+                    run(requests)
+
+                    requests = build_requests(endpoint, ctx, args.requests, rnd)
+                    summary = run(requests)
+                    results.append({'messages': messages, 'target': target, 'endpoint': endpoint.name, **summary})
+
+                    print(
+                        f'{messages:>8} {target:>8} {endpoint.name:<50} '
+                        f'{summary["throughput"]:9.1f} req/s  p50 {summary["latency_ms"]["p50"]:8.2f} ms  '
+                        f'p99 {summary["latency_ms"]["p99"]:8.2f} ms  errors {summary["errors"]}',
+                        file=sys.stderr
+                    )
+            finally:
+                if target == 'testing':
+                    session.remove()
+                else:
+                    stop_gunicorn(server)
+
+        engine.dispose()
+
+    return results
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compares the `report` with the `baseline` one and describes every
+    endpoint whose p95 latency grew, or whose throughput dropped,
+    by more than the `tolerance` fraction.
+    """
+
+    previous = {(r['messages'], r['target'], r['endpoint']): r for r in baseline['results']}
+
+    found = []
+    for result in report['results']:
+        base = previous.get((result['messages'], result['target'], result['endpoint']))
+        if base is None:
+            continue
+
+        name = f'{result["endpoint"]} ({result["target"]}, {result["messages"]} messages)'
+        if result['latency_ms']['p95'] > base['latency_ms']['p95'] * (1 + tolerance):
+            found.append(f'{name}: p95 {base["latency_ms"]["p95"]:.2f} -> {result["latency_ms"]["p95"]:.2f} ms')
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            found.append(f'{name}: throughput {base["throughput"]:.1f} -> {result["throughput"]:.1f} req/s')
+        if result['errors'] > base['errors']:
+            found.append(f'{name}: errors {base["errors"]} -> {result["errors"]}')
+
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help='numbers of messages to seed')
+    parser.add_argument('--targets', default='testing,gunicorn', help='testing and/or gunicorn')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='requests per endpoint before measuring')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent HTTP clients')
+    parser.add_argument('--output', help='file to write the JSON report to (stdout by default)')
+    parser.add_argument('--baseline', help='previous JSON report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    args.targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    unknown = set(args.targets) - {'testing', 'gunicorn'}
+    if unknown:
+        parser.error(f'unknown targets: {", ".join(sorted(unknown))}')
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'falcon': falcon.__version__,
+            'sqlalchemy': sa.__version__,
+            'requests': args.requests,
+            'workers': args.workers,
+            'concurrency': args.concurrency
+        },
+        'results': []
+    }
+
+    for messages in (int(s) for s in args.sizes.split(',')):
+        report['results'].extend(bench_dataset(messages, args))
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+
+        for line in found:
+            print(f'regression: {line}', file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
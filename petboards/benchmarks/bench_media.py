@@ -0,0 +1,74 @@
+"""
+Measures the cost of turning a full message page (50 rows of
+`MESSAGE_COLUMNS`) into the response body: serializing every row
+and encoding the page with the standard `json` module or `orjson`,
+versus serializing them from a `MessageBlock` (as the page cache
+keeps them), and splicing the messages pre-encoded in a `FragmentCache`.
+
+Usage (from the directory containing the `petboards` package):
+
+    python -m benchmarks.bench_media [--iterations N]
+"""
+
+import argparse
+import time
+import uuid
+
+from datetime import datetime, timedelta
+
+from petboards.media import JSONHandler, FragmentCache, orjson
+from petboards.models import serialize_message_row
+from petboards.records import MessageBlock
+
+def make_rows(elements: int = 50) -> list[tuple]:
+    board_id = uuid.uuid4().hex
+    start = datetime.utcnow()
+
+    return [
+        (
+            uuid.uuid4().hex,
+            f'Сообщение #{i} ' + 'lorem ipsum ' * 10,
+            uuid.uuid4().hex,
+            board_id,
+            str(start + timedelta(seconds=i)),
+            str(start + timedelta(seconds=i))
+        )
+        for i in range(elements)
+    ]
+
+def measure(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = make_rows()
+    block = MessageBlock(rows)
+    libraries = ['json'] + (['orjson'] if orjson is not None else [])
+
+    for library in libraries:
+        handler = JSONHandler(library)
+        cache = FragmentCache(handler, len(rows))
+
+        def encoded():
+            handler.dumps([serialize_message_row(row) for row in rows])
+
+        def packed():
+            handler.dumps([block.serialize(i) for i in range(len(block))])
+
+        def spliced():
+            handler.dumps([cache.get(block.key(i), block.serialize, i) for i in range(len(block))])
+
+        spliced()
+        print(f'{library:>7} encoded: {measure(encoded, args.iterations) * 1e6:8.2f} us/page')
+        print(f'{library:>7}  packed: {measure(packed, args.iterations) * 1e6:8.2f} us/page')
+        print(f'{library:>7} spliced: {measure(spliced, args.iterations) * 1e6:8.2f} us/page')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the ORM read path (loading `Board`/`Message`/`User` objects
+and calling their `serialize()` methods) with the Core read path of
+the stores for the message page, board list and user list endpoints.
+
+Every ORM iteration uses a fresh session, so the objects are actually
+loaded from the database instead of being taken from the identity map.
+
+Usage (from the directory containing the `petboards` package):
+
+    python -m benchmarks.bench_read_path [--messages N] [--iterations N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from petboards.models import Board
+from petboards.user import UserStore
+from petboards.board import BoardStore, MessageStore
+
+from .seed import seed
+
+def orm_message_page(session: Session, board_id, page: int, elements: int) -> list[dict]:
+    board = session.get(Board, board_id)
+    return [m.serialize() for m in board.messages[page * elements:page * elements + elements]]
+
+def orm_board_page(session: Session, page: int, elements: int) -> list[dict]:
+    return [b.serialize() for b in BoardStore(session).get_all(page, elements)]
+
+def orm_user_page(session: Session, page: int, elements: int) -> list[dict]:
+    return [u.serialize() for u in UserStore(session).get_all(page, elements)]
+
+def measure(engine: sa.Engine, func, iterations: int) -> float:
+    """
+    Calls `func` with a new session `iterations` times and returns
+    the mean time per call, in seconds.
+    """
+
+    total = 0.0
+    for _ in range(iterations):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            func(session)
+            total += time.perf_counter() - start
+
+    return total / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--boards', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = sa.create_engine(f'sqlite:///{os.path.join(directory, "bench.db")}')
+        dataset = seed(engine, args.users, args.boards, args.messages)
+        board_id = dataset.board_ids[0]
+
+        cases = {
+            'message page': (
+                lambda s: orm_message_page(s, board_id, 1, 50),
+                lambda s: MessageStore(s).get_page_serialized(board_id, 1, 50)
+            ),
+            'board page': (
+                lambda s: orm_board_page(s, 1, 30),
+                lambda s: BoardStore(s).get_all_serialized(1, 30)
+            ),
+            'user page': (
+                lambda s: orm_user_page(s, 1, 50),
+                lambda s: UserStore(s).get_all_serialized(1, 50)
+            )
+        }
+
+        for name, (orm, core) in cases.items():
+            orm_time = measure(engine, orm, args.iterations)
+            core_time = measure(engine, core, args.iterations)
+            print(
+                f'{name:>14}: orm {orm_time * 1e3:8.3f} ms, core {core_time * 1e3:8.3f} ms, '
+                f'speedup x{orm_time / core_time:.1f}'
+            )
+
+        engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the per-request cost of the validation hooks.
+
+Usage (from the directory containing the `petboards` package):
+
+    python -m benchmarks.bench_validation [--requests N]
+"""
+
+import argparse
+import json
+import time
+
+from falcon import testing
+
+from petboards.auth import LoginBody, RegistrationBody
+from petboards.board import MessagePaginationParams, BoardBody
+from petboards.validation import validate
+
+def json_req(payload: dict):
+    return testing.create_req(
+        body=json.dumps(payload),
+        headers={'Content-Type': 'application/json'}
+    )
+
+CASES = {
+    'login body': (
+        validate(body=LoginBody),
+        lambda: json_req({'username': 'regular_user', 'password': 'password'})
+    ),
+    'registration body': (
+        validate(body=RegistrationBody),
+        lambda: json_req({
+            'username': 'vinc3nzo',
+            'password': 'letmein',
+            'first_name': 'Евгений',
+            'last_name': 'Мангасарян'
+        })
+    ),
+    'board body': (
+        validate(body=BoardBody),
+        lambda: json_req({'token': 'token', 'topic': 'В интернете опять кто-то неправ!'})
+    ),
+    'pagination params': (
+        validate(params=MessagePaginationParams),
+        lambda: testing.create_req(query_string='page=3&elements=50')
+    )
+}
+
+def measure(hook, make_req, requests: int) -> float:
+    """
+    Runs `hook` on `requests` freshly created requests and returns
+    the mean time spent in the hook per request, in seconds.
+    Creation of the requests themselves is not measured.
+    """
+
+    reqs = [make_req() for _ in range(requests)]
+
+    start = time.perf_counter()
+    for req in reqs:
+        hook(req, None, None, {})
+    
+    return (time.perf_counter() - start) / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, (hook, make_req) in CASES.items():
+        print(f'{name:>20}: {measure(hook, make_req, args.requests) * 1e6:8.2f} us/request')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Fills a database with generated users, boards and messages
+for the benchmarks to run against.
+"""
+
+import random
+import uuid
+import bcrypt
+
+import sqlalchemy as sa
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from petboards.persistency import Base
+from petboards.models import User, Board, Message
+from petboards.board import assign_sequence_numbers
+
+PASSWORD = 'password'
+
+_CHUNK_SIZE = 10000
+
+@dataclass
+class Dataset:
+    """
+    IDs of the generated records, which the benchmarks
+    use to build their requests.
+    """
+
+    usernames: list[str] = field(default_factory=list)
+    user_ids: list[uuid.UUID] = field(default_factory=list)
+    board_ids: list[uuid.UUID] = field(default_factory=list)
+    message_ids: list[uuid.UUID] = field(default_factory=list)
+    messages: int = 0
+
+def seed(engine: sa.Engine, users: int, boards: int, messages: int, random_seed: int = 0) -> Dataset:
+    """
+    Recreates the schema in the database behind `engine` and fills
+    it with `users` users, `boards` boards and `messages` messages
+    spread randomly over the boards. All users share the password
+    `PASSWORD`.
+
+    Only the IDs of the first `_CHUNK_SIZE` messages are kept
+    in the returned `Dataset`.
+    """
+
+    rnd = random.Random(random_seed)
+    password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4))
+    start = datetime.utcnow() - timedelta(days=365)
+    dataset = Dataset(messages=messages)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        rows = []
+        for i in range(users):
+            user_id = uuid.UUID(int=rnd.getrandbits(128), version=4)
+            dataset.user_ids.append(user_id)
+            dataset.usernames.append(f'user_{i}')
+            rows.append({
+                'user_id': user_id,
+                'username': f'user_{i}',
+                '_password': password,
+                'first_name': 'Bench',
+                'last_name': 'User',
+                'registered': start,
+                'last_login': start
+            })
+        conn.execute(sa.insert(User), rows)
+
+        rows = []
+        for i in range(boards):
+            board_id = uuid.UUID(int=rnd.getrandbits(128), version=4)
+            dataset.board_ids.append(board_id)
+            rows.append({
+                'board_id': board_id,
+                'topic': f'Board #{i}',
+                'created_at': start + timedelta(seconds=i),
+                'creator_id': rnd.choice(dataset.user_ids)
+            })
+        conn.execute(sa.insert(Board), rows)
+
+        for offset in range(0, messages, _CHUNK_SIZE):
+            rows = []
+            for i in range(offset, min(offset + _CHUNK_SIZE, messages)):
+                message_id = uuid.UUID(int=rnd.getrandbits(128), version=4)
+                if len(dataset.message_ids) < _CHUNK_SIZE:
+                    dataset.message_ids.append(message_id)
+
+                created = start + timedelta(milliseconds=i)
+                rows.append({
+                    'message_id': message_id,
+                    'text': f'Message #{i} ' + 'lorem ipsum ' * rnd.randint(1, 20),
+                    'timestamp': created,
+                    'last_edited': created,
+                    'author_id': rnd.choice(dataset.user_ids),
+                    'board_id': rnd.choice(dataset.board_ids)
+                })
+            conn.execute(sa.insert(Message), rows)
+
+        assign_sequence_numbers(conn)
+
+    return dataset
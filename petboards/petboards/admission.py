@@ -0,0 +1,246 @@
+import falcon
+
+import time
+import heapq
+import itertools
+import threading
+
+from .metrics import Histogram, DURATION_BUCKETS
+
+REQUEST_START_HEADER = 'X-Request-Start'
+
+# Classes of requests, from the first admitted to the last one:
+# reads are cheap and most of the traffic, writes hold the lock of
+# the SQLite database, and logins spend much CPU on password hashing.
+READ, WRITE, LOGIN = 0, 1, 2
+CLASSES = ('read', 'write', 'login')
+
+def classify(req: falcon.Request) -> int:
+    """
+    Returns the class of the request, from its path and method only,
+    since the middleware admits the requests before they are routed.
+    """
+
+    if req.path.startswith('/auth/'):
+        return LOGIN
+    if req.method in ('GET', 'HEAD', 'OPTIONS'):
+        return READ
+    return WRITE
+
+def upstream_wait(value: str | None) -> float:
+    """
+    Returns how long (in seconds) the request has waited before reaching
+    the application, according to the `X-Request-Start` header set by
+    the proxy in front of it: the time it received the request, in
+    seconds, milliseconds or microseconds since the epoch, optionally
+    prefixed with `t=` (as nginx and Heroku set it).
+    """
+
+    if value is None:
+        return 0.0
+
+    try:
+        start = float(value.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+
+    # The clocks of the proxy and the application may differ a bit.
+    return max(0.0, time.time() - start)
+
+def default_max_in_flight(concurrency: int, connections: int | None = None) -> int:
+    """
+    Returns the limit of requests in flight for a worker, that takes
+    up to `concurrency` requests at once (its threads or connections)
+    and has up to `connections` connections to the database (unknown,
+    if `None`). Beyond the connections, the requests would only wait in
+    the pool, in no particular order, rather than in the queue of the
+    application, ordered by class. Otherwise, the limit is one less
+    than the `concurrency`, so that the queue is used at all.
+    """
+
+    limit = concurrency - 1
+    if connections is not None:
+        limit = min(limit, connections)
+
+    return max(1, limit)
+
+class AdmissionController:
+    """
+    Limits the number of requests handled at once by the worker to
+    `max_in_flight` (no limit if it's `None`, until it's `resize()`d
+    for the worker). Requests beyond the limit wait for a free slot in a
+    queue of up to `max_queue` requests, the ones of a lower class first
+    and in the order of arrival within a class, but no longer than
+    `queue_timeout` seconds. A request is rejected if it can't be
+    admitted in time, or if the queue is full and holds no request of
+    a higher class, which is rejected instead to make room for it.
+
+    The numbers of admitted and rejected requests and the times they
+    waited are counted by class.
+    """
+
+    def __init__(self, max_in_flight: int | None, max_queue: int, queue_timeout: float):
+        self._max_in_flight = max_in_flight
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+
+        self._condition = threading.Condition()
+        self._order = itertools.count()
+
+        # Entries are lists of the class, the order of arrival
+        # and whether the request was pushed out of the queue.
+        self._waiting: list[list] = []
+
+        self.in_flight: int = 0
+        self.admitted = [0] * len(CLASSES)
+        self.rejected = [0] * len(CLASSES)
+        self.queue_times = [Histogram(DURATION_BUCKETS) for _ in CLASSES]
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def max_in_flight(self) -> int | None:
+        return self._max_in_flight
+
+    def resize(self, max_in_flight: int | None):
+        """
+        Changes the limit of requests in flight, e.g. once the number
+        of requests the worker takes at once is known.
+        """
+
+        with self._condition:
+            self._max_in_flight = max_in_flight
+            # A higher limit may free slots.
+            self._condition.notify_all()
+
+    def _has_slot(self) -> bool:
+        return self._max_in_flight is None or self.in_flight < self._max_in_flight
+
+    def acquire(self, request_class: int, waited: float = 0.0) -> bool:
+        """
+        Waits until a request of `request_class`, that has already waited
+        `waited` seconds elsewhere, may be handled. Returns `False` if
+        it was rejected instead. Every admitted request must `release()`.
+        """
+
+        start = time.perf_counter()
+        deadline = start + self._queue_timeout - waited
+
+        with self._condition:
+            # A request, that has waited too long upstream, is rejected
+            # even if there's a free slot: its client may have given up.
+            if start >= deadline:
+                return self._reject(request_class)
+
+            if self._has_slot() and len(self._waiting) == 0:
+                return self._admit(request_class, waited)
+
+            if len(self._waiting) >= self._max_queue:
+                last = max(self._waiting, default=None)
+                if last is None or last[0] <= request_class:
+                    return self._reject(request_class)
+
+                self._remove(last)
+                last[2] = True
+
+            entry = [request_class, next(self._order), False]
+            heapq.heappush(self._waiting, entry)
+
+            while True:
+                if entry[2]:
+                    return self._reject(request_class)
+
+                if self._has_slot() and self._waiting[0] is entry:
+                    heapq.heappop(self._waiting)
+                    # There may be more than one free slot.
+                    self._condition.notify_all()
+                    return self._admit(request_class, waited + time.perf_counter() - start)
+
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._remove(entry)
+                    return self._reject(request_class)
+
+                self._condition.wait(remaining)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            if len(self._waiting) > 0:
+                self._condition.notify_all()
+
+    def _admit(self, request_class: int, waited: float) -> bool:
+        self.in_flight += 1
+        self.admitted[request_class] += 1
+        self.queue_times[request_class].observe(waited)
+        return True
+
+    def _reject(self, request_class: int) -> bool:
+        self.rejected[request_class] += 1
+        return False
+
+    def _remove(self, entry: list):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        # The head of the queue may have changed.
+        self._condition.notify_all()
+
+    def snapshot(self) -> tuple[int, int, list[tuple[str, int, int, Histogram]]]:
+        """
+        Returns the numbers of requests in flight and waiting, and the
+        name, the numbers of admitted and rejected requests and a copy
+        of the histogram of the queue times of every class.
+        """
+
+        with self._condition:
+            classes = []
+            for i, name in enumerate(CLASSES):
+                histogram = Histogram(DURATION_BUCKETS)
+                histogram.counts = list(self.queue_times[i].counts)
+                histogram.sum, histogram.count = self.queue_times[i].sum, self.queue_times[i].count
+                classes.append((name, self.admitted[i], self.rejected[i], histogram))
+
+            return self.in_flight, len(self._waiting), classes
+
+class AdmissionMiddleware:
+    """
+    Admits every request through the `AdmissionController` before it
+    is routed, and responds to the rejected ones at once with
+    `503 Service Unavailable` and a `Retry-After` of `retry_after`
+    seconds, rather than letting them wait until they time out.
+
+    The time the request has waited in the proxy, according to the
+    `X-Request-Start` header, counts towards the queue timeout.
+    Requests to the `exempt` paths (e.g. `/metrics`) are never limited.
+    """
+
+    def __init__(self, controller: AdmissionController, retry_after: int = 1, exempt: tuple[str, ...] = ('/metrics',)):
+        self._controller = controller
+        self._retry_after = retry_after
+        self._exempt = frozenset(exempt)
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        if req.path in self._exempt:
+            return
+
+        waited = upstream_wait(req.get_header(REQUEST_START_HEADER))
+        if not self._controller.acquire(classify(req), waited):
+            raise falcon.HTTPServiceUnavailable(
+                title='error',
+                description='The server is overloaded, please retry later',
+                retry_after=self._retry_after
+            )
+
+        req.context.admitted = True
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        if getattr(req.context, 'admitted', False):
+            req.context.admitted = False
+            self._controller.release()
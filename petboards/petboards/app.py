@@ -3,24 +3,120 @@ import falcon
 from .user import UserStore, UserResource
 from .auth import AuthResource
 from .board import MessageStore, BoardStore, BoardResource, MessageResource
+from .moderation import ModerationResource
+from .config import Settings
+from .media import JSONHandler, FragmentCache
+from .compression import CompressionMiddleware
+from .metrics import Metrics, MetricsMiddleware, MetricsResource
+from .budget import QueryBudget, QueryBudgetMiddleware
+from .profiling import ProfilingMiddleware
+from .logs import RequestLoggingMiddleware
+from .coalescing import SingleFlight
+from .snapshots import SnapshotStore
+from .admission import AdmissionController, AdmissionMiddleware
 
-def create_app(user_store: UserStore, message_store: MessageStore, board_store: BoardStore) -> falcon.App:
-    users = UserResource(user_store)
-    messages = MessageResource(message_store, board_store, user_store)
-    boards = BoardResource(board_store, user_store)
+def create_app(
+    user_store: UserStore,
+    message_store: MessageStore,
+    board_store: BoardStore,
+    settings: Settings | None = None,
+    metrics: Metrics | None = None,
+    query_budget: QueryBudget | None = None,
+    snapshots: SnapshotStore | None = None,
+    admission: AdmissionController | None = None
+) -> falcon.App:
+    if settings is None:
+        settings = Settings()
+    if metrics is None and settings.metrics_enabled:
+        metrics = Metrics()
+
+    json_handler = JSONHandler(settings.json_library)
+    fragments = FragmentCache(json_handler, settings.fragment_cache_size)
+
+    # Identical concurrent reads are handled once.
+    flights = SingleFlight() if settings.coalescing_enabled else None
+
+    users = UserResource(user_store, flights)
+    messages = MessageResource(message_store, board_store, user_store, fragments, flights, snapshots)
+    boards = BoardResource(board_store, user_store, flights)
     auth = AuthResource(user_store)
+    moderation = ModerationResource(message_store, frozenset(settings.moderators))
+
+    # The correlation ID is set first, so that
+    # every other middleware may log with it.
+    middleware = [RequestLoggingMiddleware(access_log=settings.access_log)]
+
+    if settings.profiling_enabled:
+        # Before the other middleware, so that they are profiled too.
+        middleware.append(ProfilingMiddleware(
+            settings.profiling_directory,
+            token=settings.profiling_token,
+            sample_rate=settings.profiling_sample_rate,
+            mode=settings.profiling_mode,
+            interval=settings.profiling_interval,
+            max_files=settings.profiling_max_files
+        ))
+
+    if metrics is not None:
+        # Before the other middleware, so that the time
+        # spent in them is measured as well.
+        middleware.append(MetricsMiddleware(metrics))
+        metrics.add_cache('fragments', fragments)
+        if flights is not None:
+            metrics.add_cache('coalescing', flights)
+        if snapshots is not None:
+            metrics.add_cache('snapshots', snapshots)
+
+    if settings.admission_enabled:
+        # After the metrics, so that the time spent in the
+        # queue and the rejected requests are recorded too.
+        if admission is None:
+            admission = AdmissionController(
+                settings.admission_max_in_flight,
+                settings.admission_max_queue,
+                settings.admission_queue_timeout
+            )
+        middleware.append(AdmissionMiddleware(admission, retry_after=settings.admission_retry_after))
+        if metrics is not None:
+            metrics.add_admission(admission)
+
+    if query_budget is not None:
+        middleware.append(QueryBudgetMiddleware(query_budget, log=settings.query_budget_log))
+
+    if settings.compression_enabled:
+        compression = CompressionMiddleware(
+            min_size=settings.compression_min_size,
+            level=settings.compression_level,
+            brotli_quality=settings.compression_brotli_quality,
+            cache_size=settings.compression_cache_size
+        )
+        middleware.append(compression)
+        if metrics is not None:
+            metrics.add_cache('compression', compression)
+
+    app = falcon.App(middleware=middleware)
+    app.req_options.media_handlers[falcon.MEDIA_JSON] = json_handler
+    app.resp_options.media_handlers[falcon.MEDIA_JSON] = json_handler
 
-    app = falcon.App()
     app.add_route('/auth/login', auth, suffix='login')
     app.add_route('/auth/register', auth, suffix='register')
 
     app.add_route('/users', users)
     app.add_route('/users/{user_id:uuid}', users, suffix='one')
+    app.add_route('/users/{user_id:uuid}/messages', messages, suffix='by_author')
 
     app.add_route('/boards', boards)
+    app.add_route('/boards/digest', boards, suffix='digest')
     app.add_route('/boards/{board_id:uuid}', boards, suffix='one')
 
     app.add_route('/boards/{board_id:uuid}/messages', messages)
     app.add_route('/boards/{board_id:uuid}/messages/{message_id:uuid}', messages, suffix='one')
+    app.add_route('/boards/{board_id:uuid}/changes', messages, suffix='changes')
+
+    app.add_route('/moderation/users/{user_id:uuid}/messages', moderation, suffix='author')
+    app.add_route('/moderation/boards/{board_id:uuid}/messages', moderation, suffix='board')
+
+    if metrics is not None:
+        app.add_route('/metrics', MetricsResource(metrics))
 
     return app
\ No newline at end of file
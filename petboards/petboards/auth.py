@@ -3,16 +3,21 @@ import bcrypt
 
 import re
 from datetime import datetime
+from pydantic import BaseModel, validator
 
 from .user import UserStore, User
 from .security import JWT
+from .validation import validate
+from .budget import query_budget
+
+_USERNAME_EXPR = re.compile(r'^[a-zA-Z0-9_]{1,128}$')
+_NAME_EXPR = re.compile(r'^[a-zA-Zа-яА-Я]{,128}$')
 
 def check_username(username: str) -> bool:
     if username is None:
         return False
 
-    expr = re.compile(r'^[a-zA-Z0-9_]{1,128}$')
-    if expr.fullmatch(username):
+    if _USERNAME_EXPR.fullmatch(username):
         return True
     
     return False
@@ -27,8 +32,7 @@ def check_first_name(first_name: str) -> bool:
     if first_name is None:
         return False
 
-    expr = re.compile(r'^[a-zA-Zа-яА-Я]{,128}$')
-    if expr.fullmatch(first_name):
+    if _NAME_EXPR.fullmatch(first_name):
         return True
     
     return False
@@ -37,25 +41,39 @@ def check_last_name(last_name: str) -> bool:
     if last_name is None:
         return False
 
-    expr = re.compile(r'^[a-zA-Zа-яА-Я]{,128}$')
-    if expr.fullmatch(last_name):
+    if _NAME_EXPR.fullmatch(last_name):
         return True
     
     return False
 
-def validate_login_request(req, resp, resource, params):
-    body = req.media
-    if body is None or 'username' not in body or 'password' not in body or \
-        not check_username(body['username']) or not check_password(body['password']):
-        raise falcon.HTTPBadRequest
+class LoginBody(BaseModel):
+    username: str
+    password: str
+
+    @validator('username')
+    def username_valid(cls, username: str) -> str:
+        if not check_username(username):
+            raise ValueError('The username may only contain 1 to 128 latin letters, digits and underscores')
+
+        return username
+
+class RegistrationBody(LoginBody):
+    first_name: str
+    last_name: str
+
+    @validator('first_name')
+    def first_name_valid(cls, first_name: str) -> str:
+        if not check_first_name(first_name):
+            raise ValueError('The first name may only contain up to 128 letters')
+
+        return first_name
+
+    @validator('last_name')
+    def last_name_valid(cls, last_name: str) -> str:
+        if not check_last_name(last_name):
+            raise ValueError('The last name may only contain up to 128 letters')
 
-def validate_registration_request(req, resp, resource, params):
-    body = req.media
-    if body is None or 'username' not in body or 'password' not in body or \
-        'first_name' not in body or 'last_name' not in body or \
-        not check_username(body['username']) or not check_password(body['password']) or \
-        not check_first_name(body['first_name']) or not check_last_name(body['last_name']):
-        raise falcon.HTTPBadRequest
+        return last_name
 
 class AuthResource:
 
@@ -64,16 +82,17 @@ class AuthResource:
 
         self._user_store: UserStore = user_store
     
-    @falcon.before(validate_login_request)
+    @falcon.before(query_budget(2))
+    @falcon.before(validate(body=LoginBody))
     def on_post_login(self, req: falcon.Request, resp: falcon.Response):
         """
         Checks the credentials provided, authorizes the user,
         and responds with a freshly created JWT token.
         """
 
-        body = req.media
-        username = body['username']
-        password = body['password'].encode('utf-8')
+        body: LoginBody = req.context.body
+        username = body.username
+        password = body.password.encode('utf-8')
 
         user = self._user_store.get_by_username(username)
         if user is None:
@@ -84,8 +103,7 @@ class AuthResource:
         if not bcrypt.checkpw(password, user._password):
             raise falcon.HTTPNotFound(title='error', description='Invalid login or password')
         
-        user.last_login = datetime.utcnow()
-        self._user_store.save(user)
+        self._user_store.record_login(user, datetime.utcnow())
         
         token = JWT.create(user.username)
 
@@ -96,7 +114,8 @@ class AuthResource:
             'token': token
         }
 
-    @falcon.before(validate_registration_request)
+    @falcon.before(query_budget(2))
+    @falcon.before(validate(body=RegistrationBody))
     def on_post_register(self, req: falcon.Request, resp: falcon.Response):
         """
         Registers a new user with the information provided
@@ -104,11 +123,11 @@ class AuthResource:
         after that.
         """
         
-        body = req.media
-        username = body['username']
-        password = body['password']
-        first_name = body['first_name']
-        last_name = body['last_name']
+        body: RegistrationBody = req.context.body
+        username = body.username
+        password = body.password
+        first_name = body.first_name
+        last_name = body.last_name
 
         existing_user = self._user_store.get_by_username(username)
 
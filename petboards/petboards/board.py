@@ -4,105 +4,718 @@ import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
 import uuid
+from typing import ClassVar
+from datetime import datetime
+from pydantic import BaseModel, validator, root_validator
 
-from .security import require_authorization, JWT
-from .models import Message, Board
+from .security import require_authorization
+from .validation import (
+    validate, PaginationParams, CursorPaginationParams, SparseFieldsParams, ExpandParams, IdsParams, encode_cursor
+)
+from .budget import query_budget
+from .persistency import raw, uuid_str, timestamp
+from .models import (
+    Message, Board, User, Tombstone, MESSAGE_COLUMNS, USER_COLUMNS, AUTHOR_COLUMNS,
+    MESSAGE_FIELDS, BOARD_FIELDS, BOARD_RELATIONS, select_fields,
+    serialize_message_row, serialize_user_row, serialize_author_row, serialize_first_message_row,
+    select_first_messages, select_latest_messages
+)
 from .user import UserStore
+from .media import FragmentCache, Fragment
+from .generations import GenerationalCache
+from .coalescing import SingleFlight, coalesced
+from .snapshots import SnapshotStore
+from .records import MessageBlock
 
-def validate_message_pagination_params(req, resp, resource, params):
-    _PAGINATION_MAX_ELEMENTS = 50
-    
-    if 'page' not in req.params or 'elements' not in req.params:
-        raise falcon.HTTPBadRequest
-    
-    page = int(req.params['page'])
-    elements = int(req.params['elements'])
+class MessageParams(ExpandParams):
+    """
+    Query string of a request for messages, that may inline the
+    profiles of their authors with `expand=author`.
+    """
+
+    allowed_expansions = frozenset({'author'})
+
+    @root_validator(skip_on_failure=True)
+    def author_id_with_author(cls, values: dict) -> dict:
+        fields = values.get('fields')
+        if 'author' in values['expand'] and fields is not None and 'author_id' not in fields:
+            raise ValueError('The author can only be expanded along with the author_id field')
+
+        return values
+
+class MessagePaginationParams(PaginationParams, SparseFieldsParams, MessageParams):
+    max_elements = 50
+    allowed_fields = frozenset(MESSAGE_FIELDS)
+
+class AuthorMessagesParams(CursorPaginationParams, SparseFieldsParams, MessageParams):
+    max_elements = 50
+    key_size = 2
+    allowed_fields = frozenset(MESSAGE_FIELDS)
+
+    @validator('page')
+    def page_not_supported(cls, page: int | None) -> int | None:
+        if page is not None:
+            raise ValueError('The messages of a user can only be paginated by cursor')
+
+        return page
+
+class ChangesParams(BaseModel):
+    """
+    Query string of a request for the changes of a board following
+    the sequence number `after` (0 for all of them), at most
+    `elements` (up to `max_elements`) of them.
+    """
+
+    max_elements: ClassVar[int] = 500
+
+    after: int = 0
+    elements: int = 100
+
+    @validator('after')
+    def after_not_negative(cls, after: int) -> int:
+        if after < 0:
+            raise ValueError('The sequence number cannot be negative')
+
+        return after
+
+    @validator('elements')
+    def elements_in_range(cls, elements: int) -> int:
+        # Without a single change, the next `after` couldn't be told.
+        if elements < 1:
+            raise ValueError('At least one change must be requested')
+        if elements > cls.max_elements:
+            raise ValueError(f'The maximum number of changes is {cls.max_elements}')
 
-    if page < 0:
-        raise falcon.HTTPBadRequest('page', 'The page index cannot be negative')
+        return elements
 
-    if elements < 0:
-        raise falcon.HTTPBadRequest('elements', 'The number of elements per page cannot be negative')
-    if elements > _PAGINATION_MAX_ELEMENTS:
-        raise falcon.HTTPBadRequest('elements', f'The maximum number of elements per page is {_PAGINATION_MAX_ELEMENTS}')
+class MessageBody(BaseModel):
+    text: str
+
+def _split_authors(rows, authors: dict) -> list:
+    # The columns of the author follow the ones of the message in
+    # every row, and every author is added to `authors` only once.
+    size = len(AUTHOR_COLUMNS)
+    messages = []
+    for row in rows:
+        author = serialize_author_row(row[-size:])
+        if author is not None:
+            authors.setdefault(*author)
+        messages.append(row[:-size])
+
+    return messages
 
 class MessageStore():
 
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, cache: GenerationalCache | None = None):
         self._db = db_session
+        self._cache = cache
+
+    def get_page_serialized(
+        self,
+        board_id: uuid.UUID,
+        page: int,
+        elements: int,
+        encode=MessageBlock.serialize,
+        fields: frozenset[str] | None = None,
+        authors: dict | None = None
+    ) -> list | None:
+        """
+        Fetches `elements` messages from the board with UUID `board_id`
+        starting at page `page`, sorted by their `timestamp`, and returns
+        them serialized like `Message.serialize()` does, without loading
+        any ORM objects. If the board doesn't exist, `None` is returned.
+
+        The rows are packed into a `MessageBlock`, and every message is
+        turned into the resulting value by `encode(block, index)`. If
+        `fields` is given instead, only these keys are returned (and,
+        unless there's a cache, only their columns queried).
+
+        If there's a cache, the block is kept in it until the board
+        changes, and serves the page whatever `fields` are requested.
+
+        If `authors` is given, the profiles of the authors are read in
+        the same query as the messages, bypassing the cache, and added
+        to it by their IDs (see `serialize_author_row()`).
+        """
+
+        if authors is not None:
+            return self._get_page_with_authors(board_id, page, elements, encode, fields, authors)
+
+        if self._cache is None:
+            if fields is not None:
+                return self._get_page_fields(board_id, page, elements, fields)
+
+            block = self._get_page(board_id, page, elements)
+        else:
+            block = self._cache.get(
+                ('messages', board_id, page, elements),
+                (('board', board_id),),
+                lambda: self._get_page(board_id, page, elements)
+            )
+
+        if block is None:
+            return None
+        if fields is not None:
+            return [block.serialize(i, fields) for i in range(len(block))]
+
+        return [encode(block, i) for i in range(len(block))]
+
+    def _select_page(
+        self, board_id: uuid.UUID, page: int, elements: int, columns, join_authors: bool = False
+    ) -> sa.Result | None:
+        if self._db.execute(sa.select(Board.board_id).where(Board.board_id == board_id)).first() is None:
+            return None
+
+        query = sa.select(*columns)
+        if join_authors:
+            query = query.add_columns(*AUTHOR_COLUMNS).outerjoin_from(Message, User, User.user_id == Message.author_id)
+
+        return self._db.execute(
+            query
+            .where(Message.board_id == board_id, Message.hidden_at.is_(None))
+            .order_by(Message.timestamp)
+            .offset(page * elements)
+            .limit(elements)
+        )
+
+    def _get_page(self, board_id: uuid.UUID, page: int, elements: int) -> MessageBlock | None:
+        rows = self._select_page(board_id, page, elements, MESSAGE_COLUMNS)
+
+        return MessageBlock(rows) if rows is not None else None
+
+    def _get_page_fields(self, board_id: uuid.UUID, page: int, elements: int, fields: frozenset[str]) -> list | None:
+        columns, serialize = select_fields(MESSAGE_FIELDS, fields)
+        rows = self._select_page(board_id, page, elements, columns)
+
+        return [serialize(row) for row in rows] if rows is not None else None
+
+    def _get_page_with_authors(
+        self, board_id: uuid.UUID, page: int, elements: int, encode, fields: frozenset[str] | None, authors: dict
+    ) -> list | None:
+        columns, serialize = MESSAGE_COLUMNS, None
+        if fields is not None:
+            columns, serialize = select_fields(MESSAGE_FIELDS, fields)
+
+        rows = self._select_page(board_id, page, elements, columns, join_authors=True)
+        if rows is None:
+            return None
+
+        rows = _split_authors(rows, authors)
+        if serialize is not None:
+            return [serialize(row) for row in rows]
+
+        block = MessageBlock(rows)
+        return [encode(block, i) for i in range(len(block))]
+
+    def get_serialized(self, board_id: uuid.UUID, message_id: uuid.UUID, authors: dict | None = None) -> dict | None:
+        """
+        Fetches the message with UUID `message_id` on the board with UUID
+        `board_id` in a single query, and returns it serialized like
+        `Message.serialize()` does, or `None` if there's no such message.
+        Its author is added to `authors` like `get_page_serialized()` does.
+        """
+
+        query = sa.select(*MESSAGE_COLUMNS) \
+            .where(Message.message_id == message_id, Message.board_id == board_id, Message.hidden_at.is_(None))
+        if authors is not None:
+            query = query.add_columns(*AUTHOR_COLUMNS).outerjoin_from(Message, User, User.user_id == Message.author_id)
+
+        rows = self._db.execute(query).all()
+        if len(rows) == 0:
+            return None
+        if authors is not None:
+            rows = _split_authors(rows, authors)
+
+        return MessageBlock(rows).serialize(0)
+
+    def get_by_author_serialized(
+        self,
+        author_id: uuid.UUID,
+        after: tuple | None,
+        elements: int,
+        encode=MessageBlock.serialize,
+        fields: frozenset[str] | None = None,
+        authors: dict | None = None
+    ) -> tuple[list, tuple | None] | None:
+        """
+        Fetches `elements` messages written by the user with UUID
+        `author_id` on any board, following the one with the sort key
+        `after` (or the first ones, if it's `None`), sorted by their
+        `timestamp`, using the index on `(author_id, timestamp, message_id)`.
+        The messages are serialized, and their author is added to
+        `authors`, like `get_page_serialized()` does.
+
+        Returns the messages and the sort key of the last of them, or
+        `None` instead of the key if there are no more messages. If
+        the user doesn't exist, `None` is returned.
+        """
+
+        if self._db.execute(sa.select(User.user_id).where(User.user_id == author_id)).first() is None:
+            return None
+
+        columns, serialize = MESSAGE_COLUMNS, None
+        if fields is not None:
+            columns, serialize = select_fields(MESSAGE_FIELDS, fields)
+
+        query = sa.select(raw(Message.timestamp), raw(Message.message_id), *columns) \
+            .where(Message.author_id == author_id, Message.hidden_at.is_(None))
+        if authors is not None:
+            query = query.add_columns(*AUTHOR_COLUMNS).outerjoin_from(Message, User, User.user_id == Message.author_id)
+        if after is not None:
+            key = sa.tuple_(sa.type_coerce(Message.timestamp, sa.String), sa.type_coerce(Message.message_id, sa.String))
+            query = query.where(key > sa.tuple_(*after))
+
+        # One more row is fetched to know whether there's a next page.
+        rows = self._db.execute(query.order_by(Message.timestamp, Message.message_id).limit(elements + 1)).all()
+
+        last = None
+        if len(rows) > elements:
+            rows = rows[:elements]
+            if elements > 0:
+                last = (rows[-1][0], rows[-1][1])
+
+        if authors is not None:
+            rows = _split_authors(rows, authors)
+        if serialize is not None:
+            return [serialize(row[2:]) for row in rows], last
+
+        block = MessageBlock(row[2:] for row in rows)
+        return [encode(block, i) for i in range(len(block))], last
+
+    def get_last_message_time(self, board_id: uuid.UUID) -> datetime | None:
+        """
+        Returns the time of the latest message on the board with UUID
+        `board_id`, found with the `(board_id, timestamp)` index, or
+        `None` if there are no messages on it.
+        """
+
+        return self._db.execute(sa.select(sa.func.max(Message.timestamp)).where(Message.board_id == board_id)).scalar()
+
+    def get_sequence(self, board_id: uuid.UUID) -> tuple[int, int] | None:
+        """
+        Returns the sequence number of the latest change of the messages
+        on the board with UUID `board_id`, and of the latest tombstone
+        removed from it by `compact_tombstones()`. If the board doesn't
+        exist, `None` is returned.
+        """
+
+        row = self._db.execute(sa.select(Board.last_seq, Board.purged_seq).where(Board.board_id == board_id)).first()
+        return (row[0], row[1]) if row is not None else None
+
+    def get_changes_serialized(
+        self,
+        board_id: uuid.UUID,
+        after: int,
+        elements: int,
+        encode=MessageBlock.serialize,
+        deletes: bool = True
+    ) -> tuple[list[dict], bool]:
+        """
+        Fetches up to `elements` changes of the messages on the board
+        with UUID `board_id` following the sequence number `after`, in
+        their order, using the indexes on `(board_id, seq)`. A message
+        changed several times is only listed with its latest change,
+        and a hidden message is listed as deleted.
+
+        Every change has the `seq` and the `op`: `create` or `edit`,
+        with the `message` made by `encode()` like `get_page_serialized()`
+        does, or `delete`, with the `message_id` (unless
+        `deletes` is false). Returns the changes and whether there are
+        more of them.
+        """
+
+        rows = self._db.execute(
+            sa.select(Message.seq, Message.created_seq, *MESSAGE_COLUMNS)
+            .where(Message.board_id == board_id, Message.seq > after, Message.hidden_at.is_(None))
+            .order_by(Message.seq)
+            .limit(elements + 1)
+        ).all()
+
+        block = MessageBlock(row[2:] for row in rows)
+        changes = [
+            {
+                'seq': row[0],
+                'op': 'create' if row[1] is not None and row[1] > after else 'edit',
+                'message': encode(block, i)
+            }
+            for i, row in enumerate(rows)
+        ]
+
+        if deletes:
+            tombstones = self._db.execute(
+                sa.select(Tombstone.seq, raw(Tombstone.message_id))
+                .where(Tombstone.board_id == board_id, Tombstone.seq > after)
+                .order_by(Tombstone.seq)
+                .limit(elements + 1)
+            )
+
+            changes += [{'seq': seq, 'op': 'delete', 'message_id': uuid_str(message_id)} for seq, message_id in tombstones]
+            changes.sort(key=lambda change: change['seq'])
+
+        return changes[:elements], len(changes) > elements
 
     def save(self, message: Message):
         """
-        Updates/Adds a `message` into the database.
+        Updates/Adds a `message` into the database,
+        as the next change of its board.
         """
 
+        board_id = message.board_id if message.board_id is not None else message.board.board_id
+        with self._db.no_autoflush:
+            message.seq = self._next_seq(board_id)
+        if message.created_seq is None:
+            message.created_seq = message.seq
+
         self._db.add(message)
         self._db.commit()
+        self._changed(board_id)
 
     def delete(self, message: Message):
         """
-        Deletes a `message` from the database.
+        Deletes a `message` from the database, leaving
+        a tombstone as the next change of its board.
         """
 
+        board_id = message.board_id
+        with self._db.no_autoflush:
+            seq = self._next_seq(board_id)
+
+        self._db.add(Tombstone(board_id, seq, message.message_id))
         self._db.delete(message)
         self._db.commit()
+        self._changed(board_id)
+
+    def compact_tombstones(self, older_than: datetime) -> int:
+        """
+        Removes the tombstones of the messages deleted before
+        `older_than`, and returns how many of them were removed.
+        The clients, that synced the changes of a board before its
+        latest removed tombstone, have to fetch the board again.
+        """
+
+        purged = sa.select(sa.func.max(Tombstone.seq)) \
+            .where(Tombstone.board_id == Board.board_id, Tombstone.deleted_at < older_than) \
+            .scalar_subquery()
+        boards = sa.select(Tombstone.board_id).where(Tombstone.deleted_at < older_than)
+
+        self._db.execute(sa.update(Board.__table__).where(Board.board_id.in_(boards)).values(purged_seq=purged))
+        removed = self._db.execute(sa.delete(Tombstone.__table__).where(Tombstone.deleted_at < older_than)).rowcount
+        self._db.commit()
+
+        return removed
+
+    def remove_by_author(self, author_id: uuid.UUID, hide: bool = False) -> tuple[int, int] | None:
+        """
+        Deletes (or hides, if `hide` is set) all messages written by the
+        user with UUID `author_id` on any board, see `remove()`. If the
+        user doesn't exist, `None` is returned.
+        """
+
+        if self._db.execute(sa.select(User.user_id).where(User.user_id == author_id)).first() is None:
+            return None
+
+        return self.remove(Message.author_id == author_id, hide)
+
+    def remove_from_board(self, board_id: uuid.UUID, hide: bool = False) -> tuple[int, int] | None:
+        """
+        Deletes (or hides, if `hide` is set) all messages on the board
+        with UUID `board_id`, see `remove()`. If the board doesn't
+        exist, `None` is returned.
+        """
+
+        if self._db.execute(sa.select(Board.board_id).where(Board.board_id == board_id)).first() is None:
+            return None
+
+        return self.remove(Message.board_id == board_id, hide)
+
+    def remove(self, condition, hide: bool = False) -> tuple[int, int]:
+        """
+        Deletes all messages matching the `condition`, or hides them,
+        if `hide` is set, with a few set-based statements in a single
+        transaction, however many messages there are. Every message,
+        that was visible, leaves a tombstone as the next change of its
+        board, like `delete()` does.
+
+        Returns the numbers of the messages removed, and of the boards,
+        whose visible messages changed.
+        """
+
+        messages, boards, tombstones = Message.__table__, Board.__table__, Tombstone.__table__
+        visible = sa.and_(condition, messages.c.hidden_at.is_(None))
+        now = datetime.utcnow()
+
+        # The messages of a board are numbered in the order they were
+        # posted, following the latest change of the board. The insert
+        # takes the write lock of the database, which is held until the
+        # commit, so the following statements see the same messages.
+        numbered = sa.select(
+            messages.c.board_id,
+            boards.c.last_seq + sa.func.row_number().over(
+                partition_by=messages.c.board_id,
+                order_by=(messages.c.timestamp, messages.c.message_id)
+            ),
+            messages.c.message_id,
+            sa.literal(now, sa.DateTime())
+        ).join(boards, boards.c.board_id == messages.c.board_id).where(visible)
+
+        self._db.execute(
+            sa.insert(tombstones).from_select(('board_id', 'seq', 'message_id', 'deleted_at'), numbered)
+        )
+
+        # The boards to invalidate are the ones this very update changed.
+        removed = sa.select(sa.func.count()).where(visible, messages.c.board_id == boards.c.board_id).scalar_subquery()
+        changed = self._db.execute(
+            sa.update(boards)
+            .where(boards.c.board_id.in_(sa.select(messages.c.board_id).where(visible)))
+            .values(last_seq=boards.c.last_seq + removed)
+            .returning(boards.c.board_id, boards.c.creator_id)
+        ).all()
+
+        if hide:
+            count = self._db.execute(sa.update(messages).where(visible).values(hidden_at=now)).rowcount
+        else:
+            count = self._db.execute(sa.delete(messages).where(condition)).rowcount
+
+        self._db.commit()
+
+        # The statements bypass the identity map, so
+        # the objects loaded before must be reloaded.
+        self._db.expire_all()
+
+        if self._cache is not None:
+            for board_id, creator_id in changed:
+                self._cache.generations.bump('board', board_id)
+                if creator_id is not None:
+                    self._cache.generations.bump('user', creator_id)
+
+        return count, len(changed)
+
+    def _next_seq(self, board_id: uuid.UUID) -> int:
+        # The database stays locked for writing until the commit, so
+        # the numbers are given out in the order of the commits.
+        boards = Board.__table__
+        return self._db.execute(
+            sa.update(boards)
+            .where(boards.c.board_id == board_id)
+            .values(last_seq=boards.c.last_seq + 1)
+            .returning(boards.c.last_seq)
+        ).scalar_one()
+
+    def _changed(self, board_id: uuid.UUID):
+        if self._cache is None:
+            return
+
+        # The boards of their creator are listed with the first messages.
+        # The board is already loaded by whoever changed its messages.
+        self._cache.generations.bump('board', board_id)
+        board = self._db.get(Board, board_id)
+        if board is not None and board.creator_id is not None:
+            self._cache.generations.bump('user', board.creator_id)
+
+def assign_sequence_numbers(conn: sa.Connection):
+    """
+    Numbers the messages without sequence numbers (written before they
+    were introduced, or not by `MessageStore`) as the changes of their
+    boards following the latest ones, in the order of their timestamps.
+    """
+
+    messages, boards = Message.__table__, Board.__table__
+
+    numbered = sa.select(
+        messages.c.message_id,
+        (boards.c.last_seq + sa.func.row_number().over(
+            partition_by=messages.c.board_id,
+            order_by=(messages.c.timestamp, messages.c.message_id)
+        )).label('seq')
+    ).join(boards, boards.c.board_id == messages.c.board_id).where(messages.c.seq.is_(None)).subquery()
+
+    conn.execute(
+        sa.update(messages)
+        .where(messages.c.message_id == numbered.c.message_id)
+        .values(seq=numbered.c.seq, created_seq=numbered.c.seq)
+    )
+
+    latest = sa.select(sa.func.max(messages.c.seq)).where(messages.c.board_id == boards.c.board_id).scalar_subquery()
+    conn.execute(sa.update(boards).where(boards.c.last_seq < latest).values(last_seq=latest))
 
 class MessageResource():
 
-    def __init__(self, message_store: MessageStore, board_store: 'BoardStore', user_store: UserStore):
+    def __init__(
+        self,
+        message_store: MessageStore,
+        board_store: 'BoardStore',
+        user_store: UserStore,
+        fragments: FragmentCache,
+        flights: SingleFlight | None = None,
+        snapshots: SnapshotStore | None = None
+    ):
         self._board_store = board_store
         self._user_store = user_store
         self._message_store = message_store
+        self._fragments = fragments
+        self._flights = flights
+        self._snapshots = snapshots
+
+    def _encode_message(self, block: MessageBlock, index: int) -> Fragment:
+        # The message can only change together with `last_edited`.
+        return self._fragments.get(block.key(index), block.serialize, index)
     
+    @falcon.before(query_budget(3))
     @falcon.before(require_authorization)
-    @falcon.before(validate_message_pagination_params)
+    @falcon.before(validate(params=MessagePaginationParams))
     def on_get(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
         """
         Fetches all messages from the board with the ID `board_id`
-        (paginated query).
+        (paginated query). Full pages of the boards, that have been
+        inactive for a while, are served from their snapshots.
+
+        With `expand=author`, the messages are returned as the `items`
+        along with the `authors`: the profiles of their authors by ID.
         """
 
-        board = self._board_store.get(board_id)
-        if board is None:
+        params: MessagePaginationParams = req.context.params
+        if params.fields is None and len(params.expand) == 0 and self._snapshots is not None:
+            if self._snapshots.serve(req, resp, board_id, params.page, params.elements):
+                return
+
+        self._get_page(req, resp, board_id=board_id)
+
+    @coalesced
+    def _get_page(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
+        params: MessagePaginationParams = req.context.params
+        page = params.page
+        elements = params.elements
+
+        version = None
+        if params.fields is None and len(params.expand) == 0 and self._snapshots is not None and self._snapshots.covers(elements):
+            version = self._snapshots.version(board_id)
+
+        authors = {} if 'author' in params.expand else None
+        if params.fields is None:
+            res = self._message_store.get_page_serialized(board_id, page, elements, self._encode_message, authors=authors)
+        else:
+            res = self._message_store.get_page_serialized(board_id, page, elements, fields=params.fields, authors=authors)
+        if res is None:
             raise falcon.HTTPNotFound
         
-        page = int(req.params['page'])
-        elements = int(req.params['elements'])
+        resp.media = res if authors is None else {'items': res, 'authors': authors}
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+
+        # A full page doesn't change until a message is edited or
+        # deleted, and the board's version is bumped, unless new
+        # messages are likely to be posted before it.
+        if version is not None and elements > 0 and len(res) == elements:
+            last = self._message_store.get_last_message_time(board_id)
+            if last is not None and (datetime.utcnow() - last).total_seconds() >= self._snapshots.min_age:
+                self._snapshots.write(resp, board_id, version, page, elements, resp.render_body())
+
+    @falcon.before(query_budget(2))
+    @falcon.before(require_authorization)
+    @falcon.before(validate(params=AuthorMessagesParams))
+    @coalesced
+    def on_get_by_author(self, req: falcon.Request, resp: falcon.Response, user_id: uuid.UUID):
+        """
+        Fetches the messages written by the user with the ID `user_id`
+        on all boards (paginated by cursor), along with the `next_cursor`
+        (and the `authors`, with `expand=author`).
+        """
+
+        params: AuthorMessagesParams = req.context.params
 
-        if page * elements >= len(board.messages):
-            res = []
-        elif page * elements + elements > len(board.messages):
-            res = board.messages[page * elements:len(board.messages)]
+        authors = {} if 'author' in params.expand else None
+        if params.fields is None:
+            res = self._message_store.get_by_author_serialized(
+                user_id, params.cursor, params.elements, self._encode_message, authors=authors
+            )
         else:
-            res = board.messages[page * elements:page * elements + elements]
-        
-        resp.media = [msg.serialize() for msg in res]
+            res = self._message_store.get_by_author_serialized(
+                user_id, params.cursor, params.elements, fields=params.fields, authors=authors
+            )
+        if res is None:
+            raise falcon.HTTPNotFound
+
+        messages, last = res
+        resp.media = {
+            'items': messages,
+            'next_cursor': encode_cursor(last) if last is not None else None
+        }
+        if authors is not None:
+            resp.media['authors'] = authors
         resp.status = falcon.HTTP_200
         resp.content_type = falcon.MEDIA_JSON
 
+    @falcon.before(query_budget(3))
     @falcon.before(require_authorization)
-    def on_get_one(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID, message_id: uuid.UUID):
+    @falcon.before(validate(params=ChangesParams))
+    @coalesced
+    def on_get_changes(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
         """
-        Fetches the message by its `board_id` and `message_id`.
+        Fetches the changes of the messages on the board with the ID
+        `board_id` following the sequence number `after`, along with the
+        `last_seq` to pass as `after` next time, and whether there are
+        more changes. With `after=0`, all messages are returned, without
+        the deleted ones.
+
+        If the tombstones of the messages deleted after `after` have
+        already been compacted, `410 Gone` is returned, and the client
+        has to fetch the board again from `after=0`.
         """
 
-        board = self._board_store.get(board_id)
-        if board is None:
+        params: ChangesParams = req.context.params
+
+        sequence = self._message_store.get_sequence(board_id)
+        if sequence is None:
             raise falcon.HTTPNotFound
-        
-        message = None
-        for msg in board.messages:
-            if msg.message_id == message_id:
-                message = msg
 
+        last_seq, purged_seq = sequence
+        if 0 < params.after < purged_seq:
+            raise falcon.HTTPGone(title='error', description='The changes were compacted, fetch the board again with after=0')
+
+        changes, more = self._message_store.get_changes_serialized(
+            board_id, params.after, params.elements, self._encode_message, deletes=params.after > 0
+        )
+
+        # Changes committed after the board was read may be listed too.
+        if more:
+            last_seq = changes[-1]['seq']
+        else:
+            last_seq = max([params.after, last_seq] + [change['seq'] for change in changes[-1:]])
+
+        resp.media = {
+            'changes': changes,
+            'last_seq': last_seq,
+            'has_more': more
+        }
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+
+    @falcon.before(query_budget(1))
+    @falcon.before(require_authorization)
+    @falcon.before(validate(params=MessageParams))
+    def on_get_one(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID, message_id: uuid.UUID):
+        """
+        Fetches the message by its `board_id` and `message_id`, with
+        the profile of its author as `author`, with `expand=author`.
+        """
+
+        params: MessageParams = req.context.params
+
+        authors = {} if 'author' in params.expand else None
+        message = self._message_store.get_serialized(board_id, message_id, authors)
         if message is None:
             raise falcon.HTTPNotFound
-        
-        resp.media = message.serialize()
+
+        if authors is not None:
+            message['author'] = authors.get(message['author_id'])
+
+        resp.media = message
         resp.status = falcon.HTTP_200
         resp.content_type = falcon.MEDIA_JSON
 
+    @falcon.before(query_budget(5))
     @falcon.before(require_authorization)
+    @falcon.before(validate(body=MessageBody))
     def on_post(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
         """
         Create a new `Message` instance, save it to the
@@ -113,14 +726,10 @@ class MessageResource():
         if board is None:
             raise falcon.HTTPNotFound
         
-        body = req.media
-        if 'text' not in body:
-            raise falcon.HTTPBadRequest(title='text', description='The message cannot be empty')
-
-        author_username = JWT.validate(body['token'])
-        author = self._user_store.get_by_username(author_username)
+        body: MessageBody = req.context.body
+        author = self._user_store.get_by_username(req.context.username)
         
-        message = Message(body['text'], author, board)
+        message = Message(body.text, author, board)
         self._message_store.save(message)
 
         board.messages.append(message)
@@ -129,7 +738,9 @@ class MessageResource():
         resp.media = {}
         resp.location = f'/boards/{board_id}/messages/{message.message_id}'
 
+    @falcon.before(query_budget(5))
     @falcon.before(require_authorization)
+    @falcon.before(validate(body=MessageBody))
     def on_patch_one(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID, message_id: uuid.UUID):
         """
         Edits the message with the ID `message_id` on board
@@ -150,23 +761,21 @@ class MessageResource():
         if message is None:
             raise falcon.HTTPNotFound
 
-        body = req.media
+        body: MessageBody = req.context.body
 
-        author_username = JWT.validate(body['token'])
-        author = self._user_store.get_by_username(author_username)
+        author = self._user_store.get_by_username(req.context.username)
         if message.author_id != author.user_id:
             raise falcon.HTTPUnauthorized
-
-        if body is None or 'text' not in body:
-            raise falcon.HTTPBadRequest
         
-        message.text = body['text']
+        message.text = body.text
+        message.last_edited = datetime.utcnow()
         self._message_store.save(message)
         
         resp.media = message.serialize()
         resp.status = falcon.HTTP_200
         resp.content_type = falcon.MEDIA_JSON
 
+    @falcon.before(query_budget(6))
     @falcon.before(require_authorization)
     def on_delete_one(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID, message_id: uuid.UUID):
         """
@@ -188,8 +797,7 @@ class MessageResource():
         if message is None:
             raise falcon.HTTPNotFound
         
-        author_username = JWT.validate(req.media['token'])
-        author = self._user_store.get_by_username(author_username)
+        author = self._user_store.get_by_username(req.context.username)
         if message.author_id != author.user_id:
             raise falcon.HTTPUnauthorized
         
@@ -201,28 +809,53 @@ class MessageResource():
         resp.content_type = falcon.MEDIA_JSON
         
 
-def validate_board_pagination_params(req, resp, resource, params):
-    _PAGINATION_MAX_ELEMENTS = 30
-    
-    if 'page' not in req.params or 'elements' not in req.params:
-        raise falcon.HTTPBadRequest
-    
-    page = int(req.params['page'])
-    elements = int(req.params['elements'])
+class BoardPaginationParams(CursorPaginationParams, SparseFieldsParams):
+    max_elements = 30
+    key_size = 2
+    allowed_fields = frozenset(BOARD_FIELDS) | frozenset(BOARD_RELATIONS)
+
+class BoardBody(BaseModel):
+    topic: str
+
+    @validator('topic')
+    def topic_not_empty(cls, topic: str) -> str:
+        if len(topic) == 0:
+            raise ValueError('The board\'s topic must be specified')
+
+        return topic
 
-    if page < 0:
-        raise falcon.HTTPBadRequest('page', 'The page index cannot be negative')
+class BoardIdsParams(IdsParams, SparseFieldsParams):
+    max_ids = 50
+    allowed_fields = frozenset(BOARD_FIELDS)
 
-    if elements < 0:
-        raise falcon.HTTPBadRequest('elements', 'The number of elements per page cannot be negative')
-    if elements > _PAGINATION_MAX_ELEMENTS:
-        raise falcon.HTTPBadRequest('elements', f'The maximum number of elements per page is {_PAGINATION_MAX_ELEMENTS}')
+class DigestParams(IdsParams):
+    """
+    Query string of a request for the `per_board` (up to
+    `max_per_board`) latest messages of each of the boards `ids`.
+    """
 
+    max_ids = 50
+    max_per_board: ClassVar[int] = 20
+
+    per_board: int = 3
+
+    @validator('per_board')
+    def per_board_in_range(cls, per_board: int) -> int:
+        if per_board < 0:
+            raise ValueError('The number of messages per board cannot be negative')
+        if per_board > cls.max_per_board:
+            raise ValueError(f'The maximum number of messages per board is {cls.max_per_board}')
+
+        return per_board
+
+def _board_list_params(req: falcon.Request) -> type[BaseModel]:
+    return BoardIdsParams if 'ids' in req.params else BoardPaginationParams
 
 class BoardStore():
 
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, cache: GenerationalCache | None = None):
         self._db = db_session
+        self._cache = cache
 
     def get_all(self, page: int, elements: int) -> list[Board]:
         """
@@ -235,6 +868,173 @@ class BoardStore():
         
         return board
 
+    def get_all_serialized(self, page: int, elements: int, fields: frozenset[str] | None = None) -> list[dict]:
+        """
+        Same as `get_all()`, but returns the boards already serialized
+        like `Board.serialize()` does. The rows are read with up to
+        two Core queries, without loading any ORM objects.
+
+        If `fields` is given, only these keys of the boards are
+        returned, and only the columns and tables needed to
+        serialize them are queried.
+        """
+
+        boards, _ = self._get_serialized(lambda query: query.offset(page * elements), elements, fields)
+
+        return boards
+
+    def get_after_serialized(
+        self,
+        after: tuple | None,
+        elements: int,
+        fields: frozenset[str] | None = None
+    ) -> tuple[list[dict], tuple | None]:
+        """
+        Same as `get_all_serialized()`, but instead of skipping whole
+        pages, fetches the `elements` boards following the one with the
+        sort key `after` (or the first ones, if it's `None`), using the
+        index on `(created_at, board_id)`.
+
+        Returns the boards and the sort key of the last of them, or
+        `None` instead of the key if there are no more boards.
+        """
+
+        if after is None:
+            return self._get_serialized(lambda query: query, elements, fields)
+
+        key = sa.tuple_(sa.type_coerce(Board.created_at, sa.String), sa.type_coerce(Board.board_id, sa.String))
+        return self._get_serialized(lambda query: query.where(key > sa.tuple_(*after)), elements, fields)
+
+    def get_many_serialized(self, board_ids: list[uuid.UUID], fields: frozenset[str] | None = None) -> list[dict]:
+        """
+        Fetches the boards with UUIDs `board_ids` with a single query
+        and returns their compact representations (without the
+        `created_by` and `first_message` keys of `Board.serialize()`,
+        or with only the keys in `fields`), in the order of `board_ids`.
+        Boards, that don't exist, are skipped.
+        """
+
+        columns, serialize = select_fields(BOARD_FIELDS, fields if fields is not None else BOARD_FIELDS.keys())
+        rows = self._db.execute(
+            sa.select(raw(Board.board_id), *columns).where(Board.board_id.in_(board_ids))
+        )
+
+        by_id = {row[0]: serialize(row[1:]) for row in rows}
+        return [by_id[board_id.hex] for board_id in board_ids if board_id.hex in by_id]
+
+    def get_digest_serialized(self, board_ids: list[uuid.UUID], per_board: int) -> list[dict]:
+        """
+        Same as `get_many_serialized()`, but every board comes with
+        the `per_board` latest of its visible messages in `messages`,
+        newest first, serialized like `Message.serialize()` does.
+
+        The messages of all the boards are read with a single query,
+        see `select_latest_messages()`.
+        """
+
+        boards = self.get_many_serialized(board_ids)
+        if len(boards) == 0 or per_board == 0:
+            return [{**board, 'messages': []} for board in boards]
+
+        messages = {}
+        for row in self._db.execute(select_latest_messages(board_ids, per_board)):
+            messages.setdefault(uuid_str(row[3]), []).append(serialize_message_row(row))
+
+        return [{**board, 'messages': messages.get(board['board_id'], [])} for board in boards]
+
+    def _get_serialized(self, paginate, elements: int, fields: frozenset[str] | None) -> tuple[list[dict], tuple | None]:
+        if fields is None:
+            fields = BOARD_FIELDS.keys() | BOARD_RELATIONS
+
+        columns, serialize = select_fields(BOARD_FIELDS, fields)
+        query = sa.select(raw(Board.board_id), raw(Board.created_at), *columns)
+        if 'created_by' in fields:
+            query = query.add_columns(*USER_COLUMNS).outerjoin(User, Board.creator_id == User.user_id)
+
+        # One more row is fetched to know whether there's a next page.
+        boards = self._db.execute(
+            paginate(query).order_by(Board.created_at, Board.board_id).limit(elements + 1)
+        ).all()
+
+        last = None
+        if len(boards) > elements:
+            boards = boards[:elements]
+            if elements > 0:
+                last = (boards[-1][1], boards[-1][0])
+
+        first_messages = {}
+        if 'first_message' in fields and len(boards) > 0:
+            for row in self._db.execute(select_first_messages([b[0] for b in boards])):
+                first_messages[row[3]] = serialize_first_message_row(row)
+
+        res = []
+        for row in boards:
+            board = serialize(row[2:len(columns) + 2])
+            if 'created_by' in fields:
+                creator = row[len(columns) + 2:]
+                board['created_by'] = serialize_user_row(creator) if creator[0] is not None else None
+            if 'first_message' in fields:
+                board['first_message'] = first_messages.get(row[0])
+            res.append(board)
+
+        return res, last
+
+    def get_serialized(self, board_id: uuid.UUID) -> dict | None:
+        """
+        Same as `get()`, but returns the board already serialized
+        like `Board.serialize()` does, without loading ORM objects.
+        If the board doesn't exist, `None` is returned.
+
+        If there's a cache, the board (with its first message) is kept
+        in it until the board changes, and its creator until they do.
+        """
+
+        board = self._cached(('board', board_id), ('board', board_id), lambda: self._get_board(board_id))
+        if board is None:
+            return None
+
+        board, creator_id = board
+        creator = None
+        if creator_id is not None:
+            creator = self._cached(('creator', creator_id), ('user', creator_id), lambda: self._get_creator(creator_id))
+
+        return {
+            'board_id': board['board_id'],
+            'topic': board['topic'],
+            'created_at': board['created_at'],
+            'created_by': creator,
+            'first_message': board['first_message']
+        }
+
+    def _cached(self, key, depends: tuple, load):
+        if self._cache is None:
+            return load()
+
+        return self._cache.get(key, (depends,), load)
+
+    def _get_board(self, board_id: uuid.UUID) -> tuple[dict, uuid.UUID | None] | None:
+        row = self._db.execute(
+            sa.select(raw(Board.board_id), Board.topic, raw(Board.created_at), raw(Board.creator_id))
+            .where(Board.board_id == board_id)
+        ).first()
+        if row is None:
+            return None
+
+        first_message = self._db.execute(select_first_messages([row[0]])).first()
+        board = {
+            'board_id': uuid_str(row[0]),
+            'topic': row[1],
+            'created_at': timestamp(row[2]),
+            'first_message': serialize_first_message_row(first_message) if first_message is not None else None
+        }
+
+        return board, uuid.UUID(row[3]) if row[3] is not None else None
+
+    def _get_creator(self, user_id: uuid.UUID) -> dict | None:
+        row = self._db.execute(sa.select(*USER_COLUMNS).where(User.user_id == user_id)).first()
+
+        return serialize_user_row(row) if row is not None else None
+
     def get(self, board_id: uuid.UUID) -> Board | None:
         """
         Fetches a single record about the board with UUID `board_id`.
@@ -252,63 +1052,96 @@ class BoardStore():
         self._db.add(board)
         self._db.commit()
 
+        if self._cache is not None:
+            # The board is listed among the boards of its creator.
+            self._cache.generations.bump('board', board.board_id)
+            if board.creator_id is not None:
+                self._cache.generations.bump('user', board.creator_id)
+
 class BoardResource():
 
-    def __init__(self, board_store: BoardStore, user_store: UserStore):
+    def __init__(self, board_store: BoardStore, user_store: UserStore, flights: SingleFlight | None = None):
         self._board_store = board_store
         self._user_store = user_store
+        self._flights = flights
 
+    @falcon.before(query_budget(3))
     @falcon.before(require_authorization)
+    @coalesced
     def on_get_one(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
         """
         Fetches one record about the boards with the specified `uuid`.
         """
 
-        board = self._board_store.get(board_id)
+        board = self._board_store.get_serialized(board_id)
         if board is None:
             raise falcon.HTTPNotFound
 
         resp.status = falcon.HTTP_200
         resp.content_type = falcon.MEDIA_JSON
-        resp.media = board.serialize()
+        resp.media = board
 
+    @falcon.before(query_budget(2))
     @falcon.before(require_authorization)
-    @falcon.before(validate_board_pagination_params)
+    @falcon.before(validate(params=_board_list_params))
+    @coalesced
     def on_get(self, req: falcon.Request, resp: falcon.Response):
         """
         Fetches `elements` number of records about the
-        boards starting at page `page` sorted by their
-        `created_at` property.
+        boards starting at page `page` (or following the
+        `cursor`) sorted by their `created_at` property.
+        If the page is requested by cursor, the boards are
+        returned along with the `next_cursor`.
+        If `ids` are given instead, just these boards are returned.
         """
 
-        page = int(req.params['page'])
-        elements = int(req.params['elements'])
+        params = req.context.params
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+        if isinstance(params, BoardIdsParams):
+            resp.media = self._board_store.get_many_serialized(params.ids, params.fields)
+            return
+
+        elements = params.elements
+        if params.page is not None:
+            resp.media = self._board_store.get_all_serialized(params.page, elements, params.fields)
+        else:
+            boards, last = self._board_store.get_after_serialized(params.cursor, elements, params.fields)
+            resp.media = {
+                'items': boards,
+                'next_cursor': encode_cursor(last) if last is not None else None
+            }
+
+    @falcon.before(query_budget(2))
+    @falcon.before(require_authorization)
+    @falcon.before(validate(params=DigestParams))
+    @coalesced
+    def on_get_digest(self, req: falcon.Request, resp: falcon.Response):
+        """
+        Fetches the boards with the `ids` along with the `per_board`
+        latest messages of each, in the order of the `ids`.
+        """
 
-        boards = self._board_store.get_all(page, elements)
+        params: DigestParams = req.context.params
 
         resp.status = falcon.HTTP_200
         resp.content_type = falcon.MEDIA_JSON
-        resp.media = [b.serialize() for b in boards]
+        resp.media = self._board_store.get_digest_serialized(params.ids, params.per_board)
 
+    @falcon.before(query_budget(2))
     @falcon.before(require_authorization)
+    @falcon.before(validate(body=BoardBody))
     def on_post(self, req: falcon.Request, resp: falcon.Response):
         """
         Creates a new board and returns location to it
         in the `location` header.
         """
 
-        body = req.media
-
-        if body is None:
-            raise falcon.HTTPBadRequest
-
-        if 'topic' not in body or len(body['topic']) == 0:
-            raise falcon.HTTPBadRequest('topic', 'The board\'s topic must be specified')
-
-        topic: str = body['topic']
-        username: str = JWT.validate(body['token'])
+        body: BoardBody = req.context.body
+        topic: str = body.topic
         
-        user = self._user_store.get_by_username(username)
+        user = self._user_store.get_by_username(req.context.username)
         board = Board(topic, user)
         
         self._board_store.save(board)
@@ -0,0 +1,178 @@
+import falcon
+import sqlalchemy as sa
+from sqlalchemy.orm import ORMExecuteState
+
+import re
+import logging
+import contextvars
+from collections import deque
+from dataclasses import dataclass, field
+
+_logger = logging.getLogger(__name__)
+
+# Placeholders of the bound parameters in the different paramstyles.
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)'
+_PLACEHOLDER_LIST = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize(statement: str) -> str:
+    """
+    Normalizes the SQL `statement`, so that the statements differing
+    only in the number of parameters of an `IN` list (and whitespace)
+    become the same.
+    """
+
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+@dataclass
+class _RequestStatements:
+    total: int = 0
+    counts: dict[str, int] = field(default_factory=dict)
+    relationships: dict[str, str] = field(default_factory=dict)
+    loading: str | None = None
+
+_current: contextvars.ContextVar[_RequestStatements | None] = contextvars.ContextVar('petboards_budget', default=None)
+
+@dataclass
+class Repeat:
+    """
+    A statement executed `count` times during one request, and
+    the relationship whose lazy loading executed it, if any.
+    """
+
+    statement: str
+    count: int
+    relationship: str | None = None
+
+@dataclass
+class Report:
+    """
+    SQL statements executed while handling one request.
+    """
+
+    method: str
+    route: str
+    statements: int
+    budget: int | None
+    repeats: list[Repeat]
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.statements > self.budget
+
+    def describe(self) -> str:
+        budget = f'budget {self.budget}' if self.budget is not None else 'no budget'
+        lines = [f'{self.method} {self.route}: {self.statements} SQL statements ({budget})']
+        for repeat in self.repeats:
+            source = f' lazy loading {repeat.relationship}' if repeat.relationship is not None else ''
+            lines.append(f'  repeated {repeat.count} times{source}: {repeat.statement}')
+
+        return '\n'.join(lines)
+
+class QueryBudget:
+    """
+    Counts the SQL statements executed while handling every request
+    and reports the requests, that executed more statements than the
+    budget declared with `query_budget()` for their responder, or
+    executed the same statement (up to the parameters) at least
+    `repeat_threshold` times, which is usually a lazy loaded
+    relationship accessed in a loop (N+1 queries).
+
+    Up to `max_reports` of the latest reports are kept in `reports`.
+    """
+
+    def __init__(self, repeat_threshold: int = 3, max_reports: int = 100):
+        self._repeat_threshold = repeat_threshold
+        self.reports: deque[Report] = deque(maxlen=max_reports)
+
+    def instrument(self, engine: sa.Engine, session=None):
+        """
+        Installs the hooks counting the statements executed by `engine`.
+        If the `session` (or session class or `sessionmaker`) is given,
+        the statements emitted by its lazy loads are attributed
+        to the relationships being loaded.
+        """
+
+        sa.event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        if session is not None:
+            sa.event.listen(session, 'do_orm_execute', self._do_orm_execute)
+
+    def _do_orm_execute(self, orm_execute_state: ORMExecuteState):
+        state = _current.get()
+        if state is not None and orm_execute_state.is_relationship_load:
+            state.loading = str(orm_execute_state.loader_strategy_path.path[-1])
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = _current.get()
+        if state is None:
+            return
+
+        statement = normalize(statement)
+        state.total += 1
+        state.counts[statement] = state.counts.get(statement, 0) + 1
+        if state.loading is not None:
+            state.relationships[statement] = state.loading
+            state.loading = None
+
+    def start(self) -> contextvars.Token:
+        return _current.set(_RequestStatements())
+
+    def finish(self, token: contextvars.Token, method: str, route: str, budget: int | None) -> Report:
+        """
+        Stops counting the statements of the request
+        and returns the report about them.
+        """
+
+        state = _current.get()
+        _current.reset(token)
+
+        repeats = [
+            Repeat(statement, count, state.relationships.get(statement))
+            for statement, count in state.counts.items()
+            if count >= self._repeat_threshold
+        ]
+
+        return Report(method, route, state.total, budget, repeats)
+
+def query_budget(max_statements: int):
+    """
+    Creates a function, that may be used `falcon.before()` the
+    responder to declare the maximum number of SQL statements
+    it may execute while handling one request.
+    """
+
+    def hook(req: falcon.Request, resp: falcon.Response, resource, params):
+        req.context.query_budget = max_statements
+
+    return hook
+
+class QueryBudgetMiddleware:
+    """
+    Checks every request against the `QueryBudget`. The requests,
+    that exceed their budget or repeat statements, are added to the
+    `reports` of the budget and, if `log` is set, logged as warnings.
+    """
+
+    def __init__(self, budget: QueryBudget, log: bool = True):
+        self._budget = budget
+        self._log = log
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        req.context.query_budget_token = self._budget.start()
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        token = getattr(req.context, 'query_budget_token', None)
+        if token is None:
+            return
+
+        report = self._budget.finish(
+            token,
+            req.method,
+            req.uri_template or 'unmatched',
+            getattr(req.context, 'query_budget', None)
+        )
+
+        if report.exceeded or len(report.repeats) > 0:
+            self._budget.reports.append(report)
+            if self._log:
+                _logger.warning('%s', report.describe())
@@ -0,0 +1,119 @@
+import falcon
+from pydantic import BaseModel
+
+import threading
+import functools
+
+# Headers of the response, that are shared along with its body.
+_SHARED_HEADERS = ('ETag', 'Cache-Control')
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time: the callers asking
+    for a key, that is being computed, wait for that computation and get
+    its result (or its exception) instead of computing it again.
+
+    Nothing is kept after the computation ends, so a caller may get
+    a result computed from the data as it was up to the duration of
+    one computation before it called. `hits` counts the calls, that
+    waited for a computation of another one, `misses` the computations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def do(self, key, compute):
+        """
+        Returns the result of `compute()` for the `key`, or of the
+        computation for the same `key` already in progress.
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+            flight.done.set()
+
+def _freeze(value):
+    if isinstance(value, BaseModel):
+        return (type(value).__name__, _freeze(value.dict()))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+def coalesced(responder):
+    """
+    Decorates a read-only responder, whose response doesn't depend on
+    the client, so that identical concurrent requests are handled once
+    by the `SingleFlight` in the `_flights` attribute of the resource
+    (if it isn't `None`), and share the serialized response.
+
+    The requests are identical if they have the same route, URI fields
+    and validated parameters and body (see `validate()`), which is why
+    it must be applied below all the hooks, i.e. run after them.
+    """
+
+    @functools.wraps(responder)
+    def wrapper(self, req: falcon.Request, resp: falcon.Response, **kwargs):
+        flights: SingleFlight | None = self._flights
+        if flights is None:
+            return responder(self, req, resp, **kwargs)
+
+        key = (
+            req.method,
+            req.uri_template,
+            _freeze(kwargs),
+            _freeze(getattr(req.context, 'params', None)),
+            _freeze(getattr(req.context, 'body', None))
+        )
+
+        def compute() -> tuple[str, str, bytes | None, dict]:
+            responder(self, req, resp, **kwargs)
+            headers = {name: resp.get_header(name) for name in _SHARED_HEADERS if resp.get_header(name) is not None}
+            return resp.status, resp.content_type, resp.render_body(), headers
+
+        status, content_type, data, headers = flights.do(key, compute)
+
+        resp.status = status
+        resp.content_type = content_type
+        resp.data = data
+        resp.set_headers(headers)
+
+    return wrapper
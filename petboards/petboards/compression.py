@@ -0,0 +1,141 @@
+import falcon
+
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Codings supported by the server, most preferred first.
+CODINGS = (('br',) if brotli is not None else ()) + ('gzip', 'deflate')
+
+_COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+def negotiate(accept_encoding: str | None, codings: tuple = CODINGS) -> str | None:
+    """
+    Chooses the content coding for the response from `codings` according
+    to the `Accept-Encoding` header value given. Of the codings with
+    the highest quality value, the one listed earlier in `codings` wins.
+    Returns `None` if the body should be sent as it is.
+    """
+
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in codings:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+class CompressionMiddleware:
+    """
+    Compresses JSON and text response bodies of at least `min_size`
+    bytes with the content coding negotiated via the `Accept-Encoding`
+    request header: brotli (if the `brotli` package is installed),
+    gzip or deflate.
+
+    If `cache_size` is positive, up to that many compressed bodies
+    are kept, so that identical bodies (e.g. pages made of pre-encoded
+    fragments) are only compressed once.
+    """
+
+    def __init__(self, min_size: int = 1024, level: int = 6, brotli_quality: int = 4, cache_size: int = 0):
+        self._min_size = min_size
+        self._level = level
+        self._brotli_quality = brotli_quality
+        self._cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        """
+        Compresses the `body` with the content `coding`.
+        """
+
+        if coding == 'br':
+            return brotli.compress(body, quality=self._brotli_quality)
+
+        # gzip has the same deflate stream as the zlib format, but
+        # a different header (selected by the window bits of 16+).
+        wbits = 31 if coding == 'gzip' else 15
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, wbits)
+        return compressor.compress(body) + compressor.flush()
+
+    def _compress_cached(self, body: bytes, coding: str) -> bytes:
+        key = (coding, body)
+
+        compressed = self._cache.get(key)
+        if compressed is not None:
+            try:
+                self._cache.move_to_end(key)
+            except KeyError:
+                pass
+
+            self.hits += 1
+            return compressed
+
+        compressed = self.compress(body, coding)
+
+        self.misses += 1
+        self._cache[key] = compressed
+        while len(self._cache) > self._cache_size:
+            try:
+                self._cache.popitem(last=False)
+            except KeyError:
+                break
+
+        return compressed
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        if resp.stream is not None or resp.get_header('Content-Encoding') is not None:
+            return
+
+        if falcon.http_status_to_code(resp.status) in (204, 304):
+            return
+
+        content_type = resp.content_type or resp.options.default_media_type
+        if not content_type.startswith(_COMPRESSIBLE_TYPES):
+            return
+
+        # The responder may have varied by the encoding already.
+        if 'accept-encoding' not in (resp.get_header('Vary') or '').lower():
+            resp.append_header('Vary', 'Accept-Encoding')
+
+        coding = negotiate(req.get_header('Accept-Encoding'))
+        if coding is None:
+            return
+
+        body = resp.render_body()
+        if body is None or len(body) < self._min_size:
+            return
+
+        if self._cache_size > 0:
+            compressed = self._compress_cached(body, coding)
+        else:
+            compressed = self.compress(body, coding)
+
+        resp.text = None
+        resp.data = compressed
+        resp.set_header('Content-Encoding', coding)
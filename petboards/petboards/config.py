@@ -0,0 +1,149 @@
+from pydantic import BaseSettings
+
+from typing import Literal
+
+class Settings(BaseSettings):
+    """
+    Settings of the application. Every setting may be overridden
+    with the environment variable named after it with the
+    `PETBOARDS_` prefix, e.g. `PETBOARDS_JSON_LIBRARY=json`.
+    """
+
+    # Logging: the level and format of all records, whether every
+    # request is logged, and which SQL statements are logged: none,
+    # the ones taking at least `sql_log_slow_threshold` seconds,
+    # a random `sql_log_sample_rate` fraction of them, or all.
+    log_level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = 'INFO'
+    log_format: Literal['json', 'text'] = 'json'
+    access_log: bool = True
+    sql_log: Literal['off', 'slow', 'sampled', 'all'] = 'slow'
+    sql_log_slow_threshold: float = 0.1
+    sql_log_sample_rate: float = 0.01
+
+    # Library used to encode and decode JSON: `orjson` if it is
+    # installed and `auto` is chosen, the standard `json` otherwise.
+    json_library: Literal['auto', 'orjson', 'json'] = 'auto'
+
+    # SQLite database at `database_path`. Reads go through a pool of
+    # `database_read_pool_size` read-only connections, and writes through
+    # a single connection, unless the pool size is 0, when all go through
+    # one shared pool. A connection is waited for `database_pool_timeout`
+    # seconds at most.
+    database_path: str = 'data/sqlite3.db'
+    database_read_pool_size: int = 8
+    database_pool_timeout: float = 10.0
+
+    # Maximum number of pre-encoded messages kept in memory.
+    fragment_cache_size: int = 10000
+
+    # Compression of the response bodies, that are at least
+    # `compression_min_size` bytes long. The level applies to gzip
+    # and deflate, the quality to brotli. Up to `compression_cache_size`
+    # compressed bodies are cached (0 disables the cache).
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_cache_size: int = 0
+
+    # Concurrent identical reads (of the same route with the same
+    # parameters) are handled once, and share the serialized response.
+    coalescing_enabled: bool = True
+
+    # Boards, users and message pages read by a worker are cached
+    # (up to `cache_size` of them) until any worker changes them,
+    # which is tracked by `generation_slots` counters shared by the
+    # workers through the file at `generations_path`.
+    cache_enabled: bool = True
+    cache_size: int = 10000
+    generations_path: str = 'data/generations'
+    generation_slots: int = 65536
+
+    # Admission control: up to `admission_max_in_flight` requests are
+    # handled by a worker at once, up to `admission_max_queue` more wait
+    # (reads first, then writes, then logins) for `admission_queue_timeout`
+    # seconds at most, including the time they waited in the proxy (per
+    # `X-Request-Start`). The others get `503` with `Retry-After` of
+    # `admission_retry_after` seconds.
+    #
+    # Unless set, the limit is the number of the worker's connections to
+    # the database (the read pool and the writer), beyond which requests
+    # would only wait for a connection unordered. It's capped at one less
+    # than the requests the worker takes at once (see
+    # `petboards.gunicorn_config`), though: with `gthread`, which takes as
+    # many as its few threads, at most a couple of requests ever wait, so
+    # the classes matter little unless `server_threads` is raised.
+    admission_enabled: bool = True
+    admission_max_in_flight: int | None = None
+    admission_max_queue: int = 64
+    admission_queue_timeout: float = 2.0
+    admission_retry_after: int = 1
+
+    # Full message pages of the boards without new messages for
+    # `snapshot_min_age` seconds are stored as files in
+    # `snapshot_directory` (until the boards change) and served from
+    # them, with the responses cacheable by clients for
+    # `snapshot_max_age` seconds. Only the pages of the sizes in
+    # `snapshot_page_sizes` (a JSON list in the environment) are.
+    snapshots_enabled: bool = True
+    snapshot_directory: str = 'data/snapshots'
+    snapshot_min_age: float = 86400.0
+    snapshot_max_age: int = 3600
+    snapshot_page_sizes: list[int] = [10, 20, 50]
+
+    # Tombstones of the deleted messages, through which the clients
+    # syncing the changes of a board learn about the deletions, are
+    # removed `tombstone_retention` seconds after the deletion, by a
+    # job running every `tombstone_compaction_interval` seconds.
+    tombstone_retention: float = 2592000.0
+    tombstone_compaction_interval: float = 3600.0
+
+    # Usernames of the moderators, who may delete or hide all messages
+    # of a user or a board at once (a JSON list in the environment).
+    moderators: list[str] = []
+
+    # Non-critical writes (like the time of the last login) are
+    # batched and written every `deferred_write_interval` seconds.
+    # Up to `deferred_write_max_pending` rows may wait to be written.
+    deferred_write_interval: float = 1.0
+    deferred_write_max_pending: int = 10000
+
+    # Collection of the request, SQL and cache metrics,
+    # exposed at `/metrics` in the Prometheus text format.
+    metrics_enabled: bool = True
+
+    # Requests executing more SQL statements than their responders
+    # declare with `query_budget()`, or repeating the same statement at
+    # least `query_budget_repeat_threshold` times, are logged as warnings.
+    query_budget_enabled: bool = False
+    query_budget_repeat_threshold: int = 3
+    query_budget_log: bool = True
+
+    # Profiling of the requests with the `X-Petboards-Profile` header
+    # set to `profiling_token`, and of `profiling_sample_rate` of all
+    # requests, with `cProfile` or by sampling the stack every
+    # `profiling_interval` seconds. Up to `profiling_max_files`
+    # profiles are kept in `profiling_directory`.
+    profiling_enabled: bool = False
+    profiling_token: str | None = None
+    profiling_sample_rate: float = 0.0
+    profiling_mode: Literal['cprofile', 'sampling'] = 'cprofile'
+    profiling_interval: float = 0.005
+    profiling_directory: str = 'data/profiles'
+    profiling_max_files: int = 100
+
+    # gunicorn server (see `petboards.gunicorn_config`): the address,
+    # the worker class, and the numbers of workers, threads per worker
+    # (for `gthread`) and connections per worker (for `gevent`). The
+    # numbers are sized from the CPUs available, unless set. With
+    # `server_preload`, the application is loaded before forking, so
+    # that the workers share its memory.
+    server_bind: str = '127.0.0.1:8000'
+    server_worker_class: Literal['gthread', 'gevent', 'sync'] = 'gthread'
+    server_workers: int | None = None
+    server_threads: int | None = None
+    server_worker_connections: int = 1000
+    server_preload: bool = True
+
+    class Config:
+        env_prefix = 'PETBOARDS_'
@@ -0,0 +1,145 @@
+import os
+import mmap
+import uuid
+import random
+import zlib
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_COUNTER_SIZE = 8
+
+class GenerationTable:
+    """
+    Table of generation counters in a memory-mapped file at `path`,
+    shared by all the processes mapping it (e.g. gunicorn workers).
+
+    A writer bumps the counter of every object it changed after
+    committing the change, and a reader remembers the counter of
+    an object along with what it read about it. If the counter
+    differs later, the object has changed since, in any process.
+
+    Objects are hashed into `slots` counters, so two objects may
+    share one: that only makes one invalidate the other needlessly.
+    Reading a counter is a single memory read; bumping it takes a
+    lock on the counter, so that no increment is lost.
+
+    The file starts with a random `epoch`, chosen when it's created,
+    which tells the counters apart from the ones of a file created
+    before, so that values derived from both can't be confused.
+    """
+
+    def __init__(self, path: str, slots: int = 65536):
+        self._slots = slots
+        self._lock = threading.Lock()
+
+        # The file is never truncated, so that the workers, which
+        # open it one after another, never reset the counters.
+        size = (slots + 1) * _COUNTER_SIZE
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+
+        self._mmap = mmap.mmap(self._fd, size)
+        self._counters = memoryview(self._mmap).cast('Q')
+
+        self._lock_counter(0)
+        try:
+            if self._counters[0] == 0:
+                self._counters[0] = random.getrandbits(63) | 1
+        finally:
+            self._unlock_counter(0)
+
+        self.epoch: int = self._counters[0]
+
+    def _slot(self, kind: str, key: uuid.UUID) -> int:
+        # `hash()` of strings differs between processes, CRC32 doesn't.
+        return 1 + zlib.crc32(key.bytes, zlib.crc32(kind.encode('utf-8'))) % self._slots
+
+    def _lock_counter(self, slot: int):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _COUNTER_SIZE, slot * _COUNTER_SIZE)
+
+    def _unlock_counter(self, slot: int):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _COUNTER_SIZE, slot * _COUNTER_SIZE)
+
+    def get(self, kind: str, key: uuid.UUID) -> int:
+        """
+        Returns the generation of the object of `kind` with the ID `key`.
+        """
+
+        return self._counters[self._slot(kind, key)]
+
+    def bump(self, kind: str, key: uuid.UUID):
+        """
+        Increments the generation of the object of `kind` with the ID `key`.
+        """
+
+        slot = self._slot(kind, key)
+        with self._lock:
+            self._lock_counter(slot)
+            try:
+                self._counters[slot] = (self._counters[slot] + 1) & 0xFFFFFFFFFFFFFFFF
+            finally:
+                self._unlock_counter(slot)
+
+    def close(self):
+        self._counters.release()
+        self._mmap.close()
+        os.close(self._fd)
+
+class GenerationalCache:
+    """
+    Bounded cache of values, each of which is valid as long as the
+    generations of the objects it was read from don't change. Like
+    `FragmentCache`, it evicts the least recently used values first,
+    takes no lock and counts hits and misses approximately.
+    """
+
+    def __init__(self, generations: GenerationTable, size: int):
+        self.generations = generations
+        self._size = size
+        self._values: OrderedDict = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key, depends: tuple[tuple[str, uuid.UUID], ...], load):
+        """
+        Returns the value cached under `key`, if the generations of the
+        objects `depends` lists (as pairs of the kind and the ID) are
+        the same as when it was cached. Otherwise, `load()` is called
+        and its result is cached, unless it's `None`, and returned.
+        """
+
+        # The generations are read before the value is loaded: if the
+        # objects change meanwhile, the value is just reloaded next time.
+        generations = tuple(self.generations.get(kind, ident) for kind, ident in depends)
+
+        entry = self._values.get(key)
+        if entry is not None and entry[0] == generations:
+            try:
+                self._values.move_to_end(key)
+            except KeyError:
+                pass
+
+            self.hits += 1
+            return entry[1]
+
+        value = load()
+
+        self.misses += 1
+        if value is not None:
+            self._values[key] = (generations, value)
+            while len(self._values) > self._size:
+                try:
+                    self._values.popitem(last=False)
+                except KeyError:
+                    break
+
+        return value
@@ -0,0 +1,97 @@
+"""
+Configuration of gunicorn for serving the application:
+
+    gunicorn -c python:petboards.gunicorn_config petboards.start:app
+
+The settings are read from the `PETBOARDS_SERVER_*` environment
+variables (see `Settings`); gunicorn command line options
+override them.
+"""
+
+import os
+import sys
+
+from petboards.config import Settings
+
+def cpu_count() -> int:
+    """
+    Returns the number of CPUs the process may run on, which
+    may be less than the number of CPUs of the machine (e.g.
+    in a container limited to some of them).
+    """
+
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+def default_workers(worker_class: str, cpus: int) -> int:
+    # A sync worker handles one request at a time, so there are
+    # more of them than CPUs to keep the CPUs busy while some wait
+    # for the database. The threads or greenlets of the other
+    # worker classes do that within one worker per CPU.
+    if worker_class == 'sync':
+        return 2 * cpus + 1
+
+    return cpus
+
+def default_threads(worker_class: str, cpus: int) -> int:
+    # Requests mostly hold the GIL (the database is an SQLite file),
+    # so a few threads per worker are enough to overlap the waits.
+    if worker_class == 'gthread':
+        return 4
+
+    return 1
+
+def worker_concurrency(worker_class: str, threads: int, worker_connections: int) -> int:
+    """
+    Returns how many requests a worker of `worker_class` takes at once.
+    """
+
+    if worker_class == 'gthread':
+        return threads
+    if worker_class == 'gevent':
+        return worker_connections
+
+    return 1
+
+_settings = Settings()
+
+if _settings.server_worker_class == 'gevent':
+    try:
+        import gevent
+    except ImportError:
+        print('The gevent worker class requires the \'gevent\' package. Please, install it with \'pip install gevent\'.', file=sys.stderr)
+        sys.exit(1)
+
+wsgi_app = 'petboards.start:app'
+bind = _settings.server_bind
+worker_class = _settings.server_worker_class
+workers = _settings.server_workers or default_workers(worker_class, cpu_count())
+threads = _settings.server_threads or default_threads(worker_class, cpu_count())
+worker_connections = _settings.server_worker_connections
+preload_app = _settings.server_preload
+
+def on_starting(server):
+    # Once, in the master process, before any worker is started.
+    from petboards.migrate import migrate_database
+    migrate_database(_settings.database_path)
+
+def post_fork(server, worker):
+    # With `preload_app`, the application was loaded by the master
+    # process and the worker has a copy of its engine and threads.
+    start = sys.modules.get('petboards.start')
+    if start is not None:
+        start.post_fork()
+
+def post_worker_init(worker):
+    # Runs once the worker has the application, whether it was
+    # preloaded or not, with the options of the command line too.
+    start = sys.modules.get('petboards.start')
+    if start is not None:
+        start.post_worker_init(worker_concurrency(worker.cfg.worker_class_str, worker.cfg.threads, worker.cfg.worker_connections))
+
+def worker_exit(server, worker):
+    start = sys.modules.get('petboards.start')
+    if start is not None:
+        start.worker_exit()
@@ -0,0 +1,199 @@
+import falcon
+import sqlalchemy as sa
+
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import contextvars
+import logging.handlers
+from typing import Literal, TextIO
+
+from .metrics import time_statements, statement_duration
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+# Incoming request IDs are reused only if they look like one,
+# so that clients can't inject anything into the logs.
+_REQUEST_ID_EXPR = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+_access_logger = logging.getLogger('petboards.access')
+_sql_logger = logging.getLogger('petboards.sql')
+
+correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar('petboards_correlation_id', default=None)
+
+class CorrelationIdFilter(logging.Filter):
+    """
+    Adds the correlation ID of the current request (or `None`)
+    to every record as `record.correlation_id`. It must run in the
+    thread handling the request, i.e. before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats every record as a JSON object on a single line, with
+    the `fields` passed in `extra` merged into it.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', None)
+        }
+        entry.update(getattr(record, 'fields', {}))
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z'
+
+class _QueueListener(logging.handlers.QueueListener):
+
+    def stop(self):
+        # May be called both explicitly and at exit.
+        if self._thread is not None:
+            super().stop()
+
+_TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s'
+
+def setup_logging(
+    level: str = 'INFO',
+    format: Literal['json', 'text'] = 'json',
+    stream: TextIO | None = None
+) -> logging.handlers.QueueListener:
+    """
+    Routes the records of all loggers through a queue to a thread,
+    that formats them and writes them to `stream` (stderr by default),
+    so that the request threads never block on the output.
+
+    Returns the started listener. It is stopped (and the queue
+    drained) at interpreter exit. Since threads don't survive
+    `fork()`, it should be called in every worker process.
+    """
+
+    records = queue.SimpleQueue()
+
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(JSONFormatter() if format == 'json' else logging.Formatter(_TEXT_FORMAT))
+
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = _QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
+
+class RequestLoggingMiddleware:
+    """
+    Gives every request a correlation ID, which is added to all the
+    records logged while handling it and returned in the `X-Request-Id`
+    header. A well-formed `X-Request-Id` of the request is reused.
+
+    If `access_log` is set, every request is logged to the
+    `petboards.access` logger with its route, status and duration.
+    """
+
+    def __init__(self, access_log: bool = True):
+        self._access_log = access_log
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        request_id = req.get_header(REQUEST_ID_HEADER)
+        if request_id is None or not _REQUEST_ID_EXPR.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+
+        req.context.correlation_token = correlation_id.set(request_id)
+        req.context.logging_start = time.perf_counter()
+        resp.set_header(REQUEST_ID_HEADER, request_id)
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        token = getattr(req.context, 'correlation_token', None)
+        if token is None:
+            return
+
+        if self._access_log:
+            status = falcon.http_status_to_code(resp.status)
+            _access_logger.info('%s %s %d', req.method, req.path, status, extra={'fields': {
+                'method': req.method,
+                'path': req.path,
+                'route': req.uri_template,
+                'status': status,
+                'duration_ms': round((time.perf_counter() - req.context.logging_start) * 1e3, 3),
+                'remote_addr': req.remote_addr,
+                'user_agent': req.user_agent
+            }})
+
+        correlation_id.reset(token)
+
+class SQLLogger:
+    """
+    Logs the SQL statements executed by an engine to the
+    `petboards.sql` logger, depending on the `mode`:
+
+    - `off`: nothing is logged (and no hooks are installed);
+    - `slow`: the statements taking at least `slow_threshold` seconds;
+    - `sampled`: a random `sample_rate` fraction of the statements;
+    - `all`: every statement.
+
+    Only the statements are logged, not their parameters,
+    which may contain passwords and other personal data.
+    """
+
+    def __init__(
+        self,
+        mode: Literal['off', 'slow', 'sampled', 'all'] = 'slow',
+        slow_threshold: float = 0.1,
+        sample_rate: float = 0.01
+    ):
+        self._mode = mode
+        self._slow_threshold = slow_threshold
+        self._sample_rate = sample_rate
+
+    def instrument(self, engine: sa.Engine):
+        """
+        Installs the hooks logging the statements executed by `engine`.
+        """
+
+        if self._mode == 'off':
+            return
+
+        time_statements(engine)
+        sa.event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = statement_duration(context)
+        if elapsed is None:
+            return
+
+        if self._mode == 'sampled' and random.random() >= self._sample_rate:
+            return
+        if self._mode == 'slow' and elapsed < self._slow_threshold:
+            return
+
+        level = logging.WARNING if self._mode == 'slow' else logging.INFO
+        _sql_logger.log(level, '%s', statement, extra={'fields': {
+            'duration_ms': round(elapsed * 1e3, 3),
+            'executemany': executemany
+        }})
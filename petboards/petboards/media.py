@@ -0,0 +1,127 @@
+import falcon.media
+
+import json
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class Fragment(bytes):
+    """
+    Already encoded JSON value. When found inside the media of
+    a response, it is written into the output as it is.
+    """
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+class JSONHandler(falcon.media.JSONHandler):
+    """
+    JSON media handler, which uses `orjson` for encoding and decoding
+    if it is available, falling back to the standard `json` module.
+
+    `Fragment` values anywhere in lists and dictionaries of the
+    media are spliced into the output without being encoded again.
+    """
+
+    def __init__(self, library: str = 'auto'):
+        if library == 'auto':
+            library = 'json' if orjson is None else 'orjson'
+
+        if library == 'orjson':
+            if orjson is None:
+                raise RuntimeError('orjson is not installed')
+
+            self._dumps_value = orjson.dumps
+            loads = orjson.loads
+        elif library == 'json':
+            self._dumps_value = _json_dumps
+            loads = json.loads
+        else:
+            raise ValueError(f'unknown JSON library \'{library}\'')
+
+        self.library: str = library
+        super().__init__(dumps=self.dumps, loads=loads)
+
+    def dumps(self, media) -> bytes:
+        """
+        Encodes `media` into JSON, splicing `Fragment` values in.
+        """
+
+        # Neither of the libraries can encode `bytes`, so the
+        # media is only walked when it does contain fragments.
+        try:
+            return self._dumps_value(media)
+        except TypeError:
+            pass
+
+        if type(media) is Fragment:
+            return media
+        if isinstance(media, (list, tuple)):
+            return b'[' + b','.join([
+                item if type(item) is Fragment else self.dumps(item)
+                for item in media
+            ]) + b']'
+        if isinstance(media, dict):
+            return b'{' + b','.join([
+                self._dumps_value(key) + b':' + (value if type(value) is Fragment else self.dumps(value))
+                for key, value in media.items()
+            ]) + b'}'
+
+        return self._dumps_value(media)
+
+    def fragment(self, value) -> Fragment:
+        """
+        Encodes `value` into a `Fragment`.
+        """
+
+        return Fragment(self.dumps(value))
+
+class FragmentCache:
+    """
+    Bounded cache of `Fragment`s, that evicts the least
+    recently used ones first. The keys must change whenever
+    the encoded value does.
+
+    No lock is taken: every single operation on the underlying
+    `OrderedDict` is atomic, and a racing eviction at worst costs
+    one more encoding. The hit and miss counters are approximate.
+    """
+
+    def __init__(self, handler: JSONHandler, size: int):
+        self._handler = handler
+        self._size = size
+        self._fragments: OrderedDict = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key, serialize, *args) -> Fragment:
+        """
+        Returns the fragment cached under `key`. If there's none,
+        `serialize(*args)` is encoded, cached and returned.
+        """
+
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            try:
+                self._fragments.move_to_end(key)
+            except KeyError:
+                pass
+
+            self.hits += 1
+            return fragment
+
+        fragment = self._handler.fragment(serialize(*args))
+
+        self.misses += 1
+        self._fragments[key] = fragment
+        while len(self._fragments) > self._size:
+            try:
+                self._fragments.popitem(last=False)
+            except KeyError:
+                break
+
+        return fragment
@@ -0,0 +1,324 @@
+import falcon
+import sqlalchemy as sa
+
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from dataclasses import dataclass
+
+# Upper bounds of the buckets of the latency histograms, in seconds.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the buckets of the SQL statements per request histogram.
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+@dataclass
+class _RequestState:
+    statements: int = 0
+    sql_seconds: float = 0.0
+
+_current: contextvars.ContextVar[_RequestState | None] = contextvars.ContextVar('petboards_metrics', default=None)
+
+class Histogram:
+    """
+    Distribution of the observed values over the buckets with the
+    given upper bounds, with their sum and count. Not thread-safe:
+    `Metrics` guards it with its lock.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        Returns the `le` label and the cumulative count of every bucket.
+        """
+
+        result, total = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            result.append((bound if isinstance(bound, str) else _number(bound), total))
+
+        return result
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._petboards_start = time.perf_counter()
+
+def time_statements(engine: sa.Engine):
+    """
+    Installs, once per engine, the hook noting when every statement
+    executed by `engine` starts, for `statement_duration()`. The time
+    is kept on the execution context of the statement, so that nothing
+    is left behind when the statement fails.
+    """
+
+    if not sa.event.contains(engine, 'before_cursor_execute', _statement_started):
+        sa.event.listen(engine, 'before_cursor_execute', _statement_started)
+
+def statement_duration(context) -> float | None:
+    """
+    Returns how long the statement of the execution `context` has
+    taken so far (in an `after_cursor_execute` hook, how long it took),
+    or `None` if it wasn't timed by `time_statements()`.
+    """
+
+    start = getattr(context, '_petboards_start', None)
+    if start is None:
+        return None
+
+    return time.perf_counter() - start
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: tuple, values: tuple) -> str:
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+class Metrics:
+    """
+    Collects the metrics of the application: the latency of the
+    requests, the number and duration of the SQL statements they
+    executed (per route), the requests in flight and the hits and
+    misses of the caches. `render()` formats them in the Prometheus
+    text exposition format.
+
+    Requests are recorded by `MetricsMiddleware`, SQL statements by
+    the hooks `instrument()` installs on an engine. Statements executed
+    outside of a request (e.g. by `DeferredWriter`) only count towards
+    the totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: dict[tuple, int] = {}
+        self._durations: dict[tuple, Histogram] = {}
+        self._statements: dict[tuple, Histogram] = {}
+        self._sql_durations: dict[tuple, Histogram] = {}
+        self._caches: dict[str, object] = {}
+        self._pools: dict[str, sa.Engine] = {}
+        self._admission = None
+
+        self.in_flight: int = 0
+        self.sql_statements: int = 0
+        self.sql_seconds: float = 0.0
+
+    def add_cache(self, name: str, cache):
+        """
+        Exposes the `hits` and `misses` counters of the `cache`.
+        """
+
+        self._caches[name] = cache
+
+    def add_pool(self, name: str, engine: sa.Engine):
+        """
+        Exposes the size, the connections checked out and the waits
+        for a connection of the pool of `engine`, if it's timed
+        (see `TimedQueuePool`). The pool is looked up on every
+        render, since disposing of the engine replaces it.
+        """
+
+        self._pools[name] = engine
+
+    def add_admission(self, controller):
+        """
+        Exposes the counters of the `AdmissionController`.
+        """
+
+        self._admission = controller
+
+    def instrument(self, engine: sa.Engine):
+        """
+        Installs the hooks counting and timing
+        the SQL statements executed by `engine`.
+        """
+
+        time_statements(engine)
+        sa.event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = statement_duration(context)
+        if elapsed is None:
+            return
+
+        state = _current.get()
+        if state is not None:
+            state.statements += 1
+            state.sql_seconds += elapsed
+
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_seconds += elapsed
+
+    def request_started(self) -> contextvars.Token:
+        with self._lock:
+            self.in_flight += 1
+
+        return _current.set(_RequestState())
+
+    def request_finished(self, token: contextvars.Token, method: str, route: str, status: int, elapsed: float):
+        state = _current.get()
+        _current.reset(token)
+
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self._requests[key + (status,)] = self._requests.get(key + (status,), 0) + 1
+
+            if key not in self._durations:
+                self._durations[key] = Histogram(DURATION_BUCKETS)
+                self._statements[key] = Histogram(STATEMENT_BUCKETS)
+                self._sql_durations[key] = Histogram(DURATION_BUCKETS)
+
+            self._durations[key].observe(elapsed)
+            self._statements[key].observe(state.statements)
+            self._sql_durations[key].observe(state.sql_seconds)
+
+    def render(self) -> str:
+        """
+        Formats the metrics in the Prometheus text exposition format.
+        """
+
+        lines = []
+
+        def header(name: str, kind: str, description: str):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histograms(name: str, histograms: dict, description: str):
+            header(name, 'histogram', description)
+            for key, histogram in sorted(histograms.items()):
+                for le, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{_labels(("method", "route", "le"), key + (le,))} {count}')
+                lines.append(f'{name}_sum{_labels(("method", "route"), key)} {_number(histogram.sum)}')
+                lines.append(f'{name}_count{_labels(("method", "route"), key)} {histogram.count}')
+
+        with self._lock:
+            header('petboards_requests_total', 'counter', 'Requests handled, by route and status.')
+            for key, count in sorted(self._requests.items()):
+                lines.append(f'petboards_requests_total{_labels(("method", "route", "status"), key)} {count}')
+
+            header('petboards_requests_in_flight', 'gauge', 'Requests being handled.')
+            lines.append(f'petboards_requests_in_flight {self.in_flight}')
+
+            histograms('petboards_request_duration_seconds', self._durations, 'Time spent handling requests.')
+            histograms(
+                'petboards_request_sql_statements', self._statements,
+                'SQL statements executed per request.'
+            )
+            histograms(
+                'petboards_request_sql_duration_seconds', self._sql_durations,
+                'Time spent executing SQL statements per request.'
+            )
+
+            header('petboards_sql_statements_total', 'counter', 'SQL statements executed.')
+            lines.append(f'petboards_sql_statements_total {self.sql_statements}')
+            header('petboards_sql_duration_seconds_total', 'counter', 'Time spent executing SQL statements.')
+            lines.append(f'petboards_sql_duration_seconds_total {_number(self.sql_seconds)}')
+
+        header('petboards_cache_hits_total', 'counter', 'Cache hits.')
+        for name, cache in sorted(self._caches.items()):
+            lines.append(f'petboards_cache_hits_total{_labels(("cache",), (name,))} {cache.hits}')
+        header('petboards_cache_misses_total', 'counter', 'Cache misses.')
+        for name, cache in sorted(self._caches.items()):
+            lines.append(f'petboards_cache_misses_total{_labels(("cache",), (name,))} {cache.misses}')
+
+        pools = [
+            (name, engine.pool.snapshot())
+            for name, engine in sorted(self._pools.items())
+            if hasattr(engine.pool, 'snapshot')
+        ]
+        if len(pools) > 0:
+            header('petboards_db_pool_size', 'gauge', 'Connections of the database pool, by pool.')
+            for name, (size, _, _) in pools:
+                lines.append(f'petboards_db_pool_size{_labels(("pool",), (name,))} {size}')
+            header('petboards_db_pool_checked_out', 'gauge', 'Connections checked out of the database pool, by pool.')
+            for name, (_, checked_out, _) in pools:
+                lines.append(f'petboards_db_pool_checked_out{_labels(("pool",), (name,))} {checked_out}')
+
+            header('petboards_db_pool_wait_seconds', 'histogram', 'Time spent waiting for a database connection, by pool.')
+            for name, (_, _, histogram) in pools:
+                for le, count in histogram.cumulative():
+                    lines.append(f'petboards_db_pool_wait_seconds_bucket{_labels(("pool", "le"), (name, le))} {count}')
+                lines.append(f'petboards_db_pool_wait_seconds_sum{_labels(("pool",), (name,))} {_number(histogram.sum)}')
+                lines.append(f'petboards_db_pool_wait_seconds_count{_labels(("pool",), (name,))} {histogram.count}')
+
+        if self._admission is not None:
+            in_flight, waiting, classes = self._admission.snapshot()
+
+            header('petboards_admission_in_flight', 'gauge', 'Requests admitted and being handled.')
+            lines.append(f'petboards_admission_in_flight {in_flight}')
+            header('petboards_admission_waiting', 'gauge', 'Requests waiting to be admitted.')
+            lines.append(f'petboards_admission_waiting {waiting}')
+            if self._admission.max_in_flight is not None:
+                header('petboards_admission_max_in_flight', 'gauge', 'Limit of the requests admitted at once.')
+                lines.append(f'petboards_admission_max_in_flight {self._admission.max_in_flight}')
+
+            header('petboards_admission_admitted_total', 'counter', 'Requests admitted, by class.')
+            for name, admitted, _, _ in classes:
+                lines.append(f'petboards_admission_admitted_total{_labels(("class",), (name,))} {admitted}')
+            header('petboards_admission_rejected_total', 'counter', 'Requests rejected, by class.')
+            for name, _, rejected, _ in classes:
+                lines.append(f'petboards_admission_rejected_total{_labels(("class",), (name,))} {rejected}')
+
+            header('petboards_admission_queue_seconds', 'histogram', 'Time requests waited to be admitted, by class.')
+            for name, _, _, histogram in classes:
+                for le, count in histogram.cumulative():
+                    lines.append(f'petboards_admission_queue_seconds_bucket{_labels(("class", "le"), (name, le))} {count}')
+                lines.append(f'petboards_admission_queue_seconds_sum{_labels(("class",), (name,))} {_number(histogram.sum)}')
+                lines.append(f'petboards_admission_queue_seconds_count{_labels(("class",), (name,))} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and SQL statements of every
+    request in `metrics`, by the route template it matched.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self._metrics = metrics
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        req.context.metrics_token = self._metrics.request_started()
+        req.context.metrics_start = time.perf_counter()
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        token = getattr(req.context, 'metrics_token', None)
+        if token is None:
+            return
+
+        # Unmatched paths are put together, so that
+        # they don't make a label value each.
+        self._metrics.request_finished(
+            token,
+            req.method,
+            req.uri_template or 'unmatched',
+            falcon.http_status_to_code(resp.status),
+            time.perf_counter() - req.context.metrics_start
+        )
+
+class MetricsResource:
+    """
+    Exposes the collected metrics for Prometheus to scrape.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self._metrics = metrics
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.status = falcon.HTTP_200
+        resp.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        resp.text = self._metrics.render()
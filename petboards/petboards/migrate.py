@@ -0,0 +1,34 @@
+"""
+Migration of the database to the current schema:
+
+    python -m petboards.migrate
+
+The gunicorn config (see `petboards.gunicorn_config`) runs it once,
+in the master process, before any worker starts. The application
+itself never changes the schema, so that the workers, which load it
+at the same time unless it's preloaded, don't race doing so.
+"""
+
+import sqlalchemy as sa
+
+from .config import Settings
+from .persistency import Base, migrate
+from .board import assign_sequence_numbers
+
+def migrate_database(path: str):
+    """
+    Brings the SQLite database at `path` (created, if there's none)
+    up to date: the missing tables, columns and indexes are added,
+    and the messages without sequence numbers are numbered.
+    """
+
+    engine = sa.create_engine(f'sqlite:///{path}')
+    try:
+        migrate(engine, Base.metadata)
+        with engine.begin() as conn:
+            assign_sequence_numbers(conn)
+    finally:
+        engine.dispose()
+
+if __name__ == '__main__':
+    migrate_database(Settings().database_path)
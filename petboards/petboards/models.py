@@ -2,12 +2,12 @@ import uuid
 import bcrypt
 
 import sqlalchemy as sa
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, relationship, aliased
 
-from typing import List
+from typing import List, Callable
 from datetime import datetime
 
-from .persistency import Base
+from .persistency import Base, raw, uuid_str, timestamp
 
 class User(Base):
     __tablename__ = 'users'
@@ -57,12 +57,26 @@ class User(Base):
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        sa.Index('ix_messages_board_id_timestamp', 'board_id', 'timestamp'),
+        sa.Index('ix_messages_author_id_timestamp_message_id', 'author_id', 'timestamp', 'message_id'),
+        sa.Index('ix_messages_board_id_seq', 'board_id', 'seq'),
+    )
 
     message_id = sa.Column(sa.Uuid, primary_key=True, autoincrement=False)
     text = sa.Column(sa.String(2048), nullable=False)
     timestamp = sa.Column(sa.DateTime(), nullable=False)
     last_edited = sa.Column(sa.DateTime(), nullable=True)
 
+    # Sequence numbers of the board's changes, that created and
+    # last changed the message (see `MessageStore.save()`).
+    created_seq = sa.Column(sa.Integer, nullable=True)
+    seq = sa.Column(sa.Integer, nullable=True)
+
+    # Set once the message is hidden by a moderator: it's kept in the
+    # database, but no longer returned (see `MessageStore.remove()`).
+    hidden_at = sa.Column(sa.DateTime(), nullable=True)
+
     author_id = sa.Column(sa.ForeignKey('users.user_id'))
     author: Mapped['User'] = relationship('User')
 
@@ -90,21 +104,35 @@ class Message(Base):
 
 class Board(Base):
     __tablename__ = 'boards'
+    __table_args__ = (
+        sa.Index('ix_boards_created_at_board_id', 'created_at', 'board_id'),
+    )
 
     board_id = sa.Column(sa.Uuid, primary_key=True, autoincrement=False)
     topic = sa.Column(sa.String(256), nullable=False)
     created_at = sa.Column(sa.DateTime(), nullable=False)
 
+    # The sequence number of the latest change of the board's messages,
+    # and of the latest tombstone removed by the compaction.
+    last_seq = sa.Column(sa.Integer, nullable=False, default=0, server_default='0')
+    purged_seq = sa.Column(sa.Integer, nullable=False, default=0, server_default='0')
+
     creator_id = sa.Column(sa.ForeignKey('users.user_id'))
     created_by: Mapped['User'] = relationship('User', back_populates='boards')
 
-    messages: Mapped[List['Message']] = relationship('Message', back_populates='board')
+    messages: Mapped[List['Message']] = relationship(
+        'Message',
+        back_populates='board',
+        primaryjoin='and_(Board.board_id == Message.board_id, Message.hidden_at.is_(None))'
+    )
 
     def __init__(self, topic: str, created_by: User):
         self.board_id = uuid.uuid4()
         self.topic = topic
         self.created_by = created_by
         self.created_at = datetime.utcnow()
+        self.last_seq = 0
+        self.purged_seq = 0
         self.messages = []
 
     def serialize(self) -> dict:
@@ -127,4 +155,195 @@ class Board(Base):
                 'timestamp': self.messages[0].timestamp.timestamp(),
                 'last_edited': self.messages[0].last_edited.timestamp()
             } if len(self.messages) > 0 else None
-        }
\ No newline at end of file
+        }
+
+class Tombstone(Base):
+    """
+    Trace of a message deleted from a board, kept for the clients
+    syncing the board's changes until it's compacted.
+    """
+
+    __tablename__ = 'message_tombstones'
+    __table_args__ = (
+        sa.Index('ix_message_tombstones_deleted_at', 'deleted_at'),
+    )
+
+    board_id = sa.Column(sa.ForeignKey('boards.board_id'), primary_key=True)
+    seq = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    message_id = sa.Column(sa.Uuid, nullable=False)
+    deleted_at = sa.Column(sa.DateTime(), nullable=False)
+
+    def __init__(self, board_id: uuid.UUID, seq: int, message_id: uuid.UUID):
+        self.board_id = board_id
+        self.seq = seq
+        self.message_id = message_id
+        self.deleted_at = datetime.utcnow()
+
+# Columns and serializers for the Core read path. The rows are
+# turned into the same dictionaries the `serialize()` methods above
+# return, but without loading ORM objects.
+
+USER_COLUMNS = (
+    raw(User.user_id), User.username, User.first_name, User.last_name,
+    raw(User.registered), raw(User.last_login)
+)
+
+MESSAGE_COLUMNS = (
+    raw(Message.message_id), Message.text, raw(Message.author_id), raw(Message.board_id),
+    raw(Message.timestamp), raw(Message.last_edited)
+)
+
+BOARD_COLUMNS = (
+    raw(Board.board_id), Board.topic, raw(Board.created_at)
+)
+
+# Columns of the author of a message, read along with the
+# message by joining `users` on `Message.author_id`.
+AUTHOR_COLUMNS = (
+    sa.type_coerce(User.user_id, sa.String).label('author_user_id'),
+    User.username, User.first_name, User.last_name
+)
+
+def _same(value):
+    return value
+
+# Scalar fields of the serialized objects: the key of each mapped
+# to the column it is read from and the function converting the
+# stored value, in the same order `serialize()` uses.
+
+USER_FIELDS = dict(zip(
+    ('user_id', 'username', 'first_name', 'last_name', 'registered', 'last_login'),
+    zip(USER_COLUMNS, (uuid_str, _same, _same, _same, timestamp, timestamp))
+))
+
+MESSAGE_FIELDS = dict(zip(
+    ('message_id', 'text', 'author_id', 'board_id', 'timestamp', 'last_edited'),
+    zip(MESSAGE_COLUMNS, (uuid_str, _same, uuid_str, uuid_str, timestamp, timestamp))
+))
+
+BOARD_FIELDS = dict(zip(
+    ('board_id', 'topic', 'created_at'),
+    zip(BOARD_COLUMNS, (uuid_str, _same, timestamp))
+))
+
+# Fields, which are loaded from the related tables.
+
+USER_RELATIONS = ('boards',)
+BOARD_RELATIONS = ('created_by', 'first_message')
+
+def select_fields(fields: dict, names) -> tuple[list, Callable[[tuple], dict]]:
+    """
+    Picks the columns of the fields `names` out of `fields` (one of
+    the `*_FIELDS` above) and returns them along with a function,
+    that serializes a row of these columns into a dictionary.
+    """
+
+    picked = [(name, column, convert) for name, (column, convert) in fields.items() if name in names]
+    columns = [column for _, column, _ in picked]
+
+    def serialize(row) -> dict:
+        return {name: convert(value) for (name, _, convert), value in zip(picked, row)}
+
+    return columns, serialize
+
+def serialize_user_row(row) -> dict:
+    """
+    Serializes a row of `USER_COLUMNS` like `User.serialize()`
+    does, except for the `boards` key.
+    """
+
+    user_id, username, first_name, last_name, registered, last_login = row
+    return {
+        'user_id': uuid_str(user_id),
+        'username': username,
+        'first_name': first_name,
+        'last_name': last_name,
+        'registered': timestamp(registered),
+        'last_login': timestamp(last_login)
+    }
+
+def serialize_message_row(row) -> dict:
+    """
+    Serializes a row of `MESSAGE_COLUMNS` like `Message.serialize()` does.
+    """
+
+    message_id, text, author_id, board_id, created, last_edited = row
+    return {
+        'message_id': uuid_str(message_id),
+        'text': text,
+        'author_id': uuid_str(author_id),
+        'board_id': uuid_str(board_id),
+        'timestamp': timestamp(created),
+        'last_edited': timestamp(last_edited)
+    }
+
+def serialize_author_row(row) -> tuple[str, dict] | None:
+    """
+    Serializes a row of `AUTHOR_COLUMNS` into the ID of the author and
+    their public profile, or returns `None` if there's no author.
+    """
+
+    user_id, username, first_name, last_name = row
+    if user_id is None:
+        return None
+
+    return uuid_str(user_id), {
+        'username': username,
+        'first_name': first_name,
+        'last_name': last_name
+    }
+
+def serialize_first_message_row(row) -> dict:
+    """
+    Serializes a row of `MESSAGE_COLUMNS` the way the first message
+    of a board is represented in `Board.serialize()`.
+    """
+
+    message_id, text, author_id, _, created, last_edited = row
+    return {
+        'message_id': uuid_str(message_id),
+        'text': text,
+        'author_id': uuid_str(author_id),
+        'timestamp': timestamp(created),
+        'last_edited': timestamp(last_edited)
+    }
+
+def select_first_messages(board_ids: list[str]) -> sa.Select:
+    """
+    Selects `MESSAGE_COLUMNS` of the earliest visible message on each
+    of the boards with the (raw) IDs `board_ids`. Each board's
+    first message is found with the `(board_id, timestamp)` index.
+    """
+
+    first = aliased(Message)
+    first_id = sa.select(first.message_id) \
+        .where(first.board_id == Board.board_id, first.hidden_at.is_(None)) \
+        .order_by(first.timestamp) \
+        .limit(1) \
+        .scalar_subquery()
+
+    first_ids = sa.select(first_id).where(sa.type_coerce(Board.board_id, sa.String).in_(board_ids))
+
+    return sa.select(*MESSAGE_COLUMNS).where(Message.message_id.in_(first_ids))
+
+def select_latest_messages(board_ids: list[uuid.UUID], per_board: int) -> sa.Select:
+    """
+    Selects `MESSAGE_COLUMNS` of the `per_board` latest visible
+    messages on each of the boards with UUIDs `board_ids`, ordered by
+    the board and newest first. Like the first messages, each board's
+    latest ones are found by walking its `(board_id, timestamp)` index
+    backwards, so only `per_board` entries of it are read per board.
+    """
+
+    latest = aliased(Message)
+    latest_ids = sa.select(latest.message_id) \
+        .where(latest.board_id == Board.board_id, latest.hidden_at.is_(None)) \
+        .order_by(latest.timestamp.desc()) \
+        .limit(per_board) \
+        .correlate(Board)
+
+    return sa.select(*MESSAGE_COLUMNS) \
+        .select_from(Board) \
+        .join(Message, Message.message_id.in_(latest_ids)) \
+        .where(Board.board_id.in_(board_ids)) \
+        .order_by(Message.board_id, Message.timestamp.desc())
@@ -0,0 +1,62 @@
+import falcon
+from pydantic import BaseModel
+
+import uuid
+from typing import Literal
+
+from .security import require_authorization, require_moderator
+from .validation import validate
+from .budget import query_budget
+from .board import MessageStore
+
+class ModerationBody(BaseModel):
+    action: Literal['delete', 'hide']
+
+class ModerationResource():
+    """
+    Bulk removal of messages by the users named in `moderators`:
+    all messages of a user, or all messages on a board, are deleted
+    or hidden at once, see `MessageStore.remove()`.
+    """
+
+    def __init__(self, message_store: MessageStore, moderators: frozenset[str]):
+        self._message_store = message_store
+        self._moderators = moderators
+
+    @falcon.before(query_budget(5))
+    @falcon.before(require_authorization)
+    @falcon.before(require_moderator)
+    @falcon.before(validate(body=ModerationBody))
+    def on_post_author(self, req: falcon.Request, resp: falcon.Response, user_id: uuid.UUID):
+        """
+        Deletes or hides (per the `action`) all messages
+        written by the user with the ID `user_id`.
+        """
+
+        body: ModerationBody = req.context.body
+        self._respond(resp, self._message_store.remove_by_author(user_id, hide=body.action == 'hide'))
+
+    @falcon.before(query_budget(5))
+    @falcon.before(require_authorization)
+    @falcon.before(require_moderator)
+    @falcon.before(validate(body=ModerationBody))
+    def on_post_board(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID):
+        """
+        Deletes or hides (per the `action`) all messages
+        on the board with the ID `board_id`.
+        """
+
+        body: ModerationBody = req.context.body
+        self._respond(resp, self._message_store.remove_from_board(board_id, hide=body.action == 'hide'))
+
+    def _respond(self, resp: falcon.Response, removed: tuple[int, int] | None):
+        if removed is None:
+            raise falcon.HTTPNotFound
+
+        messages, boards = removed
+        resp.media = {
+            'messages': messages,
+            'boards': boards
+        }
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
@@ -1,5 +1,185 @@
+import falcon
 import sqlalchemy as sa
-from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.orm import DeclarativeBase, Session, scoped_session
+from sqlalchemy.pool import QueuePool
+
+import time
+import threading
+from datetime import datetime
+
+from .metrics import Histogram, DURATION_BUCKETS
 
 class Base(DeclarativeBase):
     pass
+
+def raw(column):
+    """
+    Wraps the `column` for use in a Core `select()`, so that its
+    value is returned exactly as stored, skipping the conversion
+    into `uuid.UUID` or `datetime` objects SQLAlchemy does.
+    """
+
+    return sa.type_coerce(column, sa.String).label(column.key)
+
+def uuid_str(value: str | None) -> str | None:
+    """
+    Formats the UUID stored as 32 hexadecimal digits the same
+    way `str(uuid.UUID)` does.
+    """
+
+    if value is None:
+        return None
+
+    return f'{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}'
+
+def timestamp(value: str | None) -> float | None:
+    """
+    Converts the stored date and time into the same POSIX timestamp
+    `datetime.timestamp()` returns.
+    """
+
+    if value is None:
+        return None
+
+    return datetime.fromisoformat(value).timestamp()
+
+def migrate(engine: sa.Engine, metadata: sa.MetaData):
+    """
+    Creates the missing tables of `metadata`, and adds the columns
+    and indexes added to the existing tables since they were created
+    (which `create_all()` skips). The added columns must be nullable
+    or have a server default.
+    """
+
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        inspector = sa.inspect(conn)
+        quote = engine.dialect.identifier_preparer.quote
+        for table in metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = sa.schema.CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE {quote(table.name)} ADD COLUMN {ddl}')
+
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+class TimedQueuePool(QueuePool):
+    """
+    `QueuePool`, that records how long the connections took to be
+    checked out (waiting for one to be returned, if all of them are
+    in use, or connecting) in the `waits` histogram.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._waits_lock = threading.Lock()
+        self.waits = Histogram(DURATION_BUCKETS)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._waits_lock:
+                self.waits.observe(elapsed)
+
+    def snapshot(self) -> tuple[int, int, Histogram]:
+        """
+        Returns the size of the pool, the number of connections
+        checked out and a copy of the histogram of the waits.
+        """
+
+        with self._waits_lock:
+            waits = Histogram(DURATION_BUCKETS)
+            waits.counts = list(self.waits.counts)
+            waits.sum, waits.count = self.waits.sum, self.waits.count
+
+        return self.size(), self.checkedout(), waits
+
+def create_engines(path: str, read_pool_size: int = 8, pool_timeout: float = 10.0) -> tuple[sa.Engine, sa.Engine]:
+    """
+    Creates the engines of the SQLite database at `path`: the writer,
+    with a single connection, so that the writes are serialized in the
+    application rather than retried on the database's lock, and the
+    reader, with a pool of `read_pool_size` read-only connections
+    (opened with `mode=ro` and `query_only`). A connection is waited
+    for at most `pool_timeout` seconds.
+
+    The database is switched to the WAL mode, so that the reads
+    don't wait for the writes either.
+    """
+
+    writer = sa.create_engine(
+        f'sqlite:///{path}',
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=pool_timeout
+    )
+    reader = sa.create_engine(
+        f'sqlite:///file:{path}?mode=ro&uri=true',
+        poolclass=TimedQueuePool,
+        pool_size=read_pool_size,
+        max_overflow=0,
+        pool_timeout=pool_timeout
+    )
+
+    @sa.event.listens_for(writer, 'connect')
+    def connect_writer(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.close()
+
+    @sa.event.listens_for(reader, 'connect')
+    def connect_reader(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    return writer, reader
+
+class RoutingSession(Session):
+    """
+    Session, that reads through the `reader` engine and writes
+    through the `writer` one: the flushes and Core `INSERT`, `UPDATE`
+    and `DELETE` statements go to the writer, and so does everything
+    else once the transaction has written something, so that it sees
+    its own changes. The stores don't need to know about it.
+    """
+
+    def __init__(self, *args, reader: sa.Engine, writer: sa.Engine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reader = reader
+        self._writer = writer
+        self._writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._writing or self._flushing or isinstance(clause, sa.sql.expression.UpdateBase):
+            self._writing = True
+            return self._writer
+
+        return self._reader
+
+@sa.event.listens_for(RoutingSession, 'after_transaction_end')
+def _transaction_ended(session: RoutingSession, transaction):
+    if transaction.parent is None:
+        session._writing = False
+
+class SessionMiddleware:
+    """
+    Closes the `scoped_session` of the request (the thread or the
+    greenlet handling it) once the response is ready, so that its
+    connection is returned to the pool and the next request doesn't
+    see objects loaded by this one.
+    """
+
+    def __init__(self, session: scoped_session):
+        self._session = session
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        self._session.remove()
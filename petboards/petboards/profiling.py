@@ -0,0 +1,153 @@
+import falcon
+
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import cProfile
+import threading
+from typing import Literal
+
+PROFILE_HEADER = 'X-Petboards-Profile'
+PROFILE_FILE_HEADER = 'X-Petboards-Profile-File'
+
+_SUFFIXES = ('.pstats', '.collapsed')
+
+class _Sampler(threading.Thread):
+    """
+    Samples the stack of the thread `thread_id` every `interval`
+    seconds and counts the samples of every distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='petboards-profiler', daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.stacks: dict[str, int] = {}
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests carrying the `X-Petboards-Profile` header
+    with the value of `token` (if it is set) and a random `sample_rate`
+    fraction of all requests, and writes the profiles into `directory`.
+
+    With `mode='cprofile'` the request is run under `cProfile` and
+    a `.pstats` file is written. With `mode='sampling'`, the stack of
+    the thread handling the request is sampled every `interval`
+    seconds instead, which costs less, and the samples are written as
+    a `.collapsed` file of folded stacks, that flamegraph tools read.
+    For the requests profiled due to the header, the name of the file
+    is returned in the `X-Petboards-Profile-File` header.
+
+    Only the `max_files` newest profiles are kept. Requests, that
+    aren't profiled, only cost a header lookup (and a random number).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        token: str | None = None,
+        sample_rate: float = 0.0,
+        mode: Literal['cprofile', 'sampling'] = 'cprofile',
+        interval: float = 0.005,
+        max_files: int = 100
+    ):
+        self._directory = directory
+        self._token = token.encode('utf-8') if token else None
+        self._sample_rate = sample_rate
+        self._mode = mode
+        self._interval = interval
+        self._max_files = max_files
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _requested(self, req: falcon.Request) -> bool:
+        if self._token is None:
+            return False
+
+        value = req.get_header(PROFILE_HEADER)
+        return value is not None and hmac.compare_digest(value.encode('utf-8'), self._token)
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        requested = self._requested(req)
+        if not requested and (self._sample_rate <= 0.0 or random.random() >= self._sample_rate):
+            return
+
+        req.context.profile_requested = requested
+        if self._mode == 'sampling':
+            profiler = _Sampler(threading.get_ident(), self._interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        req.context.profiler = profiler
+
+    def process_response(self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool):
+        profiler = getattr(req.context, 'profiler', None)
+        if profiler is None:
+            return
+
+        req.context.profiler = None
+        if isinstance(profiler, _Sampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+
+        route = (req.uri_template or 'unmatched').strip('/').replace('/', '_')
+        route = ''.join(c for c in route if c.isalnum() or c == '_') or 'root'
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{req.method}-{route}-{uuid.uuid4().hex[:8]}'
+
+        if isinstance(profiler, _Sampler):
+            name += '.collapsed'
+            with open(os.path.join(self._directory, name), 'w') as f:
+                for stack, count in profiler.stacks.items():
+                    f.write(f'{stack} {count}\n')
+        else:
+            name += '.pstats'
+            profiler.dump_stats(os.path.join(self._directory, name))
+
+        if req.context.profile_requested:
+            resp.set_header(PROFILE_FILE_HEADER, name)
+
+        self._rotate()
+
+    def _rotate(self):
+        # Several workers may rotate at once, so the files
+        # may already be gone when they get to them.
+        files = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(_SUFFIXES):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+
+        files.sort()
+        for _, path in files[:max(0, len(files) - self._max_files)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
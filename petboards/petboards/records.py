@@ -0,0 +1,97 @@
+from array import array
+from datetime import datetime
+
+from .persistency import uuid_str
+
+# Stands for a missing time in the arrays of `MessageBlock`.
+_NO_TIME = -(1 << 63)
+
+def _micros(value: str | None) -> int:
+    # The whole seconds `datetime.timestamp()` returns and the
+    # microseconds are packed into one integer, which `_timestamp()`
+    # turns back into exactly the same float.
+    if value is None:
+        return _NO_TIME
+
+    moment = datetime.fromisoformat(value)
+    return int(moment.replace(microsecond=0).timestamp()) * 1_000_000 + moment.microsecond
+
+def _timestamp(micros: int) -> float | None:
+    if micros == _NO_TIME:
+        return None
+
+    return micros // 1_000_000 + (micros % 1_000_000) / 1e6
+
+class MessageBlock:
+    """
+    Compact, immutable block of messages (e.g. a page of a board),
+    meant to be kept in memory by the caches. Instead of an object
+    per message, the block holds an array per field: the IDs packed
+    into 16 bytes each, the times as 64-bit integers, and the authors
+    and boards as indexes into the distinct IDs, which are formatted
+    once per block. Only the texts remain objects of their own.
+
+    The messages are serialized straight from the arrays, into the
+    same dictionaries `Message.serialize()` returns.
+    """
+
+    __slots__ = ('_ids', '_texts', '_authors', '_author_indexes', '_boards', '_board_indexes', '_created', '_edited')
+
+    def __init__(self, rows):
+        """
+        Packs the `rows` of `MESSAGE_COLUMNS` (as they are stored).
+        """
+
+        ids = bytearray()
+        texts = []
+        authors, author_indexes = {}, array('I')
+        boards, board_indexes = {}, array('I')
+        created, edited = array('q'), array('q')
+
+        for message_id, text, author_id, board_id, timestamp, last_edited in rows:
+            ids += bytes.fromhex(message_id)
+            texts.append(text)
+            author_indexes.append(authors.setdefault(author_id, len(authors)))
+            board_indexes.append(boards.setdefault(board_id, len(boards)))
+            created.append(_micros(timestamp))
+            edited.append(_micros(last_edited))
+
+        self._ids = bytes(ids)
+        self._texts = tuple(texts)
+        self._authors = tuple(uuid_str(author_id) for author_id in authors)
+        self._author_indexes = author_indexes
+        self._boards = tuple(uuid_str(board_id) for board_id in boards)
+        self._board_indexes = board_indexes
+        self._created = created
+        self._edited = edited
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def key(self, index: int) -> tuple[bytes, int]:
+        """
+        Returns a key of the message at `index`, which changes
+        whenever its serialized representation does.
+        """
+
+        return self._ids[index * 16:index * 16 + 16], self._edited[index]
+
+    def serialize(self, index: int, fields: frozenset[str] | None = None) -> dict:
+        """
+        Serializes the message at `index` like `Message.serialize()`
+        does, or into just the keys in `fields`, if they are given.
+        """
+
+        message = {
+            'message_id': uuid_str(self._ids[index * 16:index * 16 + 16].hex()),
+            'text': self._texts[index],
+            'author_id': self._authors[self._author_indexes[index]],
+            'board_id': self._boards[self._board_indexes[index]],
+            'timestamp': _timestamp(self._created[index]),
+            'last_edited': _timestamp(self._edited[index])
+        }
+
+        if fields is not None:
+            return {name: value for name, value in message.items() if name in fields}
+
+        return message
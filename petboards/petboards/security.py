@@ -56,6 +56,9 @@ def require_authorization(req, resp, resource, params):
     Validation function, that may be used `falcon.before()`
     the responder in order to validate the JWT token.
 
+    On success, the "username" claim of the token is stored
+    in `req.context.username` for the responder to use.
+
     Raises `falcon.HTTPUnauthorized` if the token is absent or malformed.
     """
 
@@ -65,5 +68,21 @@ def require_authorization(req, resp, resource, params):
     except:
         raise falcon.HTTPUnauthorized
     
-    if JWT.validate(token) is None:
-        raise falcon.HTTPUnauthorized
\ No newline at end of file
+    username = JWT.validate(token)
+    if username is None:
+        raise falcon.HTTPUnauthorized
+
+    req.context.username = username
+
+
+def require_moderator(req, resp, resource, params):
+    """
+    Validation function, that may be used `falcon.before()` the
+    responder below `require_authorization()`, in order to check,
+    that the user is one of the `_moderators` of the resource.
+
+    Raises `falcon.HTTPForbidden` if they aren't.
+    """
+
+    if req.context.username not in resource._moderators:
+        raise falcon.HTTPForbidden
@@ -0,0 +1,208 @@
+import falcon
+
+import os
+import gzip
+import uuid
+import queue
+import logging
+import tempfile
+import threading
+
+from .generations import GenerationTable
+from .compression import negotiate
+
+_logger = logging.getLogger(__name__)
+
+class SnapshotStore:
+    """
+    Files with the rendered JSON bodies of full message pages of the
+    boards, that had no new messages for `min_age` seconds, so that the
+    pages are served from the files (with `sendfile()`, if the WSGI
+    server supports it) instead of being read from the database again.
+
+    A snapshot is tied to the generation of its board in `generations`
+    (see `GenerationTable`), so it's no longer served once the board
+    changes, in any process. Every snapshot is also stored compressed
+    with gzip, which is served to the clients accepting it.
+
+    The responses served from the snapshots carry an `ETag` (of the
+    representation sent) and `Cache-Control` with `max_age` seconds,
+    so that clients may cache them and revalidate them with
+    `If-None-Match`.
+
+    Only the pages of `page_sizes` elements are snapshotted, so that
+    the files can't be multiplied by asking for every page size. The
+    snapshots are written by a background thread (started in every
+    process on the first write), up to `max_pending` of them waiting.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        generations: GenerationTable,
+        min_age: float = 86400.0,
+        max_age: int = 3600,
+        page_sizes: frozenset[int] = frozenset({10, 20, 50}),
+        max_pending: int = 16
+    ):
+        self._directory = directory
+        self._generations = generations
+        self.min_age = min_age
+        self._max_age = max_age
+        self._page_sizes = frozenset(page_sizes)
+        self._max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pending: queue.Queue | None = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def covers(self, elements: int) -> bool:
+        """
+        Returns whether the pages of `elements` elements are snapshotted.
+        """
+
+        return elements in self._page_sizes
+
+    def version(self, board_id: uuid.UUID) -> str:
+        """
+        Returns the current version of the snapshots of the board, which
+        must be taken before its page is read to `write()` a snapshot.
+        """
+
+        return f'{self._generations.epoch:x}-{self._generations.get("board", board_id):x}'
+
+    def _path(self, board_id: uuid.UUID, version: str, page: int, elements: int) -> str:
+        return os.path.join(self._directory, board_id.hex, f'{version}-{page}-{elements}.json')
+
+    def serve(self, req: falcon.Request, resp: falcon.Response, board_id: uuid.UUID, page: int, elements: int) -> bool:
+        """
+        Responds with the snapshot of the page, if there's one of the
+        current version of the board, and returns whether there was.
+        """
+
+        if not self.covers(elements):
+            return False
+
+        version = self.version(board_id)
+        path = self._path(board_id, version, page, elements)
+
+        gzipped = negotiate(req.get_header('Accept-Encoding'), ('gzip',)) is not None
+        if gzipped:
+            path += '.gz'
+
+        try:
+            stream = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        etag = f'"{version}-{page}-{elements}{"-gz" if gzipped else ""}"'
+        self._set_headers(resp, etag)
+        resp.append_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            resp.set_header('Content-Encoding', 'gzip')
+
+        if etag in _etags(req.get_header('If-None-Match')):
+            stream.close()
+            resp.status = falcon.HTTP_NOT_MODIFIED
+            return True
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+        resp.set_stream(stream, os.fstat(stream.fileno()).st_size)
+        return True
+
+    def write(self, resp: falcon.Response, board_id: uuid.UUID, version: str, page: int, elements: int, body: bytes):
+        """
+        Schedules storing the `body` of the page as its snapshot of the
+        `version` of the board, unless too many snapshots are pending.
+        The snapshots of the older versions of the board are removed.
+
+        The response itself gets no `ETag`, since the compression
+        middleware may still encode it: the snapshot is served with
+        the one of its representation next time.
+        """
+
+        resp.append_header('Vary', 'Accept-Encoding')
+
+        with self._lock:
+            # Threads don't survive `fork()`, so every process
+            # gets a writer (and a queue) of its own.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = queue.Queue(self._max_pending)
+                threading.Thread(target=self._run, args=(self._pending,), name='petboards-snapshot-writer', daemon=True).start()
+
+            try:
+                self._pending.put_nowait((board_id, version, page, elements, body))
+            except queue.Full:
+                # The page is snapshotted by a later request.
+                pass
+
+    def flush(self):
+        """
+        Waits until the snapshots scheduled by this process are written.
+        """
+
+        if self._pid == os.getpid():
+            self._pending.join()
+
+    def _run(self, pending: queue.Queue):
+        while True:
+            snapshot = pending.get()
+            try:
+                self._store(*snapshot)
+            except Exception:
+                _logger.exception('Failed to store a snapshot')
+            finally:
+                pending.task_done()
+
+    def _store(self, board_id: uuid.UUID, version: str, page: int, elements: int, body: bytes):
+        path = self._path(board_id, version, page, elements)
+        if os.path.exists(path + '.gz'):
+            return
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Written under temporary names and renamed, so that
+        # the other workers never see a partial snapshot.
+        for target, data in ((path, body), (path + '.gz', gzip.compress(body, 9))):
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, target)
+            finally:
+                # Only left over if the write failed.
+                try:
+                    os.remove(temporary)
+                except FileNotFoundError:
+                    pass
+
+        # Several workers may clean up at once.
+        for entry in os.scandir(directory):
+            if not entry.name.startswith(f'{version}-') and not entry.name.endswith('.tmp'):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _set_headers(self, resp: falcon.Response, etag: str):
+        # Only the clients may cache the pages, as they require a token.
+        resp.set_header('ETag', etag)
+        resp.set_header('Cache-Control', f'private, max-age={self._max_age}')
+
+def _etags(value: str | None) -> list[str]:
+    if value is None:
+        return []
+
+    return [tag.strip().removeprefix('W/') for tag in value.split(',')]
@@ -1,26 +1,174 @@
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
 import sqlalchemy as sa
+import greenlet
 
 from .user import UserStore
 from .app import create_app
 from .board import BoardStore, MessageStore
-from .persistency import Base
+from .persistency import SessionMiddleware, RoutingSession, create_engines
+from .config import Settings
+from .tasks import DeferredWriter, PeriodicTask
+from .metrics import Metrics
+from .budget import QueryBudget
+from .logs import setup_logging, SQLLogger
+from .models import User
+from .generations import GenerationTable, GenerationalCache
+from .snapshots import SnapshotStore
+from .admission import AdmissionController, default_max_in_flight
 
 import os
 import sys
+from datetime import datetime, timedelta
 
 if os.getenv('PETBOARDS_SECRET') is None:
     print('The environment variable \'PETBOARDS_SECRET\', which is used as a secret for the Json Web Token, is not set. Please, consider setting it before running the application.', file=sys.stderr)
     sys.exit(1)
 
-db_engine = sa.create_engine('sqlite:///data/sqlite3.db', echo=True)
-smaker = sessionmaker(db_engine, expire_on_commit=False, class_=Session)
-session = smaker()
+settings = Settings()
 
-user_store = UserStore(session)
-message_store = MessageStore(session)
-board_store = BoardStore(session)
+log_listener = setup_logging(settings.log_level, settings.log_format)
 
-Base.metadata.create_all(db_engine)
+# Reads and writes go through the engines of their own, unless
+# the reads are configured to share the pool of the writes.
+if settings.database_read_pool_size > 0:
+    db_engine, read_engine = create_engines(
+        settings.database_path,
+        read_pool_size=settings.database_read_pool_size,
+        pool_timeout=settings.database_pool_timeout
+    )
+    smaker = sessionmaker(expire_on_commit=False, class_=RoutingSession, reader=read_engine, writer=db_engine)
+    engines = {'write': db_engine, 'read': read_engine}
+    # The readers and the single writer.
+    db_connections = settings.database_read_pool_size + 1
+else:
+    db_engine = read_engine = sa.create_engine(f'sqlite:///{settings.database_path}', pool_timeout=settings.database_pool_timeout)
+    smaker = sessionmaker(db_engine, expire_on_commit=False, class_=Session)
+    engines = {'shared': db_engine}
+    db_connections = None
 
-app = create_app(user_store, message_store, board_store)
\ No newline at end of file
+sql_logger = SQLLogger(
+    settings.sql_log,
+    slow_threshold=settings.sql_log_slow_threshold,
+    sample_rate=settings.sql_log_sample_rate
+)
+for engine in engines.values():
+    sql_logger.instrument(engine)
+
+# Every thread (of the `gthread` worker) or greenlet (of the
+# `gevent` one) handling a request gets a session of its own.
+# `greenlet.getcurrent()` tells apart both, unlike a thread local
+# created before gevent patches the `threading` module.
+session = scoped_session(smaker, scopefunc=greenlet.getcurrent)
+
+# The table is mapped before forking, so all workers share it.
+generations = None
+if settings.cache_enabled or settings.snapshots_enabled:
+    generations = GenerationTable(settings.generations_path, settings.generation_slots)
+
+# The stores bump the generations through the cache, so the
+# snapshots need one, even if it doesn't keep anything.
+cache = None
+if generations is not None:
+    cache = GenerationalCache(generations, settings.cache_size if settings.cache_enabled else 0)
+
+snapshots = None
+if settings.snapshots_enabled:
+    snapshots = SnapshotStore(
+        settings.snapshot_directory,
+        generations,
+        min_age=settings.snapshot_min_age,
+        max_age=settings.snapshot_max_age,
+        page_sizes=frozenset(settings.snapshot_page_sizes)
+    )
+
+def deferred_written(table, key):
+    # Cached users are invalidated once their last login is written.
+    if generations is not None and table is User.__table__:
+        generations.bump('user', key)
+
+deferred = DeferredWriter(
+    db_engine,
+    interval=settings.deferred_write_interval,
+    max_pending=settings.deferred_write_max_pending,
+    on_written=deferred_written
+)
+
+metrics = None
+if settings.metrics_enabled:
+    metrics = Metrics()
+    for name, engine in engines.items():
+        metrics.instrument(engine)
+        metrics.add_pool(name, engine)
+
+query_budget = None
+if settings.query_budget_enabled:
+    query_budget = QueryBudget(settings.query_budget_repeat_threshold)
+    query_budget.instrument(db_engine, smaker)
+    if read_engine is not db_engine:
+        query_budget.instrument(read_engine)
+
+user_store = UserStore(session, deferred, cache)
+message_store = MessageStore(session, cache)
+board_store = BoardStore(session, cache)
+
+# The schema is migrated once by the gunicorn master, never
+# here: see `petboards.migrate`.
+
+def compact_tombstones():
+    # The job's thread gets a session of its own.
+    try:
+        message_store.compact_tombstones(datetime.utcnow() - timedelta(seconds=settings.tombstone_retention))
+    finally:
+        session.remove()
+
+# Started in the workers only, by `post_worker_init()`: a thread of
+# the master process could hold the locks of the database while the
+# workers are forked.
+compactor = PeriodicTask(compact_tombstones, settings.tombstone_compaction_interval, 'petboards-compactor')
+
+# Sized for the worker by `post_worker_init()`, unless configured.
+admission = None
+if settings.admission_enabled:
+    admission = AdmissionController(
+        settings.admission_max_in_flight,
+        settings.admission_max_queue,
+        settings.admission_queue_timeout
+    )
+
+app = create_app(user_store, message_store, board_store, settings, metrics, query_budget, snapshots, admission)
+if metrics is not None and cache is not None:
+    metrics.add_cache('generational', cache)
+app.add_middleware(SessionMiddleware(session))
+
+def post_fork():
+    """
+    Prepares a worker process forked after the application was
+    loaded: the connections of the parent are left to it, and the
+    logging thread, which doesn't survive `fork()`, is started again.
+    """
+
+    global log_listener
+
+    for engine in engines.values():
+        engine.dispose(close=False)
+    session.remove()
+    log_listener = setup_logging(settings.log_level, settings.log_format)
+
+def post_worker_init(concurrency: int):
+    """
+    Prepares a worker process, that has loaded the application and
+    takes up to `concurrency` requests at once, and starts its jobs.
+    """
+
+    compactor.start()
+    if admission is not None and settings.admission_max_in_flight is None:
+        admission.resize(default_max_in_flight(concurrency, db_connections))
+
+def worker_exit():
+    """
+    Writes everything pending before the worker process exits.
+    """
+
+    compactor.stop()
+    deferred.close()
+    log_listener.stop()
@@ -0,0 +1,217 @@
+import sqlalchemy as sa
+
+import os
+import atexit
+import logging
+import threading
+from typing import Callable
+
+_logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """
+    Calls `function` every `interval` seconds in a background thread.
+    Its errors are logged and don't stop the task.
+
+    The thread is started by `start()`, which must be called again in
+    a forked child process (threads don't survive `fork()`), and is
+    stopped by `stop()`.
+    """
+
+    def __init__(self, function: Callable[[], None], interval: float, name: str):
+        self._function = function
+        self._interval = interval
+        self._name = name
+        self._pid = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None and self._pid == os.getpid():
+            thread.join()
+
+        self._pid = None
+
+    def _run(self):
+        stopped = self._stopped
+        while not stopped.wait(self._interval):
+            try:
+                self._function()
+            except Exception:
+                _logger.exception('The periodic task %s failed', self._name)
+
+class DeferredWriter:
+    """
+    Applies non-critical writes (like the time of the last login or
+    counters) in a background thread, batching everything scheduled
+    during `interval` seconds into a single transaction.
+
+    Writes to the same row are coalesced: of several `update()`s only
+    the latest values are written, and `increment()`s are summed up.
+    At most `max_pending` rows may wait to be written; beyond that,
+    new writes are rejected, so that the caller may apply them itself.
+
+    The thread is started on the first write (again in a forked
+    child process) and everything pending is written on `close()`,
+    which is also called at interpreter exit.
+
+    If `on_written` is given, it's called with the table and the
+    primary key of every row written, after the transaction commits.
+    """
+
+    def __init__(
+        self,
+        engine: sa.Engine,
+        interval: float = 1.0,
+        max_pending: int = 10000,
+        on_written: Callable[[sa.Table, object], None] | None = None
+    ):
+        self._engine = engine
+        self._interval = interval
+        self._max_pending = max_pending
+        self._on_written = on_written
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._updates: dict = {}
+        self._increments: dict = {}
+
+    def _start(self):
+        # Threads don't survive `fork()`: the child gets its own
+        # thread and doesn't inherit writes the parent will apply.
+        if self._pid != os.getpid():
+            if self._pid is not None:
+                self._reset()
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='petboards-deferred-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def update(self, model, key, **values) -> bool:
+        """
+        Schedules the update of the `values` of the columns of the row
+        of `model` with the primary key `key`. Returns `False` if the
+        write was rejected because too many writes are pending.
+        """
+
+        with self._lock:
+            if self._closed:
+                return False
+
+            self._start()
+
+            row = (model.__table__, key)
+            pending = self._updates.get(row)
+            if pending is None:
+                if len(self._updates) + len(self._increments) >= self._max_pending:
+                    return False
+                self._updates[row] = pending = {}
+
+            pending.update(values)
+
+        return True
+
+    def increment(self, model, key, column: str, amount: int = 1) -> bool:
+        """
+        Schedules adding `amount` to the `column` of the row of `model`
+        with the primary key `key`. Returns `False` if the write was
+        rejected because too many writes are pending.
+        """
+
+        with self._lock:
+            if self._closed:
+                return False
+
+            self._start()
+
+            counter = (model.__table__, key, column)
+            if counter not in self._increments:
+                if len(self._updates) + len(self._increments) >= self._max_pending:
+                    return False
+                self._increments[counter] = 0
+
+            self._increments[counter] += amount
+
+        return True
+
+    def flush(self):
+        """
+        Writes everything scheduled so far in one transaction.
+        """
+
+        with self._lock:
+            updates, self._updates = self._updates, {}
+            increments, self._increments = self._increments, {}
+
+        if len(updates) == 0 and len(increments) == 0:
+            return
+
+        # Rows of the same table with the same updated columns
+        # are written with a single `executemany()`.
+        batches: dict = {}
+        for (table, key), values in updates.items():
+            columns = tuple(sorted(values))
+            params = {'_key': key, **{f'_{c}': values[c] for c in columns}}
+            batches.setdefault((table, columns, False), []).append(params)
+        for (table, key, column), amount in increments.items():
+            batches.setdefault((table, (column,), True), []).append({'_key': key, f'_{column}': amount})
+
+        try:
+            with self._engine.begin() as conn:
+                for (table, columns, increment), params in batches.items():
+                    pk = table.primary_key.columns.values()[0]
+                    statement = sa.update(table).where(pk == sa.bindparam('_key')).values({
+                        c: table.c[c] + sa.bindparam(f'_{c}') if increment else sa.bindparam(f'_{c}')
+                        for c in columns
+                    })
+
+                    conn.execute(statement, params)
+        except Exception:
+            _logger.exception('Failed to apply %d deferred writes', len(updates) + len(increments))
+            return
+
+        if self._on_written is not None:
+            try:
+                for table, key in updates:
+                    self._on_written(table, key)
+                for table, key, _ in increments:
+                    self._on_written(table, key)
+            except Exception:
+                _logger.exception('Failed to notify about deferred writes')
+
+    def close(self):
+        """
+        Stops the background thread and writes everything pending.
+        """
+
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread() and self._pid == os.getpid():
+            thread.join()
+
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._interval)
+            self.flush()
@@ -3,17 +3,37 @@ import uuid
 
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from pydantic import BaseModel
+
+from datetime import datetime
 
 from .security import require_authorization
-from .models import User
+from .tasks import DeferredWriter
+from .generations import GenerationalCache
+from .coalescing import SingleFlight, coalesced
+from .validation import validate, CursorPaginationParams, SparseFieldsParams, IdsParams, encode_cursor
+from .budget import query_budget
+from .persistency import raw, uuid_str, timestamp
+from .models import (
+    User, Board, BOARD_COLUMNS, USER_FIELDS, USER_RELATIONS,
+    select_fields, serialize_first_message_row, select_first_messages
+)
 
 class UserStore:
     """
     Data access layer for `User` objects.
     """
 
-    def __init__(self, db_session: Session):
+    def __init__(
+        self,
+        db_session: Session,
+        deferred: DeferredWriter | None = None,
+        cache: GenerationalCache | None = None
+    ):
         self._db = db_session
+        self._deferred = deferred
+        self._cache = cache
 
     def get_by_username(self, username: str) -> User | None:
         """
@@ -45,6 +65,145 @@ class UserStore:
 
         return users
 
+    def get_all_serialized(self, page: int, elements: int, fields: frozenset[str] | None = None) -> list[dict]:
+        """
+        Same as `get_all()`, but returns the users already serialized
+        like `User.serialize()` does. The rows are read with up to
+        three Core queries, without loading any ORM objects.
+
+        If `fields` is given, only these keys of the users are
+        returned, and only the columns and tables needed to
+        serialize them are queried.
+        """
+
+        users, _ = self._get_serialized(lambda query: query.offset(page * elements), elements, fields)
+
+        return users
+
+    def get_after_serialized(
+        self,
+        after: tuple | None,
+        elements: int,
+        fields: frozenset[str] | None = None
+    ) -> tuple[list[dict], tuple | None]:
+        """
+        Same as `get_all_serialized()`, but instead of skipping whole
+        pages, fetches the `elements` users following the one with the
+        sort key `after` (or the first ones, if it's `None`), using
+        the index on `username`.
+
+        Returns the users and the sort key of the last of them, or
+        `None` instead of the key if there are no more users.
+        """
+
+        if after is None:
+            return self._get_serialized(lambda query: query, elements, fields)
+
+        return self._get_serialized(lambda query: query.where(User.username > after[0]), elements, fields)
+
+    def get_serialized(self, user_id: uuid.UUID) -> dict | None:
+        """
+        Same as `get()`, but returns the user already serialized
+        like `User.serialize()` does, reading their boards and the
+        first messages of these with a query each (instead of
+        a lazy load per board). If the user doesn't exist,
+        `None` is returned.
+
+        If there's a cache, the user is kept in it until they,
+        their boards or the first messages of these change.
+        """
+
+        if self._cache is None:
+            return self._get_one_serialized(user_id)
+
+        return self._cache.get(('user', user_id), (('user', user_id),), lambda: self._get_one_serialized(user_id))
+
+    def _get_one_serialized(self, user_id: uuid.UUID) -> dict | None:
+        users, _ = self._get_serialized(lambda query: query.where(User.user_id == user_id), 1, None)
+
+        return users[0] if len(users) > 0 else None
+
+    def get_many_serialized(self, user_ids: list[uuid.UUID], fields: frozenset[str] | None = None) -> list[dict]:
+        """
+        Fetches the users with UUIDs `user_ids` with a single query
+        and returns their compact representations (without the `boards`
+        key of `User.serialize()`, or with only the keys in `fields`),
+        in the order of `user_ids`. Users, that don't exist, are skipped.
+        """
+
+        columns, serialize = select_fields(USER_FIELDS, fields if fields is not None else USER_FIELDS.keys())
+        rows = self._db.execute(
+            sa.select(raw(User.user_id), *columns).where(User.user_id.in_(user_ids))
+        )
+
+        by_id = {row[0]: serialize(row[1:]) for row in rows}
+        return [by_id[user_id.hex] for user_id in user_ids if user_id.hex in by_id]
+
+    def _get_serialized(self, paginate, elements: int, fields: frozenset[str] | None) -> tuple[list[dict], tuple | None]:
+        if fields is None:
+            fields = USER_FIELDS.keys() | USER_RELATIONS
+
+        # One more row is fetched to know whether there's a next page.
+        columns, serialize = select_fields(USER_FIELDS, fields)
+        users = self._db.execute(
+            paginate(sa.select(raw(User.user_id), User.username, *columns))
+            .order_by(User.username)
+            .limit(elements + 1)
+        ).all()
+
+        last = None
+        if len(users) > elements:
+            users = users[:elements]
+            if elements > 0:
+                last = (users[-1][1],)
+
+        res = []
+        by_id = {}
+        for row in users:
+            user = serialize(row[2:])
+            if 'boards' in fields:
+                user['boards'] = by_id[row[0]] = []
+            res.append(user)
+
+        if len(by_id) == 0:
+            return res, last
+
+        boards = self._db.execute(
+            sa.select(*BOARD_COLUMNS, sa.type_coerce(Board.creator_id, sa.String))
+            .where(sa.type_coerce(Board.creator_id, sa.String).in_(list(by_id)))
+        ).all()
+
+        first_messages = {}
+        if len(boards) > 0:
+            for row in self._db.execute(select_first_messages([b[0] for b in boards])):
+                first_messages[row[3]] = serialize_first_message_row(row)
+
+        for board_id, topic, created_at, creator_id in boards:
+            by_id[creator_id].append({
+                'board_id': uuid_str(board_id),
+                'topic': topic,
+                'created_at': timestamp(created_at),
+                'first_message': first_messages.get(board_id)
+            })
+
+        return res, last
+
+    def record_login(self, user: User, when: datetime):
+        """
+        Sets the time of the last login of the `user` to `when`.
+        If there's a `DeferredWriter`, it writes the change into the
+        database later, otherwise the user is saved right away.
+        """
+
+        if self._deferred is not None and self._deferred.update(User, user.user_id, last_login=when):
+            # The object is kept up to date without becoming
+            # dirty, so that it isn't written the second time.
+            set_committed_value(user, 'last_login', when)
+            return
+
+        user.last_login = when
+        self.save(user)
+
     def save(self, user: User):
         """
         Saves the instance of `User` class into
@@ -53,54 +212,73 @@ class UserStore:
 
         self._db.add(user)
         self._db.commit()
+        self._changed(user.user_id)
 
-def validate_pagination_params(req, resp, resource, params):
-    _PAGINATION_MAX_ELEMENTS = 50
-    
-    if 'page' not in req.params or 'elements' not in req.params:
-        raise falcon.HTTPBadRequest
-    
-    page = int(req.params['page'])
-    elements = int(req.params['elements'])
+    def _changed(self, user_id: uuid.UUID):
+        if self._cache is not None:
+            self._cache.generations.bump('user', user_id)
 
-    if page < 0:
-        raise falcon.HTTPBadRequest('page', 'The page index cannot be negative')
+class UserPaginationParams(CursorPaginationParams, SparseFieldsParams):
+    max_elements = 50
+    key_size = 1
+    allowed_fields = frozenset(USER_FIELDS) | frozenset(USER_RELATIONS)
 
-    if elements < 0:
-        raise falcon.HTTPBadRequest('elements', 'The number of elements per page cannot be negative')
-    if elements > _PAGINATION_MAX_ELEMENTS:
-        raise falcon.HTTPBadRequest('elements', f'The maximum number of elements per page is {_PAGINATION_MAX_ELEMENTS}')
+class UserIdsParams(IdsParams, SparseFieldsParams):
+    max_ids = 50
+    allowed_fields = frozenset(USER_FIELDS)
+
+def _user_list_params(req: falcon.Request) -> type[BaseModel]:
+    return UserIdsParams if 'ids' in req.params else UserPaginationParams
 
 class UserResource:
     
-    def __init__(self, user_store: UserStore):
+    def __init__(self, user_store: UserStore, flights: SingleFlight | None = None):
         self._user_store = user_store
+        self._flights = flights
 
+    @falcon.before(query_budget(3))
     @falcon.before(require_authorization)
-    @falcon.before(validate_pagination_params)
+    @falcon.before(validate(params=_user_list_params))
+    @coalesced
     def on_get(self, req: falcon.Request, resp: falcon.Response):
         """
-        Get all users (paginated query).
+        Get all users (paginated query). If the page is requested by
+        cursor, the users are returned along with the `next_cursor`.
+        If `ids` are given instead, just these users are returned.
         """
 
-        page = int(req.params['page'])
-        elements = int(req.params['elements'])
+        params = req.context.params
 
         resp.content_type = falcon.MEDIA_JSON
-        resp.media = [u.serialize() for u in self._user_store.get_all(page, elements)]
+        if isinstance(params, UserIdsParams):
+            resp.media = self._user_store.get_many_serialized(params.ids, params.fields)
+            resp.status = falcon.HTTP_200
+            return
+
+        elements = params.elements
+        if params.page is not None:
+            resp.media = self._user_store.get_all_serialized(params.page, elements, params.fields)
+        else:
+            users, last = self._user_store.get_after_serialized(params.cursor, elements, params.fields)
+            resp.media = {
+                'items': users,
+                'next_cursor': encode_cursor(last) if last is not None else None
+            }
         resp.status = falcon.HTTP_200
 
+    @falcon.before(query_budget(3))
     @falcon.before(require_authorization)
+    @coalesced
     def on_get_one(self, req: falcon.Request, resp: falcon.Response, user_id: uuid.UUID):
         """
         Get the user by their `user_id`.
         """
         
-        user = self._user_store.get(user_id)
+        user = self._user_store.get_serialized(user_id)
         if user is None:
             raise falcon.HTTPNotFound
 
         resp.content_type = falcon.MEDIA_JSON
-        resp.media = user.serialize()
+        resp.media = user
         resp.status = falcon.HTTP_200
     
\ No newline at end of file
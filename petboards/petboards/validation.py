@@ -0,0 +1,224 @@
+import falcon
+import pydantic
+from pydantic import BaseModel, validator, root_validator
+
+import uuid
+import base64
+import binascii
+import json
+from typing import ClassVar, Callable
+
+class PaginationParams(BaseModel):
+    """
+    Query string of a paginated request: the index of the page
+    and the number of elements on it (at most `max_elements`).
+    """
+
+    max_elements: ClassVar[int] = 50
+
+    page: int
+    elements: int
+
+    @validator('page')
+    def page_not_negative(cls, page: int) -> int:
+        if page < 0:
+            raise ValueError('The page index cannot be negative')
+
+        return page
+
+    @validator('elements')
+    def elements_in_range(cls, elements: int) -> int:
+        if elements < 0:
+            raise ValueError('The number of elements per page cannot be negative')
+        if elements > cls.max_elements:
+            raise ValueError(f'The maximum number of elements per page is {cls.max_elements}')
+
+        return elements
+
+def encode_cursor(key: tuple) -> str:
+    """
+    Encodes the sort `key` of the last element of a page into
+    an opaque cursor, that points to the next page.
+    """
+
+    encoded = base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode('utf-8'))
+    return encoded.decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decodes the `cursor` made by `encode_cursor()` back into the key.
+
+    Raises `ValueError` if the cursor is malformed.
+    """
+
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode((cursor + padding).encode('ascii')))
+    except (ValueError, binascii.Error):
+        raise ValueError('The cursor is malformed')
+
+    if not isinstance(key, list) or not all(isinstance(value, str) for value in key):
+        raise ValueError('The cursor is malformed')
+
+    return tuple(key)
+
+class CursorPaginationParams(PaginationParams):
+    """
+    Query string of a request, that is paginated either by `page`
+    (as `PaginationParams` is), or by an opaque `cursor`, which is
+    the `next_cursor` returned with the previous page. Without both,
+    the first page is requested by cursor.
+
+    The decoded cursor is a tuple of `key_size` values.
+    """
+
+    key_size: ClassVar[int] = 1
+
+    page: int | None = None
+    cursor: tuple | None = None
+
+    @validator('cursor', pre=True)
+    def cursor_valid(cls, cursor) -> tuple:
+        if not isinstance(cursor, str):
+            raise ValueError('The cursor is malformed')
+
+        key = decode_cursor(cursor)
+        if len(key) != cls.key_size:
+            raise ValueError('The cursor is malformed')
+
+        return key
+
+    @root_validator(skip_on_failure=True)
+    def page_or_cursor(cls, values: dict) -> dict:
+        if values.get('page') is not None and values.get('cursor') is not None:
+            raise ValueError('The page and the cursor cannot be used together')
+
+        return values
+
+def _split(value):
+    # Comma-separated lists may also be given as repeated parameters.
+    if isinstance(value, str):
+        value = [value]
+    if isinstance(value, list):
+        value = [item.strip() for values in value for item in values.split(',') if item.strip()]
+
+    return value
+
+class SparseFieldsParams(BaseModel):
+    """
+    Query string of a request, that may limit the fields of the
+    returned objects to the comma-separated list in `fields`
+    (chosen out of `allowed_fields`).
+    """
+
+    allowed_fields: ClassVar[frozenset[str]] = frozenset()
+
+    fields: frozenset[str] | None = None
+
+    @validator('fields', pre=True)
+    def split_fields(cls, fields):
+        return _split(fields) or None
+
+    @validator('fields')
+    def fields_allowed(cls, fields: frozenset[str] | None) -> frozenset[str] | None:
+        unknown = fields - cls.allowed_fields
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+
+        return fields
+
+class ExpandParams(BaseModel):
+    """
+    Query string of a request, that may inline the related objects
+    named in the comma-separated list in `expand` (chosen out of
+    `allowed_expansions`) into the response.
+    """
+
+    allowed_expansions: ClassVar[frozenset[str]] = frozenset()
+
+    expand: frozenset[str] = frozenset()
+
+    @validator('expand', pre=True)
+    def split_expand(cls, expand):
+        return _split(expand)
+
+    @validator('expand')
+    def expand_allowed(cls, expand: frozenset[str]) -> frozenset[str]:
+        unknown = expand - cls.allowed_expansions
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown expansions: {", ".join(sorted(unknown))}')
+
+        return expand
+
+class IdsParams(BaseModel):
+    """
+    Query string of a request for several objects at once by
+    the comma-separated list of their UUIDs in `ids` (at most
+    `max_ids` of them). Repeated IDs are dropped.
+    """
+
+    max_ids: ClassVar[int] = 50
+
+    ids: list[uuid.UUID]
+
+    @validator('ids', pre=True)
+    def split_ids(cls, ids):
+        if isinstance(ids, str):
+            ids = [ids]
+        if isinstance(ids, list):
+            ids = [item.strip() for value in ids for item in value.split(',') if item.strip()]
+
+        return ids
+
+    @validator('ids')
+    def ids_in_range(cls, ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        ids = list(dict.fromkeys(ids))
+        if len(ids) == 0:
+            raise ValueError('At least one ID must be given')
+        if len(ids) > cls.max_ids:
+            raise ValueError(f'The maximum number of IDs is {cls.max_ids}')
+
+        return ids
+
+def parse(schema: type[BaseModel], data) -> BaseModel:
+    """
+    Parses `data` into an instance of `schema`.
+
+    Raises `falcon.HTTPBadRequest` with the name of the first
+    invalid field as the title if `data` doesn't match the schema.
+    """
+
+    if not isinstance(data, dict):
+        raise falcon.HTTPBadRequest
+
+    try:
+        return schema.parse_obj(data)
+    except pydantic.ValidationError as e:
+        error = e.errors()[0]
+        raise falcon.HTTPBadRequest(title=str(error['loc'][0]), description=error['msg'])
+
+def validate(
+    body: type[BaseModel] | None = None,
+    params: type[BaseModel] | Callable[[falcon.Request], type[BaseModel]] | None = None
+):
+    """
+    Creates a validation function, that may be used `falcon.before()`
+    the responder. The request body is parsed with the `body` schema
+    into `req.context.body`, and the query string is parsed with the
+    `params` schema into `req.context.params`, so the responder doesn't
+    need to look at `req.media` or `req.params` again.
+
+    Instead of a schema, `params` may be a function choosing
+    the schema for the query string of the given request.
+
+    The schemas are compiled by pydantic once, when they are defined.
+    """
+
+    def hook(req: falcon.Request, resp: falcon.Response, resource, route_params):
+        if body is not None:
+            req.context.body = parse(body, req.get_media(default_when_empty=None))
+        if params is not None:
+            schema = params if isinstance(params, type) else params(req)
+            req.context.params = parse(schema, req.params)
+
+    return hook
@@ -0,0 +1,153 @@
+import falcon
+from falcon import testing
+
+import time
+import threading
+
+from petboards.admission import (
+    AdmissionController, AdmissionMiddleware, upstream_wait, classify, default_max_in_flight,
+    READ, WRITE, LOGIN
+)
+from petboards.metrics import Metrics, MetricsResource
+
+class EmptyResource:
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.media = {}
+
+def test_upstream_wait():
+    now = time.time()
+
+    assert upstream_wait(None) == 0.0
+    assert upstream_wait('garbage') == 0.0
+    assert 1.9 < upstream_wait(f't={now - 2:.3f}') < 2.5
+    assert 1.9 < upstream_wait(str(int((now - 2) * 1e3))) < 2.5
+    assert 1.9 < upstream_wait(f't={int((now - 2) * 1e6)}') < 2.5
+    assert upstream_wait(f't={now + 1}') == 0.0
+
+def test_classify():
+    def request(method: str, path: str) -> falcon.Request:
+        return falcon.Request(testing.create_environ(path=path, method=method))
+
+    assert classify(request('GET', '/boards')) == READ
+    assert classify(request('POST', '/boards')) == WRITE
+    assert classify(request('POST', '/auth/login')) == LOGIN
+
+def wait_for(condition):
+    deadline = time.perf_counter() + 5
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+def test_priorities():
+    controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5)
+    assert controller.acquire(READ)
+
+    order = []
+    def request(request_class: int):
+        assert controller.acquire(request_class)
+        order.append(request_class)
+        controller.release()
+
+    threads = []
+    for request_class in (LOGIN, WRITE, READ):
+        threads.append(threading.Thread(target=request, args=(request_class,)))
+        threads[-1].start()
+        wait_for(lambda: controller.waiting == len(threads))
+
+    controller.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == [READ, WRITE, LOGIN]
+    assert controller.in_flight == 0
+
+def test_rejections():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    assert controller.acquire(READ)
+
+    # Timed out in the queue, or already waited too long upstream.
+    assert not controller.acquire(READ)
+    assert not controller.acquire(READ, waited=1.0)
+
+    # A read pushes a queued login out of the full queue, but not the other way round.
+    results = {}
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+    assert controller.acquire(READ)
+
+    thread = threading.Thread(target=lambda: results.update(login=controller.acquire(LOGIN)))
+    thread.start()
+    wait_for(lambda: controller.waiting == 1)
+
+    thread_2 = threading.Thread(target=lambda: results.update(read=controller.acquire(READ)))
+    thread_2.start()
+    thread.join()
+
+    assert not results['login']
+    assert not controller.acquire(WRITE)
+
+    controller.release()
+    thread_2.join()
+
+    assert results['read']
+    assert controller.rejected == [0, 1, 1]
+
+    # Even with free slots, for their clients may have given up.
+    controller = AdmissionController(max_in_flight=2, max_queue=1, queue_timeout=0.5)
+
+    assert not controller.acquire(READ, waited=1.0)
+    assert controller.acquire(READ, waited=0.1)
+    assert controller.in_flight == 1
+
+def test_resize():
+    assert (default_max_in_flight(4), default_max_in_flight(1), default_max_in_flight(1000)) == (3, 1, 999)
+    # Bounded by the connections to the database, e.g. with `gevent`.
+    assert (default_max_in_flight(1000, 9), default_max_in_flight(4, 9), default_max_in_flight(2, 0)) == (9, 3, 1)
+
+    controller = AdmissionController(max_in_flight=None, max_queue=1, queue_timeout=5)
+    for _ in range(100):
+        assert controller.acquire(READ)
+
+    controller.resize(101)
+    assert controller.acquire(READ)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(controller.acquire(WRITE)))
+    thread.start()
+    wait_for(lambda: controller.waiting == 1)
+
+    # A waiting request is admitted once the limit is raised.
+    controller.resize(102)
+    thread.join()
+
+    assert results == [True]
+    assert controller.in_flight == 102
+
+def test_middleware():
+    controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+    metrics = Metrics()
+    metrics.add_admission(controller)
+
+    app = falcon.App(middleware=[AdmissionMiddleware(controller, retry_after=3)])
+    app.add_route('/boards', EmptyResource())
+    app.add_route('/metrics', MetricsResource(metrics))
+    client = testing.TestClient(app)
+
+    assert client.simulate_get('/boards').status == falcon.HTTP_200
+    assert controller.in_flight == 0
+
+    assert controller.acquire(READ)
+    result = client.simulate_get('/boards')
+
+    assert result.status == falcon.HTTP_503
+    assert result.headers['retry-after'] == '3'
+    assert controller.in_flight == 1
+
+    # Monitoring works under load.
+    result = client.simulate_get('/metrics')
+    lines = result.text.splitlines()
+
+    assert 'petboards_admission_in_flight 1' in lines
+    assert 'petboards_admission_admitted_total{class="read"} 2' in lines
+    assert 'petboards_admission_rejected_total{class="read"} 1' in lines
+    assert 'petboards_admission_queue_seconds_count{class="read"} 2' in lines
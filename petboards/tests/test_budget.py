@@ -0,0 +1,127 @@
+import falcon
+from falcon import testing
+
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session
+
+import pytest
+
+from petboards.app import create_app
+from petboards.models import User, Board, Message
+from petboards.security import JWT
+from petboards.persistency import Base
+from petboards.budget import QueryBudget, QueryBudgetMiddleware, query_budget, normalize
+from petboards.user import UserStore
+from petboards.board import MessageStore, BoardStore
+from petboards.config import Settings
+
+@pytest.fixture
+def engine() -> sa.Engine:
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        user_1 = User('regular_user', 'password', 'Forum', 'Roamer')
+        user_2 = User('inspire', 'letmein', 'Igor', 'Voytenko')
+        boards = [Board(f'Доска #{i}', user_1) for i in range(4)]
+        messages = [
+            Message(f'Сообщение #{j}', user_1 if j % 2 == 0 else user_2, board)
+            for board in boards
+            for j in range(3)
+        ]
+
+        session.add_all([user_1, user_2, *boards, *messages])
+        session.commit()
+
+    yield engine
+
+    engine.dispose()
+
+@pytest.fixture
+def session(engine: sa.Engine) -> Session:
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+@pytest.fixture
+def budget(engine: sa.Engine, session: Session) -> QueryBudget:
+    budget = QueryBudget()
+    budget.instrument(engine, session)
+    return budget
+
+def test_normalize():
+    assert normalize('SELECT *\n  FROM t WHERE id IN (?, ?,?)') == 'SELECT * FROM t WHERE id IN (?)'
+    assert normalize('SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)') == 'SELECT * FROM t WHERE id IN (?)'
+    assert normalize('SELECT * FROM t WHERE a = ? AND b = ?') == 'SELECT * FROM t WHERE a = ? AND b = ?'
+
+def test_routes_within_budget(session: Session, budget: QueryBudget):
+    settings = Settings(moderators=['regular_user'])
+    app = create_app(UserStore(session), MessageStore(session), BoardStore(session), settings, query_budget=budget)
+    client = testing.TestClient(app)
+
+    token = JWT.create('regular_user')
+    user = session.query(User).filter_by(username='regular_user').one()
+    board = session.query(Board).order_by(Board.topic).first()
+    message = session.query(Message).filter_by(board_id=board.board_id, author_id=user.user_id).first()
+
+    requests = [
+        ('POST', '/auth/login', '', {'username': 'regular_user', 'password': 'password'}),
+        ('POST', '/auth/register', '', {'username': 'botai', 'password': '1234', 'first_name': 'Boris', 'last_name': 'Trushin'}),
+        ('GET', '/users', 'page=0&elements=10', {'token': token}),
+        ('GET', '/users', 'elements=10', {'token': token}),
+        ('GET', '/users', f'ids={user.user_id}', {'token': token}),
+        ('GET', f'/users/{user.user_id}', '', {'token': token}),
+        ('GET', '/boards', 'page=0&elements=10', {'token': token}),
+        ('GET', '/boards', 'elements=10', {'token': token}),
+        ('GET', '/boards', f'ids={board.board_id}', {'token': token}),
+        ('POST', '/boards', '', {'token': token, 'topic': 'Новая доска'}),
+        ('GET', f'/boards/{board.board_id}', '', {'token': token}),
+        ('GET', '/boards/digest', f'ids={board.board_id}&per_board=3', {'token': token}),
+        ('GET', f'/boards/{board.board_id}/messages', 'page=0&elements=10', {'token': token}),
+        ('POST', f'/boards/{board.board_id}/messages', '', {'token': token, 'text': 'Новое сообщение'}),
+        ('GET', f'/boards/{board.board_id}/messages', 'page=0&elements=10&expand=author', {'token': token}),
+        ('GET', f'/boards/{board.board_id}/messages/{message.message_id}', '', {'token': token}),
+        ('GET', f'/boards/{board.board_id}/messages/{message.message_id}', 'expand=author', {'token': token}),
+        ('PATCH', f'/boards/{board.board_id}/messages/{message.message_id}', '', {'token': token, 'text': 'Исправлено'}),
+        ('GET', f'/boards/{board.board_id}/changes', 'after=1', {'token': token}),
+        ('DELETE', f'/boards/{board.board_id}/messages/{message.message_id}', '', {'token': token}),
+        ('POST', f'/moderation/users/{user.user_id}/messages', '', {'token': token, 'action': 'hide'}),
+        ('POST', f'/moderation/boards/{board.board_id}/messages', '', {'token': token, 'action': 'delete'})
+    ]
+
+    for method, path, query_string, body in requests:
+        # Nothing is taken from the identity map,
+        # so that every request is at its worst.
+        session.expunge_all()
+
+        result = client.simulate_request(method, path, query_string=query_string, json=body)
+        assert result.status_code < 400, f'{method} {path}'
+
+        assert list(budget.reports) == [], '\n'.join(r.describe() for r in budget.reports)
+
+class LazyUsersResource:
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    @falcon.before(query_budget(2))
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.media = [len(user.boards) for user in self._session.query(User).order_by(User.username)]
+
+def test_n_plus_one_reported(session: Session, engine: sa.Engine):
+    budget = QueryBudget(repeat_threshold=2)
+    budget.instrument(engine, session)
+
+    app = falcon.App(middleware=[QueryBudgetMiddleware(budget, log=False)])
+    app.add_route('/lazy', LazyUsersResource(session))
+
+    result = testing.simulate_get(app, '/lazy')
+    assert result.json == [0, 4]
+
+    [report] = budget.reports
+    assert (report.method, report.route, report.statements, report.budget) == ('GET', '/lazy', 3, 2)
+    assert report.exceeded
+
+    [repeat] = report.repeats
+    assert (repeat.count, repeat.relationship) == (2, 'User.boards')
+    assert 'FROM boards' in repeat.statement
@@ -0,0 +1,184 @@
+import falcon
+from falcon import testing
+
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session
+
+import uuid
+import pytest
+from datetime import datetime, timedelta
+
+from petboards.app import create_app
+from petboards.models import User, Board, Message, Tombstone
+from petboards.security import JWT
+from petboards.persistency import Base, migrate
+from petboards.user import UserStore
+from petboards.board import MessageStore, BoardStore, assign_sequence_numbers
+from petboards.migrate import migrate_database
+
+@pytest.fixture
+def engine() -> sa.Engine:
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+@pytest.fixture
+def session(engine: sa.Engine) -> Session:
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+@pytest.fixture
+def board(session: Session) -> Board:
+    user = User('regular_user', 'password', 'Forum', 'Roamer')
+    board = Board('В интернете опять кто-то неправ!', user)
+    session.add_all([user, board])
+    session.commit()
+
+    return board
+
+@pytest.fixture
+def client(session: Session) -> testing.TestClient:
+    app = create_app(UserStore(session), MessageStore(session), BoardStore(session))
+    return testing.TestClient(app)
+
+def get_changes(client: testing.TestClient, board: Board, after: int, elements: int = 100):
+    return client.simulate_get(
+        f'/boards/{board.board_id}/changes',
+        params={'after': after, 'elements': elements},
+        json={'token': JWT.create('regular_user')}
+    )
+
+def post(client: testing.TestClient, board: Board, text: str) -> str:
+    result = client.simulate_post(
+        f'/boards/{board.board_id}/messages',
+        json={'token': JWT.create('regular_user'), 'text': text}
+    )
+    return result.headers['location']
+
+def test_changes(client: testing.TestClient, board: Board):
+    first = post(client, board, 'Возьми и разберись в Этом!!')
+    second = post(client, board, 'Плохая идея')
+
+    result = get_changes(client, board, 0)
+
+    assert result.status == falcon.HTTP_200
+    assert [(c['seq'], c['op'], c['message']['text']) for c in result.json['changes']] == [
+        (1, 'create', 'Возьми и разберись в Этом!!'),
+        (2, 'create', 'Плохая идея')
+    ]
+    assert (result.json['last_seq'], result.json['has_more']) == (2, False)
+
+    token = JWT.create('regular_user')
+    client.simulate_patch(first, json={'token': token, 'text': 'а хотя...'})
+    client.simulate_delete(second, json={'token': token})
+    third = post(client, board, 'и что такое?')
+
+    result = get_changes(client, board, 2)
+
+    changes = result.json['changes']
+    assert [(c['seq'], c['op']) for c in changes] == [(3, 'edit'), (4, 'delete'), (5, 'create')]
+    assert changes[0]['message']['text'] == 'а хотя...'
+    assert changes[1]['message_id'] == second.rsplit('/', 1)[1]
+    assert changes[2]['message']['message_id'] == third.rsplit('/', 1)[1]
+    assert result.json['last_seq'] == 5
+
+    # Paginated, and nothing after the latest change.
+    result = get_changes(client, board, 2, elements=2)
+
+    assert [c['seq'] for c in result.json['changes']] == [3, 4]
+    assert (result.json['last_seq'], result.json['has_more']) == (4, True)
+
+    result = get_changes(client, board, 5)
+
+    assert result.json == {'changes': [], 'last_seq': 5, 'has_more': False}
+
+    # A client starting over gets the messages there are.
+    result = get_changes(client, board, 0)
+
+    assert [(c['seq'], c['op']) for c in result.json['changes']] == [(3, 'create'), (5, 'create')]
+
+    assert get_changes(client, board, -1).status == falcon.HTTP_BAD_REQUEST
+
+    # Every page must carry a change to continue from.
+    assert get_changes(client, board, 0, elements=0).status == falcon.HTTP_BAD_REQUEST
+    assert get_changes(client, board, 0, elements=501).status == falcon.HTTP_BAD_REQUEST
+    result = get_changes(client, board, 0, elements=1)
+    assert [c['seq'] for c in result.json['changes']] == [3]
+    assert (result.json['last_seq'], result.json['has_more']) == (3, True)
+
+    result = client.simulate_get(f'/boards/{uuid.uuid4()}/changes', json={'token': JWT.create('regular_user')})
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+def test_compaction(client: testing.TestClient, session: Session, board: Board):
+    token = JWT.create('regular_user')
+    messages = [post(client, board, f'Сообщение #{i}') for i in range(3)]
+    for message in messages[:2]:
+        client.simulate_delete(message, json={'token': token})
+
+    # Tombstones of seq 4 and 5.
+    session.execute(sa.update(Tombstone).where(Tombstone.seq == 4).values(deleted_at=datetime.utcnow() - timedelta(days=60)))
+    session.commit()
+
+    store = MessageStore(session)
+    assert store.compact_tombstones(datetime.utcnow() - timedelta(days=30)) == 1
+    assert store.get_sequence(board.board_id) == (5, 4)
+
+    assert get_changes(client, board, 3).status == falcon.HTTP_GONE
+    assert [c['seq'] for c in get_changes(client, board, 4).json['changes']] == [5]
+    assert [c['seq'] for c in get_changes(client, board, 0).json['changes']] == [3]
+
+def test_legacy_messages_numbered(engine: sa.Engine, session: Session, board: Board):
+    user = session.query(User).one()
+    older = Message('Возьми и разберись в Этом!!', user, board)
+    newer = Message('Плохая идея', user, board)
+    newer.timestamp = older.timestamp + timedelta(seconds=1)
+    session.add_all([older, newer])
+    session.commit()
+
+    # Messages written without the store, numbered after the existing change.
+    MessageStore(session).save(Message('а хотя...', user, board))
+    with engine.begin() as conn:
+        conn.execute(sa.update(Message).where(Message.message_id.in_([older.message_id, newer.message_id])).values(seq=None, created_seq=None))
+        assign_sequence_numbers(conn)
+
+    session.expire_all()
+    assert (older.seq, newer.seq) == (2, 3)
+    assert session.get(Board, board.board_id).last_seq == 3
+
+def test_migrate_adds_columns(tmp_path):
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "db.sqlite3"}')
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE boards (board_id CHAR(32) PRIMARY KEY, topic VARCHAR(256) NOT NULL, created_at DATETIME NOT NULL, creator_id CHAR(32))')
+        conn.exec_driver_sql("INSERT INTO boards VALUES ('478708b31be343778e39b2adf004cd1d', 'topic', '2023-03-01 00:00:00.000000', NULL)")
+
+    migrate(engine, Base.metadata)
+
+    inspector = sa.inspect(engine)
+    assert {'last_seq', 'purged_seq'} <= {c['name'] for c in inspector.get_columns('boards')}
+    assert 'ix_messages_board_id_seq' in {i['name'] for i in inspector.get_indexes('messages')}
+    with engine.connect() as conn:
+        assert conn.execute(sa.select(Board.last_seq)).scalar_one() == 0
+
+    engine.dispose()
+
+def test_migrate_database(tmp_path):
+    path = str(tmp_path / 'db.sqlite3')
+    engine = sa.create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE boards (board_id CHAR(32) PRIMARY KEY, topic VARCHAR(256) NOT NULL, created_at DATETIME NOT NULL, creator_id CHAR(32))')
+    engine.dispose()
+
+    # Running it again changes nothing.
+    migrate_database(path)
+    migrate_database(path)
+
+    engine = sa.create_engine(f'sqlite:///{path}')
+    inspector = sa.inspect(engine)
+    assert 'last_seq' in {c['name'] for c in inspector.get_columns('boards')}
+    assert 'message_tombstones' in inspector.get_table_names()
+
+    engine.dispose()
@@ -0,0 +1,109 @@
+import falcon
+from falcon import testing
+
+import time
+import threading
+
+from petboards.coalescing import SingleFlight, coalesced
+
+def wait_for(condition):
+    deadline = time.perf_counter() + 5
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+def test_single_flight():
+    flights = SingleFlight()
+    release = threading.Event()
+    computed = []
+
+    def compute():
+        computed.append(1)
+        release.wait()
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('key', compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+
+    wait_for(lambda: flights.hits == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(computed) == 1
+    assert len(results) == 5 and all(result is results[0] for result in results)
+
+    # Nothing is kept once the computation ends.
+    assert flights.do('key', lambda: 'new') == 'new'
+
+def test_errors_shared():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait()
+        raise falcon.HTTPNotFound
+
+    errors = []
+    def call():
+        try:
+            flights.do('key', compute)
+        except falcon.HTTPNotFound as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+
+    wait_for(lambda: flights.hits == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+
+class SlowResource:
+
+    def __init__(self, flights: SingleFlight):
+        self._flights = flights
+        self.release = threading.Event()
+        self.computed = []
+
+    @coalesced
+    def on_get(self, req: falcon.Request, resp: falcon.Response, item_id: int):
+        self.computed.append(item_id)
+        self.release.wait()
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+        resp.media = {'item_id': item_id, 'computed': len(self.computed)}
+
+def test_coalesced_responder():
+    flights = SingleFlight()
+    resource = SlowResource(flights)
+
+    app = falcon.App()
+    app.add_route('/items/{item_id:int}', resource)
+    client = testing.TestClient(app)
+
+    results = []
+    def get(item_id: int):
+        results.append(client.simulate_get(f'/items/{item_id}'))
+
+    threads = [threading.Thread(target=get, args=(item_id,)) for item_id in (1, 1, 1, 2)]
+    for thread in threads:
+        thread.start()
+
+    wait_for(lambda: flights.hits == 2 and flights.misses == 2)
+    resource.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(resource.computed) == [1, 2]
+    assert all(result.status == falcon.HTTP_200 for result in results)
+    assert sorted(result.json['item_id'] for result in results) == [1, 1, 1, 2]
+
+    # All requests for the same item got the one computed response.
+    assert len({result.text for result in results if result.json['item_id'] == 1}) == 1
@@ -0,0 +1,59 @@
+import falcon
+from falcon import testing
+
+import gzip
+import zlib
+import pytest
+
+from petboards.compression import CompressionMiddleware, negotiate
+
+class PageResource:
+    
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.content_type = falcon.MEDIA_JSON
+        resp.media = [{'text': 'Возьми и разберись в Этом!!'}] * int(req.params['elements'])
+
+@pytest.fixture
+def middleware() -> CompressionMiddleware:
+    return CompressionMiddleware(min_size=100, cache_size=4)
+
+@pytest.fixture
+def client(middleware: CompressionMiddleware) -> testing.TestClient:
+    app = falcon.App(middleware=[middleware])
+    app.add_route('/page', PageResource())
+    return testing.TestClient(app)
+
+def test_negotiation():
+    assert negotiate(None) is None
+    assert negotiate('identity') is None
+    assert negotiate('deflate, gzip') == 'gzip'
+    assert negotiate('gzip;q=0.5, deflate') == 'deflate'
+    assert negotiate('gzip;q=0, *', codings=('gzip', 'deflate')) == 'deflate'
+    assert negotiate('*;q=0') is None
+
+def test_gzip(client: testing.TestClient):
+    result = client.simulate_get('/page', params={'elements': 50}, headers={'Accept-Encoding': 'gzip'})
+
+    assert result.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in result.headers['vary']
+    assert gzip.decompress(result.content) == testing.simulate_get(
+        client.app, '/page', params={'elements': 50}
+    ).content
+
+def test_deflate(client: testing.TestClient):
+    result = client.simulate_get('/page', params={'elements': 50}, headers={'Accept-Encoding': 'deflate'})
+
+    assert result.headers['content-encoding'] == 'deflate'
+    assert zlib.decompress(result.content).startswith(b'[{"text":')
+
+def test_small_body_not_compressed(client: testing.TestClient):
+    result = client.simulate_get('/page', params={'elements': 1}, headers={'Accept-Encoding': 'gzip'})
+
+    assert 'content-encoding' not in result.headers
+    assert result.json == [{'text': 'Возьми и разберись в Этом!!'}]
+
+def test_compressed_body_cache(client: testing.TestClient, middleware: CompressionMiddleware):
+    for _ in range(3):
+        client.simulate_get('/page', params={'elements': 50}, headers={'Accept-Encoding': 'gzip'})
+
+    assert (middleware.hits, middleware.misses) == (2, 1)
@@ -298,3 +298,435 @@ def test_delete_someones_message(client: testing.TestClient):
 
     assert result.status == falcon.HTTP_200
     assert result.json['text'] == 'Возьми и разберись в Этом!!'
+
+def test_fetch_messages_page(client: testing.TestClient):
+    token = JWT.create('regular_user')
+
+    known_board_id = '478708b3-1be3-4377-8e39-b2adf004cd1d'
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={
+            'page': 1,
+            'elements': 2
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert len(result.json) == 1
+    assert result.json[0]['text'] == 'а хотя...'
+    assert result.json[0]['board_id'] == known_board_id
+
+    result = client.simulate_get(
+        f'/boards/{uuid.uuid4()}/messages',
+        params={
+            'page': 0,
+            'elements': 2
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+def test_all_boards_first_message(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get(
+        '/boards',
+        params={
+            'page': 0,
+            'elements': 10
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert result.json[0]['first_message']['message_id'] == 'c2df51f6-57cc-4838-9318-5980d4fdab9a'
+    assert result.json[0]['created_by']['username'] == 'botai'
+    assert result.json[1]['first_message'] is None
+
+def test_all_boards_sparse_fields(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get(
+        '/boards',
+        params={
+            'page': 0,
+            'elements': 10,
+            'fields': 'board_id,topic'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert result.json[0] == {
+        'board_id': '478708b3-1be3-4377-8e39-b2adf004cd1d',
+        'topic': 'В интернете опять кто-то неправ!'
+    }
+
+    result = client.simulate_get(
+        '/boards',
+        params={
+            'page': 0,
+            'elements': 10,
+            'fields': 'board_id,password'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_messages_sparse_fields(client: testing.TestClient):
+    token = JWT.create('regular_user')
+
+    known_board_id = '478708b3-1be3-4377-8e39-b2adf004cd1d'
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={
+            'page': 0,
+            'elements': 10,
+            'fields': 'text'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert result.json[1] == {'text': 'Плохая идея'}
+
+def test_boards_cursor_pagination(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    topics = []
+    params = {'elements': 2, 'fields': 'topic'}
+    while True:
+        result = client.simulate_get('/boards', params=params, json={'token': token})
+
+        assert result.status == falcon.HTTP_200
+        topics += [b['topic'] for b in result.json['items']]
+
+        if result.json['next_cursor'] is None:
+            break
+        params['cursor'] = result.json['next_cursor']
+
+    assert topics == [
+        'В интернете опять кто-то неправ!',
+        'хочу обсудить очень важный вопрос....',
+        'появился другой вопрос'
+    ]
+
+def test_users_cursor_pagination(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get('/users', params={'elements': 2}, json={'token': token})
+
+    assert result.status == falcon.HTTP_200
+    assert [u['username'] for u in result.json['items']] == ['botai', 'inspire']
+
+    result = client.simulate_get(
+        '/users',
+        params={'elements': 2, 'cursor': result.json['next_cursor']},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert [u['username'] for u in result.json['items']] == ['regular_user']
+    assert result.json['next_cursor'] is None
+
+    result = client.simulate_get('/users', params={'elements': 2, 'cursor': 'garbage'}, json={'token': token})
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_boards_multi_get(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    known_board_id = '478708b3-1be3-4377-8e39-b2adf004cd1d'
+
+    result = client.simulate_get(
+        '/boards',
+        params={
+            'ids': f'{uuid.uuid4()},{known_board_id}',
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert len(result.json) == 1
+    assert result.json[0]['board_id'] == known_board_id
+    assert result.json[0]['topic'] == 'В интернете опять кто-то неправ!'
+    assert 'first_message' not in result.json[0]
+
+    result = client.simulate_get('/boards', params={'ids': 'not-a-uuid'}, json={'token': token})
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_users_multi_get(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get('/users', params={'elements': 3}, json={'token': token})
+    user_ids = [u['user_id'] for u in result.json['items']]
+
+    result = client.simulate_get(
+        '/users',
+        params={
+            'ids': ','.join(reversed(user_ids)),
+            'fields': 'user_id,username'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert result.json == [
+        {'user_id': user_ids[2], 'username': 'regular_user'},
+        {'user_id': user_ids[1], 'username': 'inspire'},
+        {'user_id': user_ids[0], 'username': 'botai'}
+    ]
+
+def test_messages_by_author(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get('/users', params={'elements': 10, 'fields': 'user_id,username'}, json={'token': token})
+    user_ids = {u['username']: u['user_id'] for u in result.json['items']}
+
+    texts = []
+    params = {'elements': 1, 'fields': 'text'}
+    while True:
+        result = client.simulate_get(f'/users/{user_ids["regular_user"]}/messages', params=params, json={'token': token})
+
+        assert result.status == falcon.HTTP_200
+        texts += [m['text'] for m in result.json['items']]
+
+        if result.json['next_cursor'] is None:
+            break
+        params['cursor'] = result.json['next_cursor']
+
+    assert texts == ['Плохая идея', 'а хотя...']
+
+    result = client.simulate_get(f'/users/{user_ids["botai"]}/messages', params={'elements': 10}, json={'token': token})
+
+    assert result.status == falcon.HTTP_200
+    assert [m['text'] for m in result.json['items']] == ['и что такое?']
+    assert set(result.json['items'][0]) == {'message_id', 'text', 'author_id', 'board_id', 'timestamp', 'last_edited'}
+    assert result.json['next_cursor'] is None
+
+    result = client.simulate_get(f'/users/{uuid.uuid4()}/messages', params={'elements': 10}, json={'token': token})
+
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+    result = client.simulate_get(
+        f'/users/{user_ids["botai"]}/messages',
+        params={'elements': 10, 'page': 0},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_messages_by_author_use_index():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        store = MessageStore(session)
+        user = User('inspire', 'letmein', 'Igor', 'Voytenko')
+        session.add(user)
+        session.commit()
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        store.get_by_author_serialized(user.user_id, ('2023-03-01 00:00:00.000000', uuid.uuid4().hex), 10)
+        sa.event.remove(engine, 'before_cursor_execute', record)
+
+    with engine.connect() as conn:
+        statement, parameters = statements[-1]
+        plan = ' '.join(row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+
+    assert 'ix_messages_author_id_timestamp_message_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+    engine.dispose()
+
+def test_messages_expand_author(client: testing.TestClient):
+    token = JWT.create('regular_user')
+
+    known_board_id = '478708b3-1be3-4377-8e39-b2adf004cd1d'
+    known_message_id = 'c2df51f6-57cc-4838-9318-5980d4fdab9a'
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={'page': 0, 'elements': 10, 'expand': 'author'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert [m['text'] for m in result.json['items']] == ['Возьми и разберись в Этом!!', 'Плохая идея', 'а хотя...']
+    assert {m['author_id'] for m in result.json['items']} == set(result.json['authors'])
+    assert sorted(a['username'] for a in result.json['authors'].values()) == ['inspire', 'regular_user']
+    assert result.json['authors'][result.json['items'][0]['author_id']] == {
+        'username': 'inspire', 'first_name': 'Igor', 'last_name': 'Voytenko'
+    }
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={'page': 0, 'elements': 10, 'expand': 'author', 'fields': 'text,author_id'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert set(result.json['items'][1]) == {'text', 'author_id'}
+    assert len(result.json['authors']) == 2
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={'page': 0, 'elements': 10, 'expand': 'author', 'fields': 'text'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages',
+        params={'page': 0, 'elements': 10, 'expand': 'board'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+    result = client.simulate_get('/users', params={'elements': 10, 'fields': 'user_id,username'}, json={'token': token})
+    user_ids = {u['username']: u['user_id'] for u in result.json['items']}
+
+    result = client.simulate_get(
+        f'/users/{user_ids["regular_user"]}/messages',
+        params={'elements': 10, 'expand': 'author'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert len(result.json['items']) == 2
+    assert [a['username'] for a in result.json['authors'].values()] == ['regular_user']
+
+    result = client.simulate_get(
+        f'/boards/{known_board_id}/messages/{known_message_id}',
+        params={'expand': 'author'},
+        json={'token': token}
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert result.json['text'] == 'Возьми и разберись в Этом!!'
+    assert result.json['author'] == {'username': 'inspire', 'first_name': 'Igor', 'last_name': 'Voytenko'}
+
+    result = client.simulate_get(f'/boards/{known_board_id}/messages/{known_message_id}', json={'token': token})
+
+    assert result.status == falcon.HTTP_200
+    assert 'author' not in result.json
+
+def test_messages_expand_author_one_query():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        store = MessageStore(session)
+        user = User('inspire', 'letmein', 'Igor', 'Voytenko')
+        board = Board('В интернете опять кто-то неправ!', user)
+        session.add_all([user, board, Message('Привет', user, board), Message('Ещё раз', user, board)])
+        session.commit()
+        board_id, user_id = board.board_id, user.user_id
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        authors = {}
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        messages = store.get_page_serialized(board_id, 0, 10, authors=authors)
+        sa.event.remove(engine, 'before_cursor_execute', record)
+
+        assert [m['text'] for m in messages] == ['Привет', 'Ещё раз']
+        assert authors == {str(user_id): {'username': 'inspire', 'first_name': 'Igor', 'last_name': 'Voytenko'}}
+
+    # The board is looked up, then its messages are read with their authors.
+    assert len(statements) == 2
+    assert 'JOIN users' in statements[1]
+
+    engine.dispose()
+
+def test_boards_digest(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    known_board_id = '478708b3-1be3-4377-8e39-b2adf004cd1d'
+    result = client.simulate_get('/boards', params={'elements': 10, 'fields': 'board_id,topic'}, json={'token': token})
+    board_ids = {b['topic']: b['board_id'] for b in result.json['items']}
+
+    result = client.simulate_get(
+        '/boards/digest',
+        params={
+            'ids': f'{board_ids["появился другой вопрос"]},{uuid.uuid4()},{known_board_id},{board_ids["хочу обсудить очень важный вопрос...."]}',
+            'per_board': 2
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert [(b['topic'], [m['text'] for m in b['messages']]) for b in result.json] == [
+        ('появился другой вопрос', ['и что такое?']),
+        ('В интернете опять кто-то неправ!', ['а хотя...', 'Плохая идея']),
+        ('хочу обсудить очень важный вопрос....', [])
+    ]
+    assert set(result.json[1]['messages'][0]) == {'message_id', 'text', 'author_id', 'board_id', 'timestamp', 'last_edited'}
+
+    result = client.simulate_get('/boards/digest', params={'ids': known_board_id}, json={'token': token})
+
+    assert [m['text'] for m in result.json[0]['messages']] == ['а хотя...', 'Плохая идея', 'Возьми и разберись в Этом!!']
+
+    result = client.simulate_get('/boards/digest', params={'ids': known_board_id, 'per_board': 21}, json={'token': token})
+
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_boards_digest_use_index():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        store = BoardStore(session)
+        user = User('inspire', 'letmein', 'Igor', 'Voytenko')
+        board = Board('В интернете опять кто-то неправ!', user)
+        session.add_all([user, board])
+        session.commit()
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        store.get_digest_serialized([board.board_id, uuid.uuid4()], 3)
+        sa.event.remove(engine, 'before_cursor_execute', record)
+
+    with engine.connect() as conn:
+        statement, parameters = statements[-1]
+        plan = ' '.join(row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+
+    assert 'ix_messages_board_id_timestamp' in plan
+    assert 'SCAN messages' not in plan
+
+    engine.dispose()
@@ -0,0 +1,122 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+import os
+import uuid
+import multiprocessing
+import pytest
+
+from petboards.generations import GenerationTable, GenerationalCache
+from petboards.models import User, Board, Message
+from petboards.persistency import Base
+from petboards.user import UserStore
+from petboards.board import BoardStore, MessageStore
+
+def test_shared_table(tmp_path):
+    path = str(tmp_path / 'generations')
+    first, second = GenerationTable(path, 1024), GenerationTable(path, 1024)
+    board_id = uuid.uuid4()
+
+    assert first.epoch == second.epoch != 0
+    assert first.get('board', board_id) == 0
+    second.bump('board', board_id)
+    second.bump('board', board_id)
+    assert first.get('board', board_id) == 2
+    assert first.get('user', board_id) == 0
+
+    # Opening the table again doesn't reset it.
+    assert GenerationTable(path, 1024).get('board', board_id) == 2
+    assert GenerationTable(path, 1024).epoch == first.epoch
+    assert GenerationTable(str(tmp_path / 'other'), 1024).epoch != first.epoch
+
+def _bump_many(path: str, key: uuid.UUID, times: int):
+    table = GenerationTable(path, 1024)
+    for _ in range(times):
+        table.bump('board', key)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_no_lost_bumps_across_processes(tmp_path):
+    path = str(tmp_path / 'generations')
+    key = uuid.uuid4()
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_bump_many, args=(path, key, 500)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert GenerationTable(path, 1024).get('board', key) == 2000
+
+def test_cache_invalidation(tmp_path):
+    table = GenerationTable(str(tmp_path / 'generations'), 1024)
+    cache = GenerationalCache(table, 10)
+    board_id = uuid.uuid4()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    depends = (('board', board_id),)
+    assert cache.get('page', depends, load) == 1
+    assert cache.get('page', depends, load) == 1
+
+    table.bump('board', board_id)
+    assert cache.get('page', depends, load) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+@pytest.fixture
+def engine(tmp_path) -> sa.Engine:
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "db.sqlite3"}')
+    Base.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+def make_worker(engine: sa.Engine, path: str) -> tuple[Session, UserStore, BoardStore, MessageStore]:
+    # Every worker has its own session and cache, but they share the table.
+    session = Session(engine, expire_on_commit=False)
+    cache = GenerationalCache(GenerationTable(path, 1024), 100)
+    return session, UserStore(session, cache=cache), BoardStore(session, cache), MessageStore(session, cache)
+
+def test_writes_seen_by_other_workers(engine: sa.Engine, tmp_path):
+    path = str(tmp_path / 'generations')
+    session_1, users_1, boards_1, messages_1 = make_worker(engine, path)
+    session_2, users_2, boards_2, messages_2 = make_worker(engine, path)
+
+    user = User('regular_user', 'password', 'Forum', 'Roamer')
+    board = Board('В интернете опять кто-то неправ!', user)
+    session_1.add_all([user, board])
+    session_1.commit()
+
+    assert boards_1.get_serialized(board.board_id)['first_message'] is None
+    assert messages_1.get_page_serialized(board.board_id, 0, 10) == []
+    assert users_1.get_serialized(user.user_id)['boards'][0]['first_message'] is None
+
+    # Cached: nothing is read from the database.
+    executed = []
+    sa.event.listen(engine, 'before_cursor_execute', lambda *args: executed.append(args[2]))
+    boards_1.get_serialized(board.board_id)
+    messages_1.get_page_serialized(board.board_id, 0, 10)
+    users_1.get_serialized(user.user_id)
+    assert executed == []
+
+    author = session_2.get(User, user.user_id)
+    message = Message('Возьми и разберись в Этом!!', author, session_2.get(Board, board.board_id))
+    messages_2.save(message)
+
+    assert boards_1.get_serialized(board.board_id)['first_message']['text'] == 'Возьми и разберись в Этом!!'
+    assert [m['text'] for m in messages_1.get_page_serialized(board.board_id, 0, 10)] == ['Возьми и разберись в Этом!!']
+    assert users_1.get_serialized(user.user_id)['boards'][0]['first_message']['text'] == 'Возьми и разберись в Этом!!'
+
+    boards_2.save(Board('появился другой вопрос', author))
+    assert len(users_1.get_serialized(user.user_id)['boards']) == 2
+
+    author.first_name = 'Igor'
+    users_2.save(author)
+    assert boards_1.get_serialized(board.board_id)['created_by']['first_name'] == 'Igor'
+
+    session_1.close()
+    session_2.close()
@@ -0,0 +1,114 @@
+import falcon
+from falcon import testing
+
+import os
+import sys
+import time
+import socket
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+
+import pytest
+import greenlet
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from petboards.gunicorn_config import default_workers, default_threads, cpu_count, worker_concurrency
+from petboards.persistency import SessionMiddleware
+
+def test_worker_sizing():
+    assert cpu_count() >= 1
+
+    assert (default_workers('sync', 4), default_threads('sync', 4)) == (9, 1)
+    assert (default_workers('gthread', 4), default_threads('gthread', 4)) == (4, 4)
+    assert (default_workers('gevent', 4), default_threads('gevent', 4)) == (4, 1)
+
+    assert worker_concurrency('gthread', 4, 1000) == 4
+    assert worker_concurrency('gevent', 1, 1000) == 1000
+    assert worker_concurrency('sync', 1, 1000) == 1
+
+class SessionResource:
+
+    def __init__(self, session: scoped_session):
+        self._session = session
+        self.seen = []
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        self.seen.append(self._session())
+        resp.media = {}
+
+def test_session_per_request_and_thread():
+    session = scoped_session(sessionmaker(sa.create_engine('sqlite://')), scopefunc=greenlet.getcurrent)
+    resource = SessionResource(session)
+
+    app = falcon.App(middleware=[SessionMiddleware(session)])
+    app.add_route('/session', resource)
+    client = testing.TestClient(app)
+
+    client.simulate_get('/session')
+    client.simulate_get('/session')
+
+    thread = threading.Thread(target=lambda: resource.seen.append(session()))
+    thread.start()
+    thread.join()
+
+    # Every request gets a new session, and so does every thread.
+    assert len({id(s) for s in resource.seen}) == 3
+    assert not session.registry.has()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.mark.parametrize('preload', ['true', 'false'])
+def test_gunicorn_workers(tmp_path, preload: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PETBOARDS_SECRET='secret',
+        PETBOARDS_SERVER_BIND=f'127.0.0.1:{port}',
+        PETBOARDS_SERVER_WORKERS='2',
+        PETBOARDS_SERVER_PRELOAD=preload,
+        PETBOARDS_DATABASE_PATH=str(tmp_path / 'sqlite3.db'),
+        PETBOARDS_GENERATIONS_PATH=str(tmp_path / 'generations'),
+        PETBOARDS_SNAPSHOT_DIRECTORY=str(tmp_path / 'snapshots')
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'python:petboards.gunicorn_config', 'petboards.start:app'],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    def get(path: str, headers: dict = {}):
+        return urllib.request.urlopen(urllib.request.Request(f'http://127.0.0.1:{port}{path}', headers=headers), timeout=5)
+
+    try:
+        deadline = time.perf_counter() + 30
+        while True:
+            assert server.poll() is None
+            try:
+                lines = get('/metrics').read().decode().splitlines()
+                if any(line.startswith('petboards_admission_max_in_flight ') for line in lines):
+                    break
+            except OSError:
+                pass
+
+            assert time.perf_counter() < deadline
+            time.sleep(0.1)
+
+        # One less than the threads of the worker, which it can reach.
+        assert f'petboards_admission_max_in_flight {default_threads("gthread", cpu_count()) - 1}' in lines
+
+        # A request, that has waited too long in the proxy, is rejected at once.
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get('/boards?page=0&elements=10', {'X-Request-Start': f't={time.time() - 60:.3f}'})
+
+        assert error.value.code == 503
+    finally:
+        server.terminate()
+        server.wait(10)
@@ -0,0 +1,106 @@
+import falcon
+from falcon import testing
+
+import io
+import json
+import logging
+import logging.handlers
+import pytest
+
+import sqlalchemy as sa
+
+from petboards.logs import setup_logging, RequestLoggingMiddleware, SQLLogger, REQUEST_ID_HEADER
+
+class EchoResource:
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        logging.getLogger('petboards.test').warning('handling')
+        resp.media = {}
+
+@pytest.fixture
+def output():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+
+    stream = io.StringIO()
+    listener = setup_logging('INFO', 'json', stream)
+
+    def read() -> list[dict]:
+        # Stopping the listener writes out everything queued.
+        listener.stop()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield read
+
+    listener.stop()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+@pytest.fixture
+def client() -> testing.TestClient:
+    app = falcon.App(middleware=[RequestLoggingMiddleware()])
+    app.add_route('/echo', EchoResource())
+    return testing.TestClient(app)
+
+def test_correlation_id(client: testing.TestClient, output):
+    result = client.simulate_get('/echo')
+    request_id = result.headers[REQUEST_ID_HEADER]
+
+    given = client.simulate_get('/echo', headers={REQUEST_ID_HEADER: 'abc-123'})
+    assert given.headers[REQUEST_ID_HEADER] == 'abc-123'
+
+    # Malformed IDs are replaced.
+    malformed = client.simulate_get('/echo', headers={REQUEST_ID_HEADER: 'a b\nc'})
+    assert malformed.headers[REQUEST_ID_HEADER] != 'a b\nc'
+
+    records = output()
+    handling = [r for r in records if r['message'] == 'handling']
+    assert [r['correlation_id'] for r in handling][:2] == [request_id, 'abc-123']
+
+def test_access_log(client: testing.TestClient, output):
+    result = client.simulate_get('/echo')
+
+    [access] = [r for r in output() if r['logger'] == 'petboards.access']
+    assert access['correlation_id'] == result.headers[REQUEST_ID_HEADER]
+    assert (access['method'], access['path'], access['route'], access['status']) == ('GET', '/echo', '/echo', 200)
+    assert access['duration_ms'] >= 0
+
+@pytest.mark.parametrize('mode, kwargs, logged', [
+    ('off', {}, 0),
+    ('slow', {'slow_threshold': 0.0}, 2),
+    ('slow', {'slow_threshold': 60.0}, 0),
+    ('sampled', {'sample_rate': 0.0}, 0),
+    ('all', {}, 2)
+])
+def test_sql_log(output, mode: str, kwargs: dict, logged: int):
+    engine = sa.create_engine('sqlite://')
+    SQLLogger(mode, **kwargs).instrument(engine)
+
+    with engine.connect() as conn:
+        conn.execute(sa.text('SELECT 1'))
+        conn.execute(sa.text('SELECT 2'))
+
+    records = [r for r in output() if r['logger'] == 'petboards.sql']
+    assert len(records) == logged
+    if logged > 0:
+        assert records[0]['message'] == 'SELECT 1'
+        assert 'duration_ms' in records[0]
+
+def test_sql_log_failed_statement(output, monkeypatch):
+    engine = sa.create_engine('sqlite://')
+    SQLLogger('slow', slow_threshold=1.5).instrument(engine)
+
+    clock = iter(range(100))
+    monkeypatch.setattr('petboards.metrics.time.perf_counter', lambda: next(clock))
+
+    with engine.connect() as conn:
+        with pytest.raises(sa.exc.OperationalError):
+            conn.execute(sa.text('SELECT * FROM nowhere'))
+        conn.execute(sa.text('SELECT 1'))
+
+        assert not any(key.startswith('petboards') for key in conn.info)
+
+    monkeypatch.undo()
+
+    # The statement, that succeeded, took one tick.
+    assert [r for r in output() if r['logger'] == 'petboards.sql'] == []
@@ -0,0 +1,44 @@
+import json
+import pytest
+
+from petboards.media import JSONHandler, Fragment, FragmentCache, orjson
+
+LIBRARIES = ['json'] + (['orjson'] if orjson is not None else [])
+
+@pytest.mark.parametrize('library', LIBRARIES)
+def test_fragments_spliced(library: str):
+    handler = JSONHandler(library)
+
+    media = {
+        'items': [Fragment('{"text":"Возьми и разберись"}'.encode('utf-8')), {'text': 'Плохая идея'}],
+        'next': None
+    }
+
+    assert json.loads(handler.dumps(media)) == {
+        'items': [{'text': 'Возьми и разберись'}, {'text': 'Плохая идея'}],
+        'next': None
+    }
+
+@pytest.mark.parametrize('library', LIBRARIES)
+def test_unserializable_media(library: str):
+    handler = JSONHandler(library)
+
+    with pytest.raises(TypeError):
+        handler.dumps([Fragment(b'1'), object()])
+
+def test_fragment_cache():
+    handler = JSONHandler('json')
+    cache = FragmentCache(handler, 2)
+
+    def message(text: str) -> dict:
+        return {'text': text}
+
+    assert cache.get('a', message, 'a') == handler.fragment({'text': 'a'})
+    cache.get('b', message, 'b')
+    cache.get('a', message, 'changed')
+
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # 'b' is the least recently used one, so it is evicted.
+    cache.get('c', message, 'c')
+    assert cache.get('b', message, 'new') == handler.fragment({'text': 'new'})
@@ -0,0 +1,98 @@
+import falcon
+from falcon import testing
+
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session
+
+import pytest
+
+from petboards.app import create_app
+from petboards.models import User, Board, Message
+from petboards.security import JWT
+from petboards.persistency import Base
+from petboards.metrics import Metrics, Histogram
+from petboards.user import UserStore
+from petboards.board import MessageStore, BoardStore
+
+@pytest.fixture
+def metrics() -> Metrics:
+    return Metrics()
+
+@pytest.fixture
+def client(metrics: Metrics) -> testing.TestClient:
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    metrics.instrument(engine)
+
+    session = Session(engine, expire_on_commit=False)
+
+    user = User('regular_user', 'password', 'Forum', 'Roamer')
+    board = Board('В интернете опять кто-то неправ!', user)
+    message = Message('Возьми и разберись в Этом!!', user, board)
+    session.add_all([user, board, message])
+    session.commit()
+
+    app = create_app(UserStore(session), MessageStore(session), BoardStore(session), metrics=metrics)
+    yield testing.TestClient(app)
+
+    session.close()
+    engine.dispose()
+
+def test_histogram():
+    histogram = Histogram((1, 5))
+    for value in (0, 1, 3, 7):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [('1', 2), ('5', 3), ('+Inf', 4)]
+    assert (histogram.sum, histogram.count) == (11, 4)
+
+def test_failed_statement_timing(monkeypatch):
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    metrics = Metrics()
+    metrics.instrument(engine)
+
+    clock = iter(range(100))
+    monkeypatch.setattr('petboards.metrics.time.perf_counter', lambda: next(clock))
+
+    with engine.connect() as conn:
+        with pytest.raises(sa.exc.OperationalError):
+            conn.exec_driver_sql('SELECT * FROM nowhere')
+        conn.exec_driver_sql('SELECT 1')
+
+        # The failed statement left no start time to be paired with a later one.
+        assert not any(key.startswith('petboards') for key in conn.info)
+
+    assert (metrics.sql_statements, metrics.sql_seconds) == (1, 1)
+
+    engine.dispose()
+
+def test_metrics_endpoint(client: testing.TestClient, metrics: Metrics):
+    token = JWT.create('regular_user')
+
+    for _ in range(2):
+        result = client.simulate_get('/boards', params={'page': 0, 'elements': 10}, json={'token': token})
+        assert result.status == falcon.HTTP_200
+    client.simulate_get('/boards', params={'page': -1, 'elements': 10}, json={'token': token})
+    client.simulate_get('/nowhere')
+
+    result = client.simulate_get('/metrics')
+
+    assert result.status == falcon.HTTP_200
+    assert result.headers['content-type'].startswith('text/plain')
+
+    lines = result.text.splitlines()
+    assert 'petboards_requests_total{method="GET",route="/boards",status="200"} 2' in lines
+    assert 'petboards_requests_total{method="GET",route="/boards",status="400"} 1' in lines
+    assert 'petboards_requests_total{method="GET",route="unmatched",status="404"} 1' in lines
+    assert 'petboards_request_duration_seconds_count{method="GET",route="/boards"} 3' in lines
+    assert 'petboards_request_duration_seconds_bucket{method="GET",route="/boards",le="+Inf"} 3' in lines
+
+    # The failed request doesn't reach the database, the others do.
+    assert 'petboards_request_sql_statements_bucket{method="GET",route="/boards",le="0"} 1' in lines
+    assert 'petboards_request_sql_statements_count{method="GET",route="/boards"} 3' in lines
+
+    # The scrape itself is in flight.
+    assert 'petboards_requests_in_flight 1' in lines
+    assert 'petboards_cache_hits_total{cache="fragments"} 0' in lines
+    assert metrics.sql_statements > 0
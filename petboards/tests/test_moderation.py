@@ -0,0 +1,190 @@
+import falcon
+from falcon import testing
+
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session
+
+import uuid
+import pytest
+
+from petboards.app import create_app
+from petboards.models import User, Board, Message, Tombstone
+from petboards.security import JWT
+from petboards.persistency import Base
+from petboards.config import Settings
+from petboards.user import UserStore
+from petboards.board import MessageStore, BoardStore
+from petboards.generations import GenerationTable, GenerationalCache
+
+@pytest.fixture
+def engine() -> sa.Engine:
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+@pytest.fixture
+def session(engine: sa.Engine) -> Session:
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+@pytest.fixture
+def cache(tmp_path) -> GenerationalCache:
+    generations = GenerationTable(str(tmp_path / 'generations'), 1024)
+    yield GenerationalCache(generations, 100)
+    generations.close()
+
+@pytest.fixture
+def client(session: Session, cache: GenerationalCache) -> testing.TestClient:
+    moderator = User('moderator', 'password', 'Mod', 'Erator')
+    spammer = User('spammer', 'password', 'Spam', 'Bot')
+    regular = User('regular_user', 'password', 'Forum', 'Roamer')
+    session.add_all([moderator, spammer, regular])
+    session.commit()
+
+    app = create_app(
+        UserStore(session, cache=cache),
+        MessageStore(session, cache),
+        BoardStore(session, cache),
+        Settings(moderators=['moderator'])
+    )
+    client = testing.TestClient(app)
+
+    token = JWT.create('regular_user')
+    for i in range(2):
+        result = client.simulate_post('/boards', json={'token': token, 'topic': f'Доска #{i}'})
+        board_id = result.headers['location'].rsplit('/', 1)[1]
+        for username in ('regular_user', 'spammer', 'spammer', 'regular_user'):
+            client.simulate_post(
+                f'/boards/{board_id}/messages',
+                json={'token': JWT.create(username), 'text': f'Сообщение от {username}'}
+            )
+
+    return client
+
+def boards(session: Session) -> list[Board]:
+    return session.query(Board).order_by(Board.topic).all()
+
+def texts(client: testing.TestClient, board: Board) -> list[str]:
+    result = client.simulate_get(
+        f'/boards/{board.board_id}/messages',
+        params={'page': 0, 'elements': 50},
+        json={'token': JWT.create('regular_user')}
+    )
+    return [m['text'] for m in result.json]
+
+def moderate(client: testing.TestClient, path: str, action: str, username: str = 'moderator'):
+    return client.simulate_post(path, json={'token': JWT.create(username), 'action': action})
+
+@pytest.mark.parametrize('action', ['delete', 'hide'])
+def test_remove_by_author(client: testing.TestClient, session: Session, action: str):
+    spammer = session.query(User).filter_by(username='spammer').one()
+    board, other = boards(session)
+
+    # Cached before the removal.
+    assert len(texts(client, board)) == 4
+    first = client.simulate_get(f'/boards/{board.board_id}/changes', json={'token': JWT.create('regular_user')}).json
+
+    result = moderate(client, f'/moderation/users/{spammer.user_id}/messages', action)
+
+    assert result.status == falcon.HTTP_200
+    assert result.json == {'messages': 4, 'boards': 2}
+    assert texts(client, board) == ['Сообщение от regular_user'] * 2
+    assert texts(client, other) == ['Сообщение от regular_user'] * 2
+
+    # Synced clients learn about the removal, in order.
+    result = client.simulate_get(
+        f'/boards/{board.board_id}/changes',
+        params={'after': first['last_seq']},
+        json={'token': JWT.create('regular_user')}
+    )
+    assert [(c['seq'], c['op']) for c in result.json['changes']] == [(5, 'delete'), (6, 'delete')]
+    assert result.json['last_seq'] == 6
+    assert session.get(Board, board.board_id).last_seq == 6
+
+    result = client.simulate_get(
+        f'/users/{spammer.user_id}/messages',
+        params={'elements': 50},
+        json={'token': JWT.create('regular_user')}
+    )
+    assert result.json['items'] == []
+
+    remaining = session.query(Message).filter_by(author_id=spammer.user_id).count()
+    assert remaining == (0 if action == 'delete' else 4)
+
+    # Nothing is left to remove.
+    result = moderate(client, f'/moderation/users/{spammer.user_id}/messages', action)
+    assert result.json == {'messages': 0, 'boards': 0}
+    assert session.query(Tombstone).count() == 4
+
+def test_remove_from_board(client: testing.TestClient, session: Session):
+    board, other = boards(session)
+
+    result = moderate(client, f'/moderation/boards/{board.board_id}/messages', 'hide')
+    assert result.json == {'messages': 4, 'boards': 1}
+
+    # Hidden messages are deleted without new tombstones.
+    result = moderate(client, f'/moderation/boards/{board.board_id}/messages', 'delete')
+    assert result.json == {'messages': 4, 'boards': 0}
+
+    assert texts(client, board) == []
+    assert len(texts(client, other)) == 4
+    assert session.query(Tombstone).filter_by(board_id=board.board_id).count() == 4
+
+    result = client.simulate_get(f'/boards/{board.board_id}', json={'token': JWT.create('regular_user')})
+    assert result.json['first_message'] is None
+
+def test_remove_reads_under_write_lock(client: testing.TestClient, engine: sa.Engine, session: Session, cache: GenerationalCache):
+    spammer = session.query(User).filter_by(username='spammer').one()
+    board, other = boards(session)
+    before = cache.generations.get('board', other.board_id)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa.event.listen(engine, 'before_cursor_execute', record)
+    MessageStore(session, cache).remove(Message.author_id == spammer.user_id)
+    sa.event.remove(engine, 'before_cursor_execute', record)
+
+    # Nothing is read before the write lock is taken, so a message
+    # posted meanwhile can't be removed without its board changing.
+    assert statements[0].startswith('INSERT INTO message_tombstones')
+    assert not any(statement.startswith('SELECT') for statement in statements)
+    assert cache.generations.get('board', other.board_id) != before
+
+def test_hidden_message_not_found(client: testing.TestClient, session: Session):
+    board, _ = boards(session)
+    message_id = client.simulate_get(
+        f'/boards/{board.board_id}/messages',
+        params={'page': 0, 'elements': 1},
+        json={'token': JWT.create('regular_user')}
+    ).json[0]['message_id']
+
+    moderate(client, f'/moderation/boards/{board.board_id}/messages', 'hide')
+
+    result = client.simulate_get(f'/boards/{board.board_id}/messages/{message_id}', json={'token': JWT.create('regular_user')})
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+def test_moderators_only(client: testing.TestClient, session: Session):
+    board, _ = boards(session)
+
+    result = moderate(client, f'/moderation/boards/{board.board_id}/messages', 'delete', 'regular_user')
+    assert result.status == falcon.HTTP_FORBIDDEN
+
+    result = client.simulate_post(f'/moderation/boards/{board.board_id}/messages', json={'action': 'delete'})
+    assert result.status == falcon.HTTP_UNAUTHORIZED
+
+    result = moderate(client, f'/moderation/boards/{board.board_id}/messages', 'purge')
+    assert result.status == falcon.HTTP_BAD_REQUEST
+
+    result = moderate(client, f'/moderation/boards/{uuid.uuid4()}/messages', 'delete')
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+    result = moderate(client, f'/moderation/users/{uuid.uuid4()}/messages', 'delete')
+    assert result.status == falcon.HTTP_NOT_FOUND
+
+    assert len(texts(client, board)) == 4
@@ -0,0 +1,97 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+import time
+import pytest
+import threading
+
+from petboards.models import User
+from petboards.persistency import Base, RoutingSession, TimedQueuePool, create_engines
+from petboards.metrics import Metrics
+
+@pytest.fixture
+def engines(tmp_path) -> tuple[sa.Engine, sa.Engine]:
+    writer, reader = create_engines(str(tmp_path / 'db.sqlite3'), read_pool_size=2, pool_timeout=1.0)
+    Base.metadata.create_all(writer)
+
+    yield writer, reader
+
+    reader.dispose()
+    writer.dispose()
+
+def record(engine: sa.Engine) -> list[str]:
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+def test_reader_read_only(engines: tuple[sa.Engine, sa.Engine]):
+    writer, reader = engines
+
+    with writer.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql('SELECT count(*) FROM users').scalar() == 0
+        with pytest.raises(sa.exc.OperationalError):
+            conn.exec_driver_sql("DELETE FROM users")
+
+def test_routing(engines: tuple[sa.Engine, sa.Engine]):
+    writer, reader = engines
+    reads, writes = record(reader), record(writer)
+
+    smaker = sessionmaker(expire_on_commit=False, class_=RoutingSession, reader=reader, writer=writer)
+    with smaker() as session:
+        user = User('inspire', 'letmein', 'Igor', 'Voytenko')
+        session.add(user)
+        session.commit()
+
+        assert (reads, writes) == ([], ['INSERT'])
+
+        assert session.execute(sa.select(User.username)).scalar_one() == 'inspire'
+        assert (reads, writes) == (['SELECT'], ['INSERT'])
+
+        # Once written, the transaction reads its own changes.
+        session.execute(sa.update(User).values(first_name='Игорь'))
+        assert session.execute(sa.select(User.first_name)).scalar_one() == 'Игорь'
+        session.commit()
+
+        assert (reads, writes) == (['SELECT'], ['INSERT', 'UPDATE', 'SELECT'])
+
+        session.execute(sa.update(User).values(first_name='Igor'))
+        session.rollback()
+        assert session.execute(sa.select(User.first_name)).scalar_one() == 'Игорь'
+
+        assert (reads, writes) == (['SELECT', 'SELECT'], ['INSERT', 'UPDATE', 'SELECT', 'UPDATE'])
+
+def test_pool_waits(engines: tuple[sa.Engine, sa.Engine]):
+    writer, _ = engines
+    assert isinstance(writer.pool, TimedQueuePool)
+
+    # The only connection of the writer is held for a while.
+    held = writer.connect()
+    def release():
+        time.sleep(0.2)
+        held.close()
+
+    thread = threading.Thread(target=release)
+    thread.start()
+    with writer.connect():
+        pass
+    thread.join()
+
+    # Along with the checkout creating the tables.
+    size, checked_out, waits = writer.pool.snapshot()
+    assert (size, checked_out, waits.count) == (1, 0, 3)
+    assert waits.sum >= 0.15
+
+    metrics = Metrics()
+    metrics.add_pool('write', writer)
+    writer.dispose()
+
+    # The pool replaced on disposal is exposed.
+    text = metrics.render()
+    assert 'petboards_db_pool_size{pool="write"} 1' in text
+    assert 'petboards_db_pool_wait_seconds_count{pool="write"} 0' in text
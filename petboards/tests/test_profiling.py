@@ -0,0 +1,67 @@
+import falcon
+from falcon import testing
+
+import os
+import time
+import pstats
+import pytest
+
+from petboards.profiling import ProfilingMiddleware, PROFILE_HEADER, PROFILE_FILE_HEADER
+
+class SlowResource:
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+        resp.media = {}
+
+def make_client(**kwargs) -> testing.TestClient:
+    app = falcon.App(middleware=[ProfilingMiddleware(**kwargs)])
+    app.add_route('/slow', SlowResource())
+    return testing.TestClient(app)
+
+def test_not_profiled(tmp_path):
+    client = make_client(directory=str(tmp_path), token='secret')
+
+    client.simulate_get('/slow')
+    result = client.simulate_get('/slow', headers={PROFILE_HEADER: 'wrong'})
+
+    assert PROFILE_FILE_HEADER not in result.headers
+    assert os.listdir(tmp_path) == []
+
+def test_cprofile(tmp_path):
+    client = make_client(directory=str(tmp_path), token='secret')
+
+    result = client.simulate_get('/slow', headers={PROFILE_HEADER: 'secret'})
+
+    name = result.headers[PROFILE_FILE_HEADER]
+    assert '-GET-slow-' in name and name.endswith('.pstats')
+
+    stats = pstats.Stats(str(tmp_path / name))
+    assert any(function == 'on_get' for _, _, function in stats.stats)
+
+def test_sampling(tmp_path):
+    client = make_client(directory=str(tmp_path), sample_rate=1.0, mode='sampling', interval=0.001)
+
+    result = client.simulate_get('/slow')
+
+    # Sampled, not requested requests don't reveal the file name.
+    assert PROFILE_FILE_HEADER not in result.headers
+
+    [name] = os.listdir(tmp_path)
+    assert name.endswith('.collapsed')
+
+    lines = (tmp_path / name).read_text().splitlines()
+    assert len(lines) > 0
+    assert any('on_get (test_profiling.py' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+def test_rotation(tmp_path):
+    client = make_client(directory=str(tmp_path), sample_rate=1.0, max_files=2)
+
+    for _ in range(4):
+        client.simulate_get('/slow')
+
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,63 @@
+import uuid
+import tracemalloc
+from datetime import datetime, timedelta
+
+from petboards.models import serialize_message_row
+from petboards.records import MessageBlock
+
+def make_rows(count: int, authors: int = 3) -> list[tuple]:
+    board_id = uuid.uuid4().hex
+    author_ids = [uuid.uuid4().hex for _ in range(authors)]
+    start = datetime(2023, 3, 1, 12, 30, 15, 123456)
+
+    return [
+        (
+            uuid.uuid4().hex,
+            f'Сообщение #{i}',
+            author_ids[i % authors],
+            board_id,
+            str(start + timedelta(seconds=i, microseconds=i)),
+            str(start + timedelta(minutes=i)) if i % 2 == 0 else None
+        )
+        for i in range(count)
+    ]
+
+def test_serialize_as_rows():
+    rows = make_rows(10)
+    rows.append((uuid.uuid4().hex, 'Плохая идея', uuid.uuid4().hex, uuid.uuid4().hex, '1969-12-31 23:59:59.999999', '2023-03-01 00:00:00'))
+    block = MessageBlock(rows)
+
+    assert len(block) == 11
+    assert [block.serialize(i) for i in range(len(block))] == [serialize_message_row(row) for row in rows]
+    assert block.serialize(0, frozenset({'text', 'timestamp'})) == {
+        'text': 'Сообщение #0',
+        'timestamp': serialize_message_row(rows[0])['timestamp']
+    }
+
+    assert len(MessageBlock([])) == 0
+
+def test_key_follows_edits():
+    rows = make_rows(2)
+    edited = rows[0][:5] + ('2024-01-01 00:00:00.000001',)
+    block, block_edited = MessageBlock(rows), MessageBlock([edited, rows[1]])
+
+    assert block.key(0) != block_edited.key(0)
+    assert block.key(1) == block_edited.key(1)
+    assert block.key(0)[0] == uuid.UUID(rows[0][0]).bytes
+
+def test_smaller_than_dictionaries():
+    rows = make_rows(1000)
+
+    def allocated(build) -> int:
+        tracemalloc.start()
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del value
+        return size
+
+    # Only the texts are kept as they are, by both.
+    dictionaries = allocated(lambda: [serialize_message_row(row) for row in rows])
+    block = allocated(lambda: MessageBlock(rows))
+
+    assert block * 8 < dictionaries
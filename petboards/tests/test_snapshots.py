@@ -0,0 +1,163 @@
+import falcon
+from falcon import testing
+
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session
+
+import os
+import gzip
+import pytest
+from datetime import datetime, timedelta
+
+from petboards.app import create_app
+from petboards.models import User, Board, Message
+from petboards.security import JWT
+from petboards.persistency import Base
+from petboards.generations import GenerationTable, GenerationalCache
+from petboards.snapshots import SnapshotStore
+from petboards.user import UserStore
+from petboards.board import MessageStore, BoardStore
+
+class Context:
+    pass
+
+@pytest.fixture
+def context(tmp_path) -> Context:
+    engine = sa.create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    session = Session(engine, expire_on_commit=False)
+
+    user = User('regular_user', 'password', 'Forum', 'Roamer')
+    quiet = Board('В интернете опять кто-то неправ!', user)
+    active = Board('появился другой вопрос', user)
+
+    long_ago = datetime.utcnow() - timedelta(days=7)
+    messages = []
+    for i in range(5):
+        message = Message(f'Сообщение #{i}', user, quiet)
+        message.timestamp = message.last_edited = long_ago + timedelta(seconds=i)
+        messages.append(message)
+    messages += [Message(f'Сообщение #{i}', user, active) for i in range(5)]
+
+    session.add_all([user, quiet, active, *messages])
+    session.commit()
+
+    generations = GenerationTable(str(tmp_path / 'generations'), 1024)
+    cache = GenerationalCache(generations, 0)
+
+    ctx = Context()
+    ctx.session, ctx.quiet, ctx.active, ctx.messages = session, quiet, active, messages
+    ctx.directory = tmp_path / 'snapshots'
+    ctx.snapshots = SnapshotStore(str(ctx.directory), generations, min_age=86400, max_age=600, page_sizes={2})
+
+    app = create_app(
+        UserStore(session, cache=cache), MessageStore(session, cache), BoardStore(session, cache),
+        snapshots=ctx.snapshots
+    )
+    ctx.client = testing.TestClient(app)
+    ctx.token = JWT.create('regular_user')
+
+    yield ctx
+
+    session.close()
+    engine.dispose()
+
+def get_page(ctx: Context, board: Board, page: int = 0, elements: int = 2, headers: dict | None = None):
+    result = ctx.client.simulate_get(
+        f'/boards/{board.board_id}/messages',
+        params={'page': page, 'elements': elements},
+        json={'token': ctx.token},
+        headers=headers
+    )
+
+    # The snapshots are written in the background.
+    ctx.snapshots.flush()
+    return result
+
+def test_snapshot_served(context: Context):
+    first = get_page(context, context.quiet)
+
+    assert first.status == falcon.HTTP_200
+    assert [m['text'] for m in first.json] == ['Сообщение #0', 'Сообщение #1']
+    assert 'etag' not in first.headers
+    assert context.snapshots.misses == 1
+
+    second = get_page(context, context.quiet)
+
+    assert second.status == falcon.HTTP_200
+    assert second.content == first.content
+    assert second.headers['cache-control'] == 'private, max-age=600'
+    assert second.headers['content-length'] == str(len(first.content))
+    assert context.snapshots.hits == 1
+
+    result = get_page(context, context.quiet, headers={'If-None-Match': second.headers['etag']})
+
+    assert result.status == falcon.HTTP_NOT_MODIFIED
+    assert result.content == b''
+
+    result = get_page(context, context.quiet, headers={'Accept-Encoding': 'gzip'})
+
+    assert result.status == falcon.HTTP_200
+    assert result.headers['content-encoding'] == 'gzip'
+    assert result.headers['etag'] != second.headers['etag']
+    assert gzip.decompress(result.content) == first.content
+
+def test_written_response_compressed(context: Context):
+    # Large enough for the compression middleware.
+    for message in context.messages[:2]:
+        message.text *= 200
+    context.session.commit()
+
+    first = get_page(context, context.quiet, headers={'Accept-Encoding': 'gzip'})
+
+    assert first.headers['content-encoding'] == 'gzip'
+    assert first.headers['vary'] == 'Accept-Encoding'
+    assert 'etag' not in first.headers
+
+    # The snapshot is served with the tag of what is sent.
+    second = get_page(context, context.quiet, headers={'Accept-Encoding': 'gzip'})
+    plain = get_page(context, context.quiet)
+
+    assert second.headers['etag'].endswith('-gz"')
+    assert plain.headers['etag'] == second.headers['etag'].replace('-gz"', '"')
+    assert get_page(context, context.quiet, headers={'Accept-Encoding': 'gzip', 'If-None-Match': second.headers['etag']}).status == falcon.HTTP_NOT_MODIFIED
+
+def test_page_sizes(context: Context):
+    assert get_page(context, context.quiet, elements=3).status == falcon.HTTP_200
+    assert get_page(context, context.quiet, elements=1).status == falcon.HTTP_200
+
+    assert os.listdir(context.directory) == []
+    assert context.snapshots.misses == 0
+
+def test_not_snapshotted(context: Context):
+    # The last page isn't full, and the other board is active.
+    get_page(context, context.quiet, page=2)
+    get_page(context, context.active)
+
+    assert os.listdir(context.directory) == []
+    assert 'etag' not in get_page(context, context.quiet, page=2).headers
+    assert 'etag' not in get_page(context, context.active).headers
+
+def test_invalidated_by_changes(context: Context):
+    get_page(context, context.quiet)
+    first = get_page(context, context.quiet)
+    assert get_page(context, context.quiet).headers['etag'] == first.headers['etag']
+
+    message = context.messages[0]
+    result = context.client.simulate_delete(
+        f'/boards/{context.quiet.board_id}/messages/{message.message_id}',
+        json={'token': context.token}
+    )
+    assert result.status == falcon.HTTP_200
+
+    get_page(context, context.quiet)
+    result = get_page(context, context.quiet)
+
+    assert [m['text'] for m in result.json] == ['Сообщение #1', 'Сообщение #2']
+    assert result.headers['etag'] != first.headers['etag']
+
+    # The snapshots of the old version are gone.
+    files = os.listdir(context.directory / context.quiet.board_id.hex)
+    assert sorted(files) == sorted(f'{result.headers["etag"].strip(chr(34))}.json' + suffix for suffix in ('', '.gz'))
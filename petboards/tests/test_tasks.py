@@ -0,0 +1,94 @@
+import sqlalchemy as sa
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session, DeclarativeBase
+
+import pytest
+import uuid
+from datetime import datetime, timedelta
+
+from petboards.persistency import Base
+from petboards.models import User
+from petboards.user import UserStore
+from petboards.tasks import DeferredWriter
+
+class CounterBase(DeclarativeBase):
+    pass
+
+class Counter(CounterBase):
+    __tablename__ = 'counters'
+
+    counter_id = sa.Column(sa.Uuid, primary_key=True)
+    value = sa.Column(sa.Integer, nullable=False)
+
+@pytest.fixture
+def engine() -> sa.Engine:
+    engine = sa.create_engine(
+        'sqlite://',
+        poolclass=StaticPool,
+        connect_args={'check_same_thread': False}
+    )
+
+    Base.metadata.create_all(engine)
+    CounterBase.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+def test_deferred_last_login(engine: sa.Engine):
+    deferred = DeferredWriter(engine, interval=3600)
+    session = Session(engine, expire_on_commit=False)
+    store = UserStore(session, deferred)
+
+    user = User('inspire', 'letmein', 'Igor', 'Voytenko')
+    store.save(user)
+
+    first, second = datetime(2023, 3, 1), datetime(2023, 3, 2)
+    store.record_login(user, first)
+    store.record_login(user, second)
+
+    # Nothing is written until the writer flushes.
+    assert user.last_login == second
+    assert session.execute(sa.select(User.last_login)).scalar_one() == user.registered
+
+    deferred.close()
+
+    assert session.execute(sa.select(User.last_login)).scalar_one() == second
+
+def test_coalesced_increments(engine: sa.Engine):
+    counter_id = uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(sa.insert(Counter), {'counter_id': counter_id, 'value': 10})
+
+    deferred = DeferredWriter(engine, interval=3600, max_pending=1)
+    for _ in range(5):
+        assert deferred.increment(Counter, counter_id, 'value')
+
+    assert not deferred.increment(Counter, uuid.uuid4(), 'value')
+
+    deferred.flush()
+
+    with engine.connect() as conn:
+        assert conn.execute(sa.select(Counter.value)).scalar_one() == 15
+
+def test_writes_rejected_after_close(engine: sa.Engine):
+    deferred = DeferredWriter(engine)
+    deferred.close()
+
+    assert not deferred.update(User, uuid.uuid4(), last_login=datetime.utcnow())
+
+def test_written_rows_notified(engine: sa.Engine):
+    counter_id = uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(sa.insert(Counter), {'counter_id': counter_id, 'value': 0})
+
+    written = []
+    deferred = DeferredWriter(engine, interval=3600, on_written=lambda table, key: written.append((table, key)))
+    deferred.increment(Counter, counter_id, 'value')
+    deferred.increment(Counter, counter_id, 'value')
+
+    assert written == []
+
+    deferred.close()
+
+    assert written == [(Counter.__table__, counter_id)]
@@ -144,3 +144,66 @@ def test_fetch_user_by_invalid_user_id(client: testing.TestClient):
     
     assert result.status == falcon.HTTP_NOT_FOUND
     assert 'username' not in result.json
+
+def test_fetch_all_users_invalid_pagination(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    for params in ({'page': 'first', 'elements': 20}, {'page': 0, 'elements': 51}):
+        result = client.simulate_get(
+            f'/users',
+            params=params,
+            json={
+                'token': token
+            }
+        )
+
+        assert result.status == falcon.HTTP_BAD_REQUEST
+
+def test_fetch_all_users_sparse_fields(client: testing.TestClient):
+    token = JWT.create('botai')
+
+    result = client.simulate_get(
+        f'/users',
+        params={
+            'page': 0,
+            'elements': 20,
+            'fields': 'user_id,username'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert all(set(u) == {'user_id', 'username'} for u in result.json)
+
+def test_fetch_users_by_ids(client: testing.TestClient):
+    known_user_id = '2423a6e6-eb92-416e-b155-65cfa448966b'
+    token = JWT.create('botai')
+
+    result = client.simulate_get(
+        f'/users',
+        params={
+            'ids': f'{known_user_id},00000000-eb92-416e-b155-65cfa448966b'
+        },
+        json={
+            'token': token
+        }
+    )
+
+    assert result.status == falcon.HTTP_200
+    assert [u['username'] for u in result.json] == ['regular_user']
+    assert 'boards' not in result.json[0]
+
+    result = client.simulate_get(
+        f'/users',
+        params={
+            'ids': ','.join([known_user_id] * 51)
+        },
+        json={
+            'token': token
+        }
+    )
+
+    # Repeated IDs are only counted once.
+    assert result.status == falcon.HTTP_200
@@ -38,6 +38,13 @@ def fake_user_store():
 
         return future
 
+    def fake_get_all_serialized(page: int, elements: int, fields: frozenset[str] | None = None) -> list[dict]:
+        users = [u.serialize() for u in fake_get_all(page, elements)]
+        if fields is None:
+            return users
+
+        return [{k: v for k, v in u.items() if k in fields} for u in users]
+
     def fake_get_by_username(username: str) -> User | None:
         res = None
         for user in all_users.values():
@@ -47,6 +54,22 @@ def fake_user_store():
 
         return res
 
+    def fake_get_many_serialized(user_ids: list[uuid.UUID], fields: frozenset[str] | None = None) -> list[dict]:
+        users = [all_users[user_id].serialize() for user_id in user_ids if user_id in all_users]
+        for user in users:
+            del user['boards']
+
+        if fields is None:
+            return users
+
+        return [{k: v for k, v in u.items() if k in fields} for u in users]
+
+    def fake_get_serialized(user_id: uuid.UUID) -> dict | None:
+        if user_id not in all_users:
+            return None
+
+        return all_users[user_id].serialize()
+
     def fake_save(user: User) -> None:
         all_users[user.user_id] = user
         return None
@@ -60,6 +83,9 @@ def fake_user_store():
 
     fake_user_store.get = fake_get
     fake_user_store.get_all = fake_get_all
+    fake_user_store.get_serialized = fake_get_serialized
+    fake_user_store.get_all_serialized = fake_get_all_serialized
+    fake_user_store.get_many_serialized = fake_get_many_serialized
     fake_user_store.get_by_username = fake_get_by_username
     fake_user_store.save = fake_save
 